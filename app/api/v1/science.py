@@ -2,13 +2,19 @@
 理科模式API路由
 """
 
+import asyncio
 import uuid
+from typing import Any, Dict, List, Optional
+
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database.connection import get_db
+from app.database.connection import get_db, get_session_factory
 from app.services.orchestrator.agent_coordinator import agent_coordinator
 from app.services.orchestrator.session_manager import SessionManager
+from app.services.agents.science.debugger_agent import DebuggerAgent
 from app.repositories.analysis_repo import AnalysisRepository
 from app.schemas.request import (
     ValidateStepsRequest,
@@ -29,6 +35,54 @@ logger = get_logger(__name__)
 router = APIRouter(prefix="/science", tags=["理科模式"])
 
 
+def _request_steps(request: ValidateStepsRequest) -> List[Dict[str, Any]]:
+    """将请求中的步骤转换为Agent输入"""
+    return [
+        {
+            "step_number": step.step_number,
+            "content": step.content,
+            "formula": step.formula
+        }
+        for step in request.steps
+    ]
+
+
+async def _save_validation_steps(
+    db: AsyncSession,
+    session_id: str,
+    steps: List[Dict[str, Any]],
+    validation_results: List[Dict[str, Any]]
+) -> None:
+    """保存步骤验证结果"""
+    analysis_repo = AnalysisRepository(db)
+    await analysis_repo.save_math_steps(
+        session_id=session_id,
+        content_version=1,
+        steps=[
+            {
+                "step_number": v.get("step_number", 0),
+                "step_order": i,
+                "step_content": steps[i].get("content", ""),
+                "formula": steps[i].get("formula"),
+                "symbolic_form": v.get("symbolic_form"),
+                "variables_before": v.get("variables_state"),
+                "variables_after": v.get("variables_state"),
+                "is_valid": v.get("is_valid"),
+                "validation_details": v,
+                "errors": v.get("errors"),
+                "warnings": v.get("warnings"),
+                "next_step_hint": v.get("next_step_hint")
+            }
+            for i, v in enumerate(validation_results)
+        ]
+    )
+
+
+def _sse_event(event: str, data: Any) -> bytes:
+    """编码一条SSE事件"""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
 @router.post(
     "/steps/validate",
     response_model=ValidateStepsResponse,
@@ -46,14 +100,7 @@ async def validate_steps(
         session = await session_manager.get_session(request.session_id)
 
         # 准备步骤数据
-        steps = [
-            {
-                "step_number": step.step_number,
-                "content": step.content,
-                "formula": step.formula
-            }
-            for step in request.steps
-        ]
+        steps = _request_steps(request)
 
         # 执行Agent
         result = await agent_coordinator.execute_agent(
@@ -72,28 +119,9 @@ async def validate_steps(
             )
 
         # 保存数学步骤
-        analysis_repo = AnalysisRepository(db)
         if result.data.get("validation_results"):
-            await analysis_repo.save_math_steps(
-                session_id=request.session_id,
-                content_version=1,
-                steps=[
-                    {
-                        "step_number": v.get("step_number", 0),
-                        "step_order": i,
-                        "step_content": steps[i].get("content", ""),
-                        "formula": steps[i].get("formula"),
-                        "symbolic_form": v.get("symbolic_form"),
-                        "variables_before": v.get("variables_state"),
-                        "variables_after": v.get("variables_state"),
-                        "is_valid": v.get("is_valid"),
-                        "validation_details": v,
-                        "errors": v.get("errors"),
-                        "warnings": v.get("warnings"),
-                        "next_step_hint": v.get("next_step_hint")
-                    }
-                    for i, v in enumerate(result.data["validation_results"])
-                ]
+            await _save_validation_steps(
+                db, request.session_id, steps, result.data["validation_results"]
             )
 
         return ValidateStepsResponse(**result.data)
@@ -108,6 +136,75 @@ async def validate_steps(
         )
 
 
+@router.post(
+    "/steps/validate/stream",
+    summary="流式验证数学步骤",
+    description="以SSE推送验证结果：每完成一个步骤发送partial事件，结束时发送result或error事件"
+)
+async def validate_steps_stream(
+    request: ValidateStepsRequest,
+    db: AsyncSession = Depends(get_db)
+) -> StreamingResponse:
+    """流式验证数学步骤"""
+    # 会话不存在时在开始推送前返回错误
+    session_manager = SessionManager(db)
+    await session_manager.get_session(request.session_id)
+
+    steps = _request_steps(request)
+    queue: asyncio.Queue[Optional[bytes]] = asyncio.Queue()
+
+    async def on_partial(path: str, value: Any) -> None:
+        await queue.put(_sse_event("partial", {"path": path, "value": value}))
+
+    async def event_stream():
+        task = asyncio.create_task(
+            agent_coordinator.execute_agent(
+                agent_type="math_validator",
+                session_id=request.session_id,
+                request_id=str(uuid.uuid4()),
+                agent_kwargs={},
+                partial_callback=on_partial,
+                problem_statement=request.problem_statement,
+                steps=steps
+            )
+        )
+        # Agent结束后放入结束标记，之前的增量事件都已入队
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while (event := await queue.get()) is not None:
+                yield event
+
+            result = task.result()
+            if not result.success:
+                yield _sse_event("error", {"detail": f"步骤验证失败: {result.error}"})
+                return
+
+            # 依赖注入的数据库会话在流式响应期间可能已关闭，使用独立会话保存
+            if result.data.get("validation_results"):
+                session_factory = get_session_factory()
+                async with session_factory() as session:
+                    await _save_validation_steps(
+                        session, request.session_id, steps, result.data["validation_results"]
+                    )
+                    await session.commit()
+
+            yield _sse_event(
+                "result",
+                ValidateStepsResponse(**result.data).model_dump(mode="json")
+            )
+
+        except Exception as e:
+            logger.error(f"流式步骤验证失败: {str(e)}")
+            yield _sse_event("error", {"detail": f"步骤验证失败: {str(e)}"})
+
+        finally:
+            # 客户端断开时停止仍在进行的Agent
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @router.post(
     "/logic-tree/build",
     response_model=LogicTreeResponse,
@@ -320,14 +417,7 @@ async def debug_steps(
         session = await session_manager.get_session(request.session_id)
 
         # 准备步骤数据
-        steps = [
-            {
-                "step_number": step.step_number,
-                "content": step.content,
-                "formula": step.formula
-            }
-            for step in request.steps
-        ]
+        steps = _request_steps(request)
 
         # 执行Debugger Agent
         result = await agent_coordinator.execute_agent(
@@ -374,8 +464,16 @@ async def debug_steps(
             f"breakpoint={request.breakpoint_step_number}"
         )
 
+        # 时间线与执行追踪内容重复，只在请求时生成
+        execution_trace = result.data.get("execution_trace", [])
+        variable_timeline = (
+            DebuggerAgent.build_variable_timeline(execution_trace)
+            if request.include_variable_timeline else None
+        )
+
         return DebugResponse(
-            execution_trace=result.data.get("execution_trace", []),
+            execution_trace=execution_trace,
+            variable_timeline=variable_timeline,
             current_state=result.data.get("current_state", {}),
             insights=result.data.get("insights", []),
             next_possible_actions=result.data.get("next_possible_actions", []),
@@ -20,6 +20,7 @@ from app.schemas.response import (
     SessionResponse,
     SessionDetailResponse,
     SessionListResponse,
+    SessionSummary,
     EditorSyncResponse,
     EditorHistoryResponse
 )
@@ -143,32 +144,37 @@ async def get_session_list(
             limit=limit
         )
 
+        # 一次性批量获取所有会话的内容缓存
+        cached_contents = {}
+        try:
+            from app.cache.cache_strategies import session_cache
+            cached_contents = await session_cache.get_content_many(
+                [str(session.session_id) for session in sessions]
+            )
+        except Exception as e:
+            logger.debug(f"获取会话预览失败: {str(e)}")
+
         # 构建响应
         session_list = []
         for session in sessions:
             # 获取内容预览
             preview = ""
-            try:
-                from app.cache.cache_strategies import session_cache
-                cached_content = await session_cache.get_content(str(session.session_id))
-                if cached_content and cached_content.get("content"):
-                    content = cached_content.get("content", "")
-                    # 截取前100个字符作为预览，去除多余空白
-                    preview = content.strip()[:100]
-                    if len(content) > 100:
-                        preview += "..."
-            except Exception as e:
-                logger.debug(f"获取会话预览失败: {str(e)}")
-                preview = ""
-
-            session_list.append({
-                "session_id": str(session.session_id),
-                "title": session.title,
-                "mode": session.mode,
-                "status": session.status,
-                "created_at": session.created_at.isoformat() if session.created_at else None,
-                "preview": preview
-            })
+            cached_content = cached_contents.get(str(session.session_id))
+            if cached_content and cached_content.get("content"):
+                content = cached_content.get("content", "")
+                # 截取前100个字符作为预览，去除多余空白
+                preview = content.strip()[:100]
+                if len(content) > 100:
+                    preview += "..."
+
+            session_list.append(SessionSummary(
+                session_id=str(session.session_id),
+                title=session.title,
+                mode=session.mode,
+                status=session.status,
+                created_at=session.created_at,
+                preview=preview
+            ))
 
         total_pages = (total + limit - 1) // limit
 
@@ -4,9 +4,9 @@
 """
 
 import hashlib
-import json
-from typing import Any, Optional, Dict
+from typing import Any, Optional, Dict, List
 from datetime import datetime
+import orjson
 
 from app.config import settings
 from app.cache.redis_client import redis_cache
@@ -38,6 +38,21 @@ class CacheKeyBuilder:
         """分析结果缓存键"""
         return f"analysis:{analysis_type}:{content_hash}"
 
+    @staticmethod
+    def ocr_result(image_hash: str, language: str, handwriting: bool) -> str:
+        """OCR识别结果缓存键"""
+        return f"ocr:v1:{image_hash}:{language}:{int(handwriting)}"
+
+    @staticmethod
+    def llm_response(request_hash: str) -> str:
+        """LLM响应缓存键"""
+        return f"llm:v1:{request_hash}"
+
+    @staticmethod
+    def embedding(model: str, text_hash: str) -> str:
+        """文本嵌入缓存键"""
+        return f"embedding:v1:{model}:{text_hash}"
+
     @staticmethod
     def session_annotations(session_id: str) -> str:
         """会话错误标注键"""
@@ -125,7 +140,7 @@ class SessionCache:
             是否更新成功
         """
         key = self.key_builder.session_runtime(session_id)
-        return await self.cache.hset(key, field, json.dumps(value))
+        return await self.cache.hset(key, field, orjson.dumps(value))
 
     async def set_content(
         self,
@@ -164,6 +179,20 @@ class SessionCache:
         key = self.key_builder.session_content(session_id)
         return await self.cache.get_json(key)
 
+    async def get_content_many(self, session_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        批量获取多个会话缓存的编辑器内容
+
+        Args:
+            session_ids: 会话ID列表
+
+        Returns:
+            会话ID到内容数据的映射，未缓存的为None
+        """
+        keys = [self.key_builder.session_content(session_id) for session_id in session_ids]
+        values = await self.cache.get_json_many(keys)
+        return dict(zip(session_ids, values))
+
     async def delete_content(self, session_id: str) -> bool:
         """
         删除会话内容缓存
@@ -258,6 +287,187 @@ class AnalysisCache:
 
         return cache_data
 
+    async def get_results_many(
+        self,
+        analysis_type: str,
+        contents: List[str]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        批量获取缓存的分析结果（单次往返，不更新命中计数）
+
+        Args:
+            analysis_type: 分析类型
+            contents: 内容文本列表
+
+        Returns:
+            与contents顺序一致的分析结果，不存在的位置为None
+        """
+        keys = [
+            self.key_builder.analysis_result(
+                analysis_type,
+                self.key_builder.generate_content_hash(content)
+            )
+            for content in contents
+        ]
+        return await self.cache.get_json_many(keys)
+
+
+class OCRCache:
+    """OCR识别结果缓存管理（按图片内容缓存，命中时跳过视觉模型调用）"""
+
+    def __init__(self) -> None:
+        self.cache = redis_cache
+        self.key_builder = CacheKeyBuilder()
+
+    @staticmethod
+    def generate_image_hash(image_data: bytes) -> str:
+        """
+        生成图片内容哈希
+
+        Args:
+            image_data: 图片二进制数据
+
+        Returns:
+            BLAKE2b哈希值
+        """
+        return hashlib.blake2b(image_data, digest_size=16).hexdigest()
+
+    async def get_text(self, image_hash: str, language: str, handwriting: bool) -> Optional[str]:
+        """
+        获取缓存的识别结果
+
+        Args:
+            image_hash: 图片内容哈希
+            language: 识别语言
+            handwriting: 是否识别手写
+
+        Returns:
+            识别出的文字，不存在返回None
+        """
+        key = self.key_builder.ocr_result(image_hash, language, handwriting)
+        return await self.cache.get(key)
+
+    async def set_text(
+        self,
+        image_hash: str,
+        language: str,
+        handwriting: bool,
+        text: str
+    ) -> bool:
+        """
+        缓存识别结果
+
+        Args:
+            image_hash: 图片内容哈希
+            language: 识别语言
+            handwriting: 是否识别手写
+            text: 识别出的文字
+
+        Returns:
+            是否设置成功
+        """
+        key = self.key_builder.ocr_result(image_hash, language, handwriting)
+        return await self.cache.set(key, text, ttl=settings.ocr_cache_ttl)
+
+
+class LLMResponseCache:
+    """LLM响应缓存管理（请求参数完全相同时跳过API调用）"""
+
+    def __init__(self) -> None:
+        self.cache = redis_cache
+        self.key_builder = CacheKeyBuilder()
+
+    @staticmethod
+    def generate_request_hash(**params: Any) -> str:
+        """
+        生成请求参数哈希
+
+        Args:
+            **params: 决定响应内容的请求参数
+
+        Returns:
+            BLAKE2b哈希值
+        """
+        return hashlib.blake2b(
+            orjson.dumps(params, option=orjson.OPT_SORT_KEYS),
+            digest_size=16
+        ).hexdigest()
+
+    async def get_response(self, request_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        获取缓存的响应
+
+        Args:
+            request_hash: 请求参数哈希
+
+        Returns:
+            响应字段，不存在返回None
+        """
+        return await self.cache.get_json(self.key_builder.llm_response(request_hash))
+
+    async def set_response(self, request_hash: str, response: Dict[str, Any]) -> bool:
+        """
+        缓存响应
+
+        Args:
+            request_hash: 请求参数哈希
+            response: 响应字段
+
+        Returns:
+            是否设置成功
+        """
+        return await self.cache.set_json(
+            self.key_builder.llm_response(request_hash),
+            response,
+            ttl=settings.llm_response_cache_ttl
+        )
+
+    async def get_embedding(self, model: str, text: str) -> Optional[List[float]]:
+        """
+        获取缓存的文本嵌入
+
+        Args:
+            model: 嵌入模型名称
+            text: 文本内容
+
+        Returns:
+            嵌入向量，不存在返回None
+        """
+        key = self.key_builder.embedding(model, self.generate_request_hash(text=text))
+        return await self.cache.get_json(key)
+
+    async def get_embeddings_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        批量获取缓存的文本嵌入（单次往返）
+
+        Args:
+            model: 嵌入模型名称
+            texts: 文本列表
+
+        Returns:
+            与texts顺序一致的嵌入向量，不存在的位置为None
+        """
+        keys = [
+            self.key_builder.embedding(model, self.generate_request_hash(text=text))
+            for text in texts
+        ]
+        return await self.cache.get_json_many(keys)
+
+    async def set_embedding(self, model: str, text: str, embedding: List[float]) -> bool:
+        """
+        缓存文本嵌入
+
+        Args:
+            model: 嵌入模型名称
+            text: 文本内容
+            embedding: 嵌入向量
+
+        Returns:
+            是否设置成功
+        """
+        key = self.key_builder.embedding(model, self.generate_request_hash(text=text))
+        return await self.cache.set_json(key, embedding, ttl=settings.embedding_cache_ttl)
+
 
 class ChatContextCache:
     """对话上下文缓存管理"""
@@ -283,7 +493,7 @@ class ChatContextCache:
             是否添加成功
         """
         key = self.key_builder.chat_context(session_id)
-        message_json = json.dumps(message, ensure_ascii=False)
+        message_json = orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS)
 
         # 添加到列表右侧（最新）
         await self.cache.rpush(key, message_json)
@@ -319,8 +529,8 @@ class ChatContextCache:
 
         for msg_json in messages_json:
             try:
-                messages.append(json.loads(msg_json))
-            except json.JSONDecodeError:
+                messages.append(orjson.loads(msg_json))
+            except orjson.JSONDecodeError:
                 logger.warning(f"解析对话消息失败: {msg_json}")
 
         return messages
@@ -331,6 +541,15 @@ class ChatContextCache:
         return await self.cache.delete(key)
 
 
+# 持有者校验和删除在Redis中原子完成，一次往返
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
 class AgentLockManager:
     """Agent执行锁管理"""
 
@@ -338,6 +557,7 @@ class AgentLockManager:
         self.cache = redis_cache
         self.key_builder = CacheKeyBuilder()
         self.lock_ttl = 30  # 锁超时时间30秒
+        self._release_script = self.cache.client.register_script(_RELEASE_LOCK_SCRIPT)
 
     async def acquire_lock(
         self,
@@ -393,9 +613,8 @@ class AgentLockManager:
         key = self.key_builder.agent_lock(session_id, agent_name)
 
         # 只有持有锁的请求才能释放
-        current_holder = await self.cache.get(key)
-        if current_holder == request_id:
-            await self.cache.delete(key)
+        released = await self._release_script(keys=[key], args=[request_id])
+        if released:
             logger.debug(f"释放Agent锁成功: {agent_name} ({request_id})")
             return True
 
@@ -456,6 +675,8 @@ class RateLimiter:
 # 创建全局缓存管理器实例
 session_cache = SessionCache()
 analysis_cache = AnalysisCache()
+ocr_cache = OCRCache()
+llm_response_cache = LLMResponseCache()
 chat_context_cache = ChatContextCache()
 agent_lock_manager = AgentLockManager()
 rate_limiter = RateLimiter()
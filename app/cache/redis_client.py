@@ -3,8 +3,8 @@ Redis客户端管理
 提供Redis连接和基础操作
 """
 
-import json
-from typing import Any, Optional, List
+from typing import Any, Optional, List, Union
+import orjson
 from redis.asyncio import Redis, ConnectionPool
 from redis.exceptions import RedisError
 
@@ -114,16 +114,46 @@ class RedisCache:
         value = await self.get(key)
         if value:
             try:
-                return json.loads(value)
-            except json.JSONDecodeError as e:
+                return orjson.loads(value)
+            except orjson.JSONDecodeError as e:
                 logger.error(f"JSON解析失败 {key}: {str(e)}")
                 return None
         return None
 
+    async def get_json_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """
+        批量获取JSON格式的缓存值（单次MGET往返）
+
+        Args:
+            keys: 缓存键列表
+
+        Returns:
+            与keys顺序一致的解析结果，不存在或解析失败的位置为None
+        """
+        if not keys:
+            return []
+
+        try:
+            values = await self.client.mget(keys)
+        except RedisError as e:
+            logger.error(f"批量获取缓存失败: {str(e)}")
+            raise CacheException(f"批量获取缓存失败: {str(e)}")
+
+        results: List[Optional[Any]] = []
+        for key, value in zip(keys, values):
+            if value:
+                try:
+                    results.append(orjson.loads(value))
+                    continue
+                except orjson.JSONDecodeError as e:
+                    logger.error(f"JSON解析失败 {key}: {str(e)}")
+            results.append(None)
+        return results
+
     async def set(
         self,
         key: str,
-        value: str,
+        value: Union[str, bytes],
         ttl: Optional[int] = None
     ) -> bool:
         """
@@ -166,7 +196,8 @@ class RedisCache:
             是否设置成功
         """
         try:
-            json_value = json.dumps(value, ensure_ascii=False)
+            # orjson一次性输出UTF-8字节，Redis可直接写入
+            json_value = orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
             return await self.set(key, json_value, ttl)
         except (TypeError, ValueError) as e:
             logger.error(f"JSON序列化失败 {key}: {str(e)}")
@@ -303,7 +334,7 @@ class RedisCache:
             logger.error(f"获取Hash失败 {name}.{key}: {str(e)}")
             return None
 
-    async def hset(self, name: str, key: str, value: str) -> bool:
+    async def hset(self, name: str, key: str, value: Union[str, bytes]) -> bool:
         """设置Hash字段值"""
         try:
             await self.client.hset(name, key, value)
@@ -337,7 +368,7 @@ class RedisCache:
             logger.error(f"列表推入失败 {key}: {str(e)}")
             raise CacheException(f"列表推入失败: {str(e)}")
 
-    async def rpush(self, key: str, *values: str) -> int:
+    async def rpush(self, key: str, *values: Union[str, bytes]) -> int:
         """从右侧推入列表"""
         try:
             return await self.client.rpush(key, *values)
@@ -3,7 +3,7 @@
 使用 Pydantic Settings 进行配置管理和验证
 """
 
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -83,6 +83,46 @@ class Settings(BaseSettings):
         default="text-embedding-v3",
         description="Embedding模型"
     )
+    qwen_context_window: Dict[str, int] = Field(
+        default={
+            "qwen-max": 32768,
+            "qwen-plus": 131072,
+            "qwen-turbo": 131072,
+            "qwen-vl-max": 32768,
+        },
+        description="各模型的上下文窗口(token)，超出时在本地直接拒绝请求"
+    )
+    qwen_default_context_window: int = Field(default=131072, description="未配置模型的上下文窗口(token)")
+    llm_max_output_tokens: int = Field(default=8192, description="单次LLM调用的最大输出token数")
+    math_batch_concurrency: int = Field(default=4, description="批量数学验证同时进行的LLM调用数")
+    llm_max_connections: int = Field(default=100, description="LLM HTTP连接池最大连接数")
+    llm_max_keepalive_connections: int = Field(default=64, description="LLM HTTP连接池最大保活连接数")
+    llm_use_aiohttp: bool = Field(
+        default=False,
+        description="LLM客户端使用aiohttp传输层（高并发下延迟更低），未安装openai[aiohttp]时回退到httpx；"
+                    "aiohttp连接器只受llm_max_connections限制，保活连接数上限不生效"
+    )
+    llm_tool_history_max_tokens: int = Field(
+        default=8000,
+        description="工具调用历史中工具结果的token预算，超出后省略最近一轮之前的结果，0表示不压缩"
+    )
+    llm_warmup_connections: int = Field(
+        default=4,
+        description="启动时预先建立的LLM HTTP连接数，0表示不预热"
+    )
+    embedding_batch_size: int = Field(default=10, description="单次嵌入API调用的最大文本数（text-embedding-v3上限为10）")
+    embedding_batch_window_ms: float = Field(
+        default=5,
+        description="并发的单条嵌入请求的合并等待时间(毫秒)，0表示不合并"
+    )
+    qwen_structured_output: bool = Field(
+        default=True,
+        description="提供响应schema时使用原生结构化输出(json_schema)，关闭时在提示词中附加schema并使用JSON模式"
+    )
+    qwen_prompt_cache: bool = Field(
+        default=False,
+        description="为系统提示词启用DashScope显式上下文缓存（复用服务端前缀KV缓存）"
+    )
 
     # 安全配置
     secret_key: str = Field(
@@ -138,6 +178,15 @@ class Settings(BaseSettings):
     # 缓存配置
     cache_ttl_seconds: int = Field(default=3600, description="缓存TTL(秒)")
     analysis_cache_ttl: int = Field(default=3600, description="分析结果缓存TTL(秒)")
+    agent_local_cache_size: int = Field(default=1024, description="Agent进程内缓存容量")
+    agent_local_cache_ttl: int = Field(default=60, description="Agent进程内缓存TTL(秒)")
+    llm_response_cache: bool = Field(default=True, description="是否缓存LLM原始响应（仅低温度请求）")
+    llm_response_cache_ttl: int = Field(default=1800, description="LLM响应缓存TTL(秒)")
+    llm_cache_max_temperature: float = Field(
+        default=0.5,
+        description="温度不超过该值的输出才缓存（Agent结果缓存和LLM响应缓存共用），高温度请求期望每次输出不同"
+    )
+    embedding_cache_ttl: int = Field(default=2592000, description="文本嵌入缓存TTL(秒)，嵌入结果是确定的")
 
     # Agent配置
     agent_timeout_seconds: int = Field(default=30, description="Agent超时时间(秒)")
@@ -146,6 +195,14 @@ class Settings(BaseSettings):
 
     # 文件上传配置
     max_upload_size_mb: int = Field(default=10, description="最大上传文件大小(MB)")
+    ocr_concurrency: int = Field(default=8, description="批量OCR最大并发数")
+    ocr_downscale_threshold_kb: int = Field(
+        default=2048,
+        description="超过该大小(KB)的图片在OCR前先缩小"
+    )
+    ocr_max_image_side: int = Field(default=1920, description="OCR图片缩小后的最长边(像素)")
+    ocr_cache_ttl: int = Field(default=604800, description="OCR识别结果缓存TTL(秒)")
+    ocr_cache_min_bytes: int = Field(default=4096, description="小于该大小(字节)的图片不缓存识别结果")
     allowed_image_types: List[str] = Field(
         default=["image/jpeg", "image/png", "image/jpg"],
         description="允许的图片类型"
@@ -13,6 +13,8 @@ from app.core.logging import logger
 from app.core.exceptions import BaseAppException
 from app.database.connection import init_db, close_db, check_db_connection
 from app.cache.redis_client import check_redis_connection, close_redis
+from app.services.llm.qwen_client import get_qwen_client
+from app.services.orchestrator.agent_coordinator import agent_coordinator
 
 # 导入路由
 from app.api.v1 import session, literature, science, chat, ocr, feedback, system
@@ -40,6 +42,10 @@ async def lifespan(app: FastAPI):
     else:
         logger.error("✗ Redis连接失败")
 
+    # 在事件循环中创建LLM客户端，连接池随应用生命周期创建和关闭
+    qwen_client = get_qwen_client()
+    await qwen_client.warmup()
+
     logger.info("=" * 60)
     logger.info("智能学习助手系统已启动")
     logger.info(f"API文档: http://{settings.host}:{settings.port}/docs")
@@ -52,6 +58,10 @@ async def lifespan(app: FastAPI):
     logger.info("关闭应用...")
     await close_db()
     await close_redis()
+    await qwen_client.aclose()
+    # 已关闭的客户端不能再被get_qwen_client返回，缓存的Agent也不能继续持有它
+    get_qwen_client.cache_clear()
+    agent_coordinator.clear_agent_cache()
     logger.info("应用已关闭")
 
 
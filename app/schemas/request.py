@@ -183,3 +183,4 @@ class DebugRequest(BaseModel):
     breakpoint_step_number: int = Field(..., description="断点步骤号", ge=1)
     problem_statement: str = Field(..., description="问题描述")
     steps: List[MathStep] = Field(..., description="解题步骤")
+    include_variable_timeline: bool = Field(False, description="是否同时返回按变量组织的状态时间线")
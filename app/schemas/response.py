@@ -2,12 +2,48 @@
 Pydantic数据模型 - 响应模型
 """
 
+from __future__ import annotations
+
 from typing import Optional, List, Dict, Any
 from datetime import datetime
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 from app.schemas.common import ModeEnum
 
+__all__ = [
+    "OCRRegion",
+    "OCRResponse",
+    "DebugResponse",
+    "DecomposedStep",
+    "DecomposeStepsResponse",
+    "EditorHistoryItem",
+    "EditorHistoryResponse",
+    "PaginationResponse",
+    "SessionResponse",
+    "SessionStats",
+    "SessionDetailResponse",
+    "SessionSummary",
+    "SessionListResponse",
+    "EditorSyncResponse",
+    "ErrorAnnotation",
+    "GrammarCheckResponse",
+    "PolishVersion",
+    "PolishResponse",
+    "StructureNode",
+    "StructureAnalyzeResponse",
+    "DimensionScore",
+    "HealthScoreResponse",
+    "StepValidation",
+    "AssessmentSummary",
+    "ValidateStepsResponse",
+    "LogicTreeResponse",
+    "ChatMessageResponse",
+    "ChatHistoryResponse",
+    "HealthCheckResponse",
+    "CapabilityLimits",
+    "CapabilitiesResponse",
+]
+
 
 # ============================================
 # OCR响应模型
@@ -15,6 +51,8 @@ from app.schemas.common import ModeEnum
 
 class OCRRegion(BaseModel):
     """OCR识别区域"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     text: str = Field(..., description="识别的文本")
     bounding_box: List[int] = Field(..., description="边界框[x, y, width, height]")
     confidence: float = Field(..., description="置信度")
@@ -35,6 +73,7 @@ class OCRResponse(BaseModel):
 class DebugResponse(BaseModel):
     """断点调试响应"""
     execution_trace: List[Dict[str, Any]] = Field(..., description="执行追踪")
+    variable_timeline: Optional[Dict[str, Any]] = Field(None, description="按变量组织的状态时间线")
     current_state: Dict[str, Any] = Field(..., description="当前状态")
     insights: List[Dict[str, Any]] = Field(..., description="调试洞察")
     next_possible_actions: List[str] = Field(..., description="下一步可能的操作")
@@ -47,6 +86,8 @@ class DebugResponse(BaseModel):
 
 class DecomposedStep(BaseModel):
     """拆解的步骤"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     step_number: int = Field(..., description="步骤号")
     content: str = Field(..., description="步骤内容")
     formulas: List[str] = Field(default=[], description="公式列表")
@@ -64,6 +105,8 @@ class DecomposeStepsResponse(BaseModel):
 
 class EditorHistoryItem(BaseModel):
     """编辑历史项"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     version: int = Field(..., description="版本号")
     content: str = Field(..., description="内容")
     change_type: Optional[str] = Field(None, description="变更类型")
@@ -112,6 +155,13 @@ class SessionResponse(BaseModel):
         }
 
 
+class SessionStats(BaseModel):
+    """会话统计信息"""
+    total_interactions: int = Field(default=0, description="交互次数")
+    ai_calls: int = Field(default=0, description="AI调用次数")
+    tokens_used: int = Field(default=0, description="Token消耗")
+
+
 class SessionDetailResponse(BaseModel):
     """会话详情响应"""
     session_id: str = Field(..., description="会话ID")
@@ -120,14 +170,24 @@ class SessionDetailResponse(BaseModel):
     title: Optional[str] = Field(None, description="标题")
     grade_level: Optional[str] = Field(None, description="年级水平")
     status: str = Field(..., description="状态")
-    statistics: Dict[str, Any] = Field(..., description="统计信息")
+    statistics: SessionStats = Field(..., description="统计信息")
     created_at: datetime = Field(..., description="创建时间")
     updated_at: datetime = Field(..., description="更新时间")
 
 
+class SessionSummary(BaseModel):
+    """会话列表项"""
+    session_id: str = Field(..., description="会话ID")
+    title: Optional[str] = Field(None, description="标题")
+    mode: ModeEnum = Field(..., description="学习模式")
+    status: str = Field(..., description="状态")
+    created_at: Optional[datetime] = Field(None, description="创建时间")
+    preview: str = Field(default="", description="内容预览")
+
+
 class SessionListResponse(BaseModel):
     """会话列表响应"""
-    sessions: List[Dict[str, Any]] = Field(..., description="会话列表")
+    sessions: List[SessionSummary] = Field(..., description="会话列表")
     pagination: PaginationResponse = Field(..., description="分页信息")
 
 
@@ -145,6 +205,8 @@ class EditorSyncResponse(BaseModel):
 
 class ErrorAnnotation(BaseModel):
     """错误标注"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     id: str = Field(..., description="错误ID")
     type: str = Field(..., description="错误类型")
     severity: str = Field(..., description="严重程度")
@@ -182,13 +244,19 @@ class PolishResponse(BaseModel):
 
 class StructureNode(BaseModel):
     """结构节点"""
+    # 立即构建校验器，递归子节点复用同一份核心schema
+    model_config = ConfigDict(defer_build=False)
+
     id: str = Field(..., description="节点ID")
     type: str = Field(..., description="节点类型")
     title: str = Field(..., description="标题")
     summary: Optional[str] = Field(None, description="摘要")
     start_pos: int = Field(..., description="起始位置")
     end_pos: int = Field(..., description="结束位置")
-    children: List['StructureNode'] = Field(default=[], description="子节点")
+    children: List[StructureNode] = Field(default=[], description="子节点")
+
+
+StructureNode.model_rebuild()
 
 
 class StructureAnalyzeResponse(BaseModel):
@@ -201,6 +269,8 @@ class StructureAnalyzeResponse(BaseModel):
 
 class DimensionScore(BaseModel):
     """维度评分"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     score: float = Field(..., description="分数")
     reasoning: str = Field(..., description="评分理由")
     issues: List[str] = Field(..., description="问题列表")
@@ -230,10 +300,17 @@ class StepValidation(BaseModel):
     next_step_hint: Optional[str] = Field(None, description="下一步提示")
 
 
+class AssessmentSummary(BaseModel):
+    """解题整体评估"""
+    total_steps: int = Field(default=0, description="总步骤数")
+    valid_steps: int = Field(default=0, description="有效步骤数")
+    completion_status: str = Field(default="incomplete", description="完成状态")
+
+
 class ValidateStepsResponse(BaseModel):
     """验证步骤响应"""
     validation_results: List[StepValidation] = Field(..., description="验证结果")
-    overall_assessment: Dict[str, Any] = Field(..., description="整体评估")
+    overall_assessment: AssessmentSummary = Field(..., description="整体评估")
 
 
 class LogicTreeResponse(BaseModel):
@@ -264,17 +341,6 @@ class ChatHistoryResponse(BaseModel):
     has_more: bool = Field(..., description="是否有更多")
 
 
-# ============================================
-# OCR相关响应模型
-# ============================================
-
-class OCRResponse(BaseModel):
-    """OCR识别响应"""
-    text: str = Field(..., description="识别出的文字")
-    confidence: float = Field(..., description="置信度")
-    processing_time_ms: int = Field(..., description="处理时间(毫秒)")
-
-
 # ============================================
 # 系统相关响应模型
 # ============================================
@@ -286,9 +352,16 @@ class HealthCheckResponse(BaseModel):
     services: Dict[str, str] = Field(..., description="服务状态")
 
 
+class CapabilityLimits(BaseModel):
+    """系统限制"""
+    max_content_length: int = Field(..., description="最大内容长度")
+    max_file_size_mb: int = Field(..., description="最大上传文件大小(MB)")
+    rate_limit_per_minute: int = Field(..., description="每分钟请求限制")
+
+
 class CapabilitiesResponse(BaseModel):
     """系统能力响应"""
     modes: List[str] = Field(..., description="支持的模式")
     literature_capabilities: List[Dict[str, Any]] = Field(..., description="文科能力")
     science_capabilities: List[Dict[str, Any]] = Field(..., description="理科能力")
-    limits: Dict[str, Any] = Field(..., description="限制")
+    limits: CapabilityLimits = Field(..., description="限制")
@@ -3,26 +3,66 @@ Agent基类
 定义所有Agent的统一接口和通用功能
 """
 
+import re
+import sys
 import time
 import hashlib
-import json
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional, Type
-from pydantic import BaseModel
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, ClassVar, Dict, FrozenSet, List, Optional, Tuple, Type
+import orjson
+from cachetools import TTLCache
+from pydantic import BaseModel, ConfigDict, TypeAdapter, ValidationError
+from typing_extensions import TypedDict
+
+try:
+    # JSON5解析器（C扩展），仅在标准JSON解析失败时使用
+    import pyjson5
+except ImportError:
+    pyjson5 = None
 
 from app.config import settings
 from app.core.logging import get_logger
 from app.core.exceptions import AgentExecutionException, AgentTimeoutException
-from app.services.llm.qwen_client import qwen_client, QwenResponse
-from app.services.llm.model_router import model_router, TaskType
+from app.services.llm.qwen_client import get_qwen_client, QwenResponse
+from app.services.llm.model_router import get_model_router, TaskType
+from app.services.llm.json_stream import PartialJSONParser
 from app.cache.cache_strategies import analysis_cache
 from app.core.metrics import metrics_collector
 
 logger = get_logger(__name__)
 
+# 增量结果回调：(ijson路径, 已完整的值)
+PartialCallback = Callable[[str, Any], Awaitable[None]]
 
-class AgentConfig(BaseModel):
-    """Agent配置"""
+# JSON起始括号，以及括号匹配时需要关注的结构字符
+_JSON_OPEN = re.compile(r"[{\[]")
+_JSON_STRUCTURAL = re.compile(r'["\\{}\[\]]')
+
+# Markdown代码块：取第一个代码块的内容，缺少结束标记时取到文本末尾
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|\Z)", re.DOTALL)
+
+# 低熵内容检测：取样长度；取样短于下限时不检查；
+# 每多少个字符至少应出现一个不同字符，以及要求的不同字符数上限（英文字母表有限）
+_ENTROPY_SAMPLE_CHARS = 2000
+_ENTROPY_MIN_CHARS = 20
+_ENTROPY_CHARS_PER_DISTINCT = 10
+_ENTROPY_MAX_REQUIRED_DISTINCT = 10
+
+
+class OutputSchema(TypedDict, total=False):
+    """
+    LLM输出schema的基类（供_conform使用）
+
+    未声明的字段原样保留；数字可转换为字符串，
+    与宽松模式的其他转换一起挽救"1"、"true"等写法不规范的值
+    """
+    __pydantic_config__ = ConfigDict(extra="allow", coerce_numbers_to_str=True)
+
+
+@dataclass(frozen=True, slots=True)
+class AgentConfig:
+    """Agent配置（仅内部使用，不可变，可在同类Agent实例间共享）"""
     name: str
     task_type: TaskType
     temperature: Optional[float] = None
@@ -34,7 +74,11 @@ class AgentConfig(BaseModel):
 
 
 class AgentResult(BaseModel):
-    """Agent执行结果"""
+    """
+    Agent执行结果
+
+    由Agent内部构建时数据可信，使用model_construct跳过校验
+    """
     success: bool
     data: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
@@ -55,38 +99,68 @@ class BaseAgent(ABC):
     - system_prompt: 系统提示词
     - build_user_prompt: 构建用户提示词
     - parse_response: 解析AI响应
+
+    system_prompt可以是类属性，或在调用super().__init__之前设置的实例属性，
+    内容固定的Agent应一次性生成，避免每次调用重复拼接
     """
 
+    # 系统提示词，定义Agent的角色和能力
+    system_prompt: str = ""
+
+    # 流式调用时可提前回调的响应字段（ijson前缀路径）
+    partial_paths: ClassVar[Tuple[str, ...]] = ()
+
+    # 生成缓存键前需要规范化空白的文本参数，
+    # 只有结果与字符位置无关的Agent才应设置
+    cache_normalized_fields: ClassVar[Tuple[str, ...]] = ()
+
+    # 同一会话中是否只允许一个该Agent的请求执行，
+    # 各次调用互不影响的Agent可关闭，同一会话的请求并发执行
+    requires_session_lock: ClassVar[bool] = True
+
+    # 读取的输入参数和结果中的字段，Agent链据此判断阶段间的依赖，
+    # 没有依赖的阶段并发执行；None表示未声明，按依赖所有前序阶段处理
+    consumes: ClassVar[Optional[FrozenSet[str]]] = None
+    produces: ClassVar[Optional[FrozenSet[str]]] = None
+
+    # 进程内L1缓存，位于Redis分析缓存之前，键为"agent名:缓存键"。
+    # 保存序列化后的bytes，每次命中解码出新的对象，调用方修改结果不会影响缓存；
+    # 没有失效通知，Redis中的键过期或删除后，最多再命中agent_local_cache_ttl秒
+    _L1: ClassVar[TTLCache] = TTLCache(
+        maxsize=settings.agent_local_cache_size,
+        ttl=settings.agent_local_cache_ttl
+    )
+
     def __init__(self, config: AgentConfig) -> None:
         """
         初始化Agent
 
         Args:
             config: Agent配置
+
+        Raises:
+            TypeError: 子类未设置system_prompt
         """
+        if not self.system_prompt:
+            raise TypeError(f"{type(self).__name__} 必须设置system_prompt")
+
         self.config = config
-        self.llm = qwen_client
-        self.logger = get_logger(f"agent.{config.name}")
+        self.llm = get_qwen_client()
+        # 名称会作为缓存、指标字典的键反复使用，驻留后可按指针比较
+        self._name = sys.intern(config.name)
+        self.logger = get_logger(f"agent.{self._name}")
 
         # 从模型路由器获取推荐参数
-        self.model = model_router.select_model(config.task_type)
+        model_router = get_model_router()
+        self.model = sys.intern(model_router.select_model(config.task_type))
         self.temperature = config.temperature or model_router.get_recommended_temperature(config.task_type)
         self.max_tokens = config.max_tokens or model_router.get_recommended_max_tokens(config.task_type)
 
         self.logger.info(
-            f"Agent初始化: {config.name}, model={self.model}, "
+            f"Agent初始化: {self._name}, model={self.model}, "
             f"temp={self.temperature}, max_tokens={self.max_tokens}"
         )
 
-    @property
-    @abstractmethod
-    def system_prompt(self) -> str:
-        """
-        系统提示词
-        定义Agent的角色和能力
-        """
-        pass
-
     @abstractmethod
     def build_user_prompt(self, **kwargs: Any) -> str:
         """
@@ -115,6 +189,152 @@ class BaseAgent(ABC):
         """
         pass
 
+    @staticmethod
+    def _unfence(text: str) -> str:
+        """
+        去掉LLM响应外层的```json代码块标记
+
+        Args:
+            text: LLM响应文本
+
+        Returns:
+            代码块内的文本，没有代码块时返回去除首尾空白的原文
+        """
+        match = _FENCE.search(text)
+        return match.group(1).strip() if match else text.strip()
+
+    @staticmethod
+    def _loads_lenient(text: str) -> Any:
+        """
+        解析JSON，标准解析失败时按JSON5重试
+
+        LLM常输出尾随逗号、单引号、未加引号的键等，JSON5可以解析这些格式，
+        挽救原本会被丢弃的响应；只有解析失败时才会走较慢的JSON5
+
+        Args:
+            text: JSON文本
+
+        Returns:
+            解析后的对象
+
+        Raises:
+            orjson.JSONDecodeError: 两种方式均解析失败
+        """
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            if pyjson5 is None:
+                raise
+            try:
+                return pyjson5.loads(text)
+            except ValueError:
+                pass
+            raise
+
+    @staticmethod
+    def _conform(result: Any, adapter: TypeAdapter) -> Optional[Dict[str, Any]]:
+        """
+        按schema检查解析出的JSON，转换写法不规范的值，去掉无法转换的部分
+
+        按宽松模式校验，"1"、"true"等值转换为schema声明的类型；
+        转换后仍不符的顶层字段被删除（由调用方补全缺省值），列表中不符的元素被剔除，
+        下游遍历时不会因为LLM把列表写成对象等情况而出错
+
+        Args:
+            result: 解析出的JSON，去掉无法转换的部分时会被原地修改
+            adapter: 描述期望结构的TypeAdapter，类型为OutputSchema的子类
+
+        Returns:
+            修正后的结果，顶层不是JSON对象时为None
+        """
+        if not isinstance(result, dict):
+            return None
+
+        try:
+            return adapter.validate_python(result)
+        except ValidationError as e:
+            errors = e.errors()
+
+        # 按所在容器归并出错位置，列表元素从后往前删除，避免下标错位
+        bad: Dict[Tuple[Any, ...], set] = {}
+        for error in errors:
+            loc = error["loc"]
+            if loc:
+                bad.setdefault(loc[:-1], set()).add(loc[-1])
+
+        for parent_loc, keys in bad.items():
+            container: Any = result
+            try:
+                for part in parent_loc:
+                    container = container[part]
+            except (KeyError, IndexError, TypeError):
+                continue
+            if isinstance(container, list):
+                for index in sorted((k for k in keys if isinstance(k, int)), reverse=True):
+                    if index < len(container):
+                        del container[index]
+            elif isinstance(container, dict):
+                for key in keys:
+                    container.pop(key, None)
+
+        # 去掉无法转换的部分后，其余的值仍按schema转换
+        try:
+            return adapter.validate_python(result)
+        except ValidationError:
+            return result
+
+    @staticmethod
+    def _extract_json(text: str) -> Any:
+        """
+        从AI响应中提取并解析第一个完整的JSON对象或数组
+        有```json代码块时只在代码块内查找，代码块前的说明文字中的括号不会被误认为JSON；
+        没有代码块时在全文中查找。单次扫描匹配括号，兼容前后说明文字的情况
+
+        Args:
+            text: AI响应文本
+
+        Returns:
+            解析后的JSON数据
+
+        Raises:
+            orjson.JSONDecodeError: 未找到完整的JSON或JSON格式错误
+        """
+        fence = _FENCE.search(text)
+        if fence is not None:
+            text = fence.group(1)
+
+        open_match = _JSON_OPEN.search(text)
+        if open_match is None:
+            return orjson.loads(text)
+
+        start = open_match.start()
+        depth = 0
+        in_string = False
+        escaped_pos = -1
+
+        # 只遍历引号、反斜杠和括号，跳过普通字符
+        for match in _JSON_STRUCTURAL.finditer(text, start):
+            pos = match.start()
+            if pos == escaped_pos:
+                continue
+
+            char = match.group()
+            if in_string:
+                if char == "\\":
+                    escaped_pos = pos + 1
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == "{" or char == "[":
+                depth += 1
+            elif char == "}" or char == "]":
+                depth -= 1
+                if depth == 0:
+                    return orjson.loads(text[start:pos + 1])
+
+        raise orjson.JSONDecodeError("JSON不完整", text, start)
+
     def validate_inputs(self, **kwargs: Any) -> None:
         """
         验证输入参数
@@ -128,6 +348,61 @@ class BaseAgent(ABC):
         """
         pass
 
+    @staticmethod
+    def reject_low_entropy(content: str) -> None:
+        """
+        拒绝明显无意义的内容（如同一字符的大量重复），避免浪费LLM调用
+
+        只检查开头的一段，set()在C层完成去重；要求的不同字符数随取样长度增加，
+        较短的正常内容（如"好好好"、"Hello"）不受影响
+
+        Args:
+            content: 待分析的文本
+
+        Raises:
+            ValueError: 内容不同字符过少
+        """
+        sample = content[:_ENTROPY_SAMPLE_CHARS]
+        if len(sample) < _ENTROPY_MIN_CHARS:
+            return
+        required = min(_ENTROPY_MAX_REQUIRED_DISTINCT, len(sample) // _ENTROPY_CHARS_PER_DISTINCT)
+        if len(set(sample)) < required:
+            raise ValueError("内容重复字符过多，无法进行有效分析")
+
+    async def resolve_locally(self, **kwargs: Any) -> Optional[Dict[str, Any]]:
+        """
+        不调用LLM直接得出结果
+        子类可以覆盖，对可机械验证的输入在本地计算，返回None时照常调用LLM
+
+        Args:
+            **kwargs: 输入参数
+
+        Returns:
+            与parse_response格式相同的结果，无法本地得出时为None
+        """
+        return None
+
+    def normalize_cache_inputs(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        规范化用于生成缓存键的输入
+        仅空白不同的相同内容会得到相同的缓存键，子类可以覆盖
+
+        Args:
+            kwargs: 输入参数
+
+        Returns:
+            规范化后的输入参数
+        """
+        if not self.cache_normalized_fields:
+            return kwargs
+
+        normalized = dict(kwargs)
+        for field in self.cache_normalized_fields:
+            value = normalized.get(field)
+            if isinstance(value, str):
+                normalized[field] = value.replace("\r\n", "\n").strip()
+        return normalized
+
     def generate_cache_key(self, **kwargs: Any) -> str:
         """
         生成缓存键
@@ -140,11 +415,28 @@ class BaseAgent(ABC):
         """
         # 将输入参数序列化为JSON并计算哈希
         key_data = {
-            "agent": self.config.name,
-            "inputs": kwargs
+            "agent": self._name,
+            "inputs": self.normalize_cache_inputs(kwargs)
         }
-        key_json = json.dumps(key_data, sort_keys=True, ensure_ascii=False)
-        return hashlib.sha256(key_json.encode()).hexdigest()
+        # orjson直接输出UTF-8字节，无需再encode
+        key_bytes = orjson.dumps(
+            key_data,
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        )
+        # BLAKE2b比SHA-256更快，128位摘要对缓存键足够
+        return hashlib.blake2b(key_bytes, digest_size=16).hexdigest()
+
+    def _l1_get(self, l1_key: str) -> Optional[Dict[str, Any]]:
+        """读取本地缓存，返回新解码的结果"""
+        data = self._L1.get(l1_key)
+        return orjson.loads(data) if data is not None else None
+
+    def _l1_set(self, l1_key: str, result: Dict[str, Any]) -> None:
+        """写入本地缓存，结果无法序列化时不缓存"""
+        try:
+            self._L1[l1_key] = orjson.dumps(result, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError as e:
+            self.logger.warning(f"结果无法序列化，不写入本地缓存: {str(e)}")
 
     async def get_from_cache(self, cache_key: str) -> Optional[Dict[str, Any]]:
         """
@@ -159,20 +451,71 @@ class BaseAgent(ABC):
         if not self.config.enable_cache:
             return None
 
+        l1_key = f"{self._name}:{cache_key}"
+        local_result = self._l1_get(l1_key)
+        if local_result is not None:
+            self.logger.debug(f"本地缓存命中: {self._name}")
+            return local_result
+
         try:
             # 从分析缓存获取
             cache_data = await analysis_cache.get_result(
-                analysis_type=self.config.name,
+                analysis_type=self._name,
                 content=cache_key
             )
             if cache_data:
-                self.logger.info(f"缓存命中: {self.config.name}")
-                return cache_data.get("results")
+                self.logger.info(f"缓存命中: {self._name}")
+                result = cache_data.get("results")
+                if result is not None:
+                    self._l1_set(l1_key, result)
+                return result
         except Exception as e:
             self.logger.warning(f"获取缓存失败: {str(e)}")
 
         return None
 
+    async def get_from_cache_many(self, cache_keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量从缓存获取结果，本地缓存未命中的键合并为一次Redis往返
+
+        Args:
+            cache_keys: 缓存键列表
+
+        Returns:
+            命中的缓存键到结果的映射
+        """
+        if not self.config.enable_cache or not cache_keys:
+            return {}
+
+        results: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        for cache_key in cache_keys:
+            local_result = self._l1_get(f"{self._name}:{cache_key}")
+            if local_result is not None:
+                results[cache_key] = local_result
+            else:
+                missing.append(cache_key)
+
+        if not missing:
+            return results
+
+        try:
+            cache_data_list = await analysis_cache.get_results_many(
+                analysis_type=self._name,
+                contents=missing
+            )
+        except Exception as e:
+            self.logger.warning(f"批量获取缓存失败: {str(e)}")
+            return results
+
+        for cache_key, cache_data in zip(missing, cache_data_list):
+            result = cache_data.get("results") if cache_data else None
+            if result is not None:
+                self._l1_set(f"{self._name}:{cache_key}", result)
+                results[cache_key] = result
+
+        return results
+
     async def save_to_cache(self, cache_key: str, result: Dict[str, Any]) -> None:
         """
         保存结果到缓存
@@ -184,23 +527,27 @@ class BaseAgent(ABC):
         if not self.config.enable_cache:
             return
 
+        # 写入时同步刷新本地缓存，避免读到旧结果
+        self._l1_set(f"{self._name}:{cache_key}", result)
+
         try:
             await analysis_cache.set_result(
-                analysis_type=self.config.name,
+                analysis_type=self._name,
                 content=cache_key,
                 result=result,
                 ttl=self.config.cache_ttl
             )
-            self.logger.debug(f"结果已缓存: {self.config.name}")
+            self.logger.debug(f"结果已缓存: {self._name}")
         except Exception as e:
             self.logger.warning(f"保存缓存失败: {str(e)}")
 
-    async def execute_llm(self, user_prompt: str) -> QwenResponse:
+    async def execute_llm(self, user_prompt: str, max_tokens: Optional[int] = None) -> QwenResponse:
         """
         执行LLM调用
 
         Args:
             user_prompt: 用户提示词
+            max_tokens: 最大输出token数，None使用Agent配置
 
         Returns:
             LLM响应
@@ -214,25 +561,88 @@ class BaseAgent(ABC):
                 user_prompt=user_prompt,
                 model=self.model,
                 temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                max_retries=self.config.retry_attempts
+                max_tokens=max_tokens or self.max_tokens,
+                max_retries=self.config.retry_attempts,
+                # Agent自行缓存解析后的结果，不再重复缓存原始响应
+                use_cache=False
             )
             return response
 
         except Exception as e:
             self.logger.error(f"LLM调用失败: {str(e)}")
             raise AgentExecutionException(
-                agent_name=self.config.name,
+                agent_name=self._name,
                 reason=str(e)
             )
 
-    async def run(self, **kwargs: Any) -> AgentResult:
+    async def execute_llm_streaming(
+        self,
+        user_prompt: str,
+        on_partial: PartialCallback
+    ) -> QwenResponse:
+        """
+        以流式方式执行LLM调用
+        partial_paths中的字段一旦完整即通过on_partial回调，
+        无需等待整个响应生成完毕
+
+        Args:
+            user_prompt: 用户提示词
+            on_partial: 增量结果回调
+
+        Returns:
+            完整的LLM响应
+
+        Raises:
+            AgentExecutionException: 执行失败
+        """
+        start_ns = time.perf_counter_ns()
+        parser = PartialJSONParser(self.partial_paths)
+        chunks: List[str] = []
+
+        try:
+            async for chunk in self.llm.stream_complete(
+                system_prompt=self.system_prompt,
+                user_prompt=user_prompt,
+                model=self.model,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens
+            ):
+                chunks.append(chunk)
+                for path, value in parser.feed(chunk):
+                    try:
+                        await on_partial(path, value)
+                    except Exception as e:
+                        self.logger.warning(f"增量结果回调失败: {path}, error={str(e)}")
+
+        except Exception as e:
+            self.logger.error(f"LLM流式调用失败: {str(e)}")
+            raise AgentExecutionException(
+                agent_name=self._name,
+                reason=str(e)
+            )
+
+        content = "".join(chunks)
+        return QwenResponse(
+            content=content,
+            model=self.model,
+            tokens_used=self.llm.estimate_tokens(content),
+            finish_reason="stop",
+            response_time_ms=(time.perf_counter_ns() - start_ns) / 1_000_000
+        )
+
+    async def run(
+        self,
+        skip_validation: bool = False,
+        deterministic: bool = False,
+        partial_callback: Optional[PartialCallback] = None,
+        **kwargs: Any
+    ) -> AgentResult:
         """
         执行Agent（模板方法）
 
         流程：
         1. 参数验证
-        2. 检查缓存
+        2. 检查缓存，能在本地得出结果时直接返回
         3. 构建提示词
         4. 执行LLM调用
         5. 解析结果
@@ -241,30 +651,64 @@ class BaseAgent(ABC):
         8. 返回结果
 
         Args:
+            skip_validation: 输入已由请求模型校验时可跳过参数验证
+            deterministic: 调用方接受复用结果时，高温度Agent也使用缓存
+            partial_callback: 增量结果回调，设置后以流式调用LLM并提前返回partial_paths中的字段
             **kwargs: 输入参数
 
         Returns:
             Agent执行结果
         """
-        start_time = time.time()
+        # 使用单调时钟计时，避免系统时间调整导致耗时为负
+        start_ns = time.perf_counter_ns()
 
         try:
             # 1. 参数验证
-            self.validate_inputs(**kwargs)
+            if not skip_validation:
+                self.validate_inputs(**kwargs)
 
-            # 2. 检查缓存
-            cache_key = self.generate_cache_key(**kwargs)
-            cached_result = await self.get_from_cache(cache_key)
-
-            if cached_result:
-                execution_time_ms = (time.time() - start_time) * 1000
-                return AgentResult(
+            # 2. 检查缓存（未启用缓存或高温度输出时不计算缓存键）
+            cache_key: Optional[str] = None
+            use_cache = self.config.enable_cache and (
+                deterministic or self.temperature <= settings.llm_cache_max_temperature
+            )
+            if use_cache:
+                cache_key = self.generate_cache_key(**kwargs)
+                cached_result = await self.get_from_cache(cache_key)
+
+                if cached_result:
+                    execution_time_ms = (time.perf_counter_ns() - start_ns) / 1_000_000
+                    return AgentResult.model_construct(
+                        success=True,
+                        data=cached_result,
+                        metadata={
+                            "from_cache": True,
+                            "execution_time_ms": execution_time_ms,
+                            "agent": self._name
+                        }
+                    )
+
+            # 能在本地得出结果时不调用LLM
+            local_result = await self.resolve_locally(**kwargs)
+            if local_result is not None:
+                if cache_key is not None:
+                    await self.save_to_cache(cache_key, local_result)
+                execution_time_ms = (time.perf_counter_ns() - start_ns) / 1_000_000
+                metrics_collector.record_agent_call(
+                    agent_name=self._name,
+                    success=True,
+                    execution_time_ms=execution_time_ms,
+                    tokens_used=0
+                )
+                return AgentResult.model_construct(
                     success=True,
-                    data=cached_result,
+                    data=local_result,
                     metadata={
-                        "from_cache": True,
+                        "from_cache": False,
+                        "local": True,
                         "execution_time_ms": execution_time_ms,
-                        "agent": self.config.name
+                        "tokens_used": 0,
+                        "agent": self._name
                     }
                 )
 
@@ -272,30 +716,34 @@ class BaseAgent(ABC):
             user_prompt = self.build_user_prompt(**kwargs)
 
             # 4. 执行LLM调用
-            llm_response = await self.execute_llm(user_prompt)
+            if partial_callback is not None and self.partial_paths:
+                llm_response = await self.execute_llm_streaming(user_prompt, partial_callback)
+            else:
+                llm_response = await self.execute_llm(user_prompt)
 
             # 5. 解析结果
             parsed_result = self.parse_response(llm_response.content)
 
             # 6. 缓存结果
-            await self.save_to_cache(cache_key, parsed_result)
+            if cache_key is not None:
+                await self.save_to_cache(cache_key, parsed_result)
 
             # 7. 记录指标
-            execution_time_ms = (time.time() - start_time) * 1000
+            execution_time_ms = (time.perf_counter_ns() - start_ns) / 1_000_000
             metrics_collector.record_agent_call(
-                agent_name=self.config.name,
+                agent_name=self._name,
                 success=True,
                 execution_time_ms=execution_time_ms,
                 tokens_used=llm_response.tokens_used
             )
 
             self.logger.info(
-                f"Agent执行成功: {self.config.name}, "
+                f"Agent执行成功: {self._name}, "
                 f"time={execution_time_ms:.2f}ms, tokens={llm_response.tokens_used}"
             )
 
             # 8. 返回结果
-            return AgentResult(
+            return AgentResult.model_construct(
                 success=True,
                 data=parsed_result,
                 metadata={
@@ -303,29 +751,29 @@ class BaseAgent(ABC):
                     "execution_time_ms": execution_time_ms,
                     "tokens_used": llm_response.tokens_used,
                     "model": llm_response.model,
-                    "agent": self.config.name
+                    "agent": self._name
                 }
             )
 
         except Exception as e:
-            execution_time_ms = (time.time() - start_time) * 1000
+            execution_time_ms = (time.perf_counter_ns() - start_ns) / 1_000_000
 
             # 记录失败指标
             metrics_collector.record_agent_call(
-                agent_name=self.config.name,
+                agent_name=self._name,
                 success=False,
                 execution_time_ms=execution_time_ms,
                 tokens_used=0
             )
 
-            self.logger.error(f"Agent执行失败: {self.config.name}, error={str(e)}")
+            self.logger.error(f"Agent执行失败: {self._name}, error={str(e)}")
 
-            return AgentResult(
+            return AgentResult.model_construct(
                 success=False,
                 data=None,
                 error=str(e),
                 metadata={
                     "execution_time_ms": execution_time_ms,
-                    "agent": self.config.name
+                    "agent": self._name
                 }
             )
@@ -3,48 +3,23 @@
 使用Context-Aware ReAct模式进行对话
 """
 
-import json
-from typing import Any, Dict, List
+import re
+from functools import lru_cache
+import orjson
+from typing import Any, ClassVar, Dict, List
 
 from app.services.agents.base import BaseAgent, AgentConfig
 from app.services.llm.model_router import TaskType
 
 
-class ChatAgent(BaseAgent):
-    """
-    智能对话Agent
+# 单条消息最大字符数
+_MAX_MESSAGE_CHARS = 2000
 
-    功能：
-    1. 上下文感知的对话
-    2. 引导式学习
-    3. 根据年级调整表达
-    4. 提供可操作的建议
-    """
+# 匹配```json ... ```或``` ... ```代码块中的JSON
+_JSON_FENCE = re.compile(r"```(?:json)?\s*(\{.*?\}|\[.*?\])\s*```", re.DOTALL)
 
-    def __init__(self, grade_level: str = "middle", mode: str = "literature", subject: str = "") -> None:
-        """
-        初始化Chat Agent
-
-        Args:
-            grade_level: 年级水平
-            mode: 学习模式
-            subject: 科目
-        """
-        config = AgentConfig(
-            name="chat_agent",
-            task_type=TaskType.CHAT,
-            temperature=0.8,  # 对话需要自然
-            enable_cache=False  # 对话不缓存
-        )
-        super().__init__(config)
-        self.grade_level = grade_level
-        self.mode = mode
-        self.subject = subject
-
-    @property
-    def system_prompt(self) -> str:
-        """系统提示词"""
-        return f"""你是一个友好、耐心的AI学习助手，专门帮助K12学生解决学习问题。
+# 系统提示词模板（JSON示例中的花括号已转义）
+_SYSTEM_PROMPT_TEMPLATE = """你是一个友好、耐心的AI学习助手，专门帮助K12学生解决学习问题。
 
 ## 你的特点
 - 语言亲切，像朋友一样交流
@@ -53,9 +28,9 @@ class ChatAgent(BaseAgent):
 - 根据学生年级调整表达方式
 
 ## 当前上下文
-- 学生年级：{self.grade_level}
-- 学习模式：{self.mode}
-- 当前科目：{self.subject}
+- 学生年级：{grade_level}
+- 学习模式：{mode}
+- 当前科目：{subject}
 
 ## 回答原则
 1. 先理解学生的问题和困惑
@@ -76,6 +51,71 @@ class ChatAgent(BaseAgent):
 ```
 """
 
+
+@lru_cache(maxsize=64)
+def _render_system_prompt(grade_level: str, mode: str, subject: str) -> str:
+    """渲染系统提示词，年级/模式/科目组合有限，结果按组合缓存"""
+    return _SYSTEM_PROMPT_TEMPLATE.format_map({
+        "grade_level": grade_level,
+        "mode": mode,
+        "subject": subject
+    })
+
+
+# 用户提示词固定结尾
+_CHAT_TAIL = """## 回答要求
+1. 理解学生的真实困惑
+2. 提供引导性的建议，不要直接给答案
+3. 使用适合学生年级的语言
+4. 给出具体可操作的步骤
+5. 提出后续问题，引导学生思考
+
+请开始回答。
+"""
+
+
+class ChatAgent(BaseAgent):
+    """
+    智能对话Agent
+
+    功能：
+    1. 上下文感知的对话
+    2. 引导式学习
+    3. 根据年级调整表达
+    4. 提供可操作的建议
+    """
+
+    # 配置对所有实例相同，只构建一次
+    _CONFIG: ClassVar[AgentConfig] = AgentConfig(
+        name="chat_agent",
+        task_type=TaskType.CHAT,
+        temperature=0.8,  # 对话需要自然
+        enable_cache=False  # 对话不缓存
+    )
+
+    # 每次对话的上下文由调用方传入，同一会话的多条消息可以并发回答
+    requires_session_lock = False
+
+    consumes = frozenset({"message", "chat_history", "context"})
+    produces = frozenset({"content", "message_type", "action_items", "follow_up_questions"})
+
+    def __init__(self, grade_level: str = "middle", mode: str = "literature", subject: str = "") -> None:
+        """
+        初始化Chat Agent
+
+        Args:
+            grade_level: 年级水平
+            mode: 学习模式
+            subject: 科目
+        """
+        self.grade_level = grade_level
+        self.mode = mode
+        self.subject = subject
+
+        # 年级、模式、科目在实例生命周期内不变，系统提示词只生成一次
+        self.system_prompt = _render_system_prompt(grade_level, mode, subject)
+        super().__init__(self._CONFIG)
+
     def build_user_prompt(self, **kwargs: Any) -> str:
         """
         构建用户提示词
@@ -92,66 +132,48 @@ class ChatAgent(BaseAgent):
         context = kwargs.get("context") or {}  # 确保context不是None
         chat_history = kwargs.get("chat_history", [])
 
-        prompt = f"""## 学生的问题
-{message}
-
-"""
+        parts = [f"## 学生的问题\n{message}\n\n"]
+        append = parts.append
 
         # 添加上下文信息
         if context:
-            prompt += "## 当前上下文\n"
+            append("## 当前上下文\n")
 
             if context.get("cursor_position"):
                 cursor = context["cursor_position"]
-                prompt += f"- 学生正在编辑第 {cursor.get('line', 0)} 行\n"
+                append(f"- 学生正在编辑第 {cursor.get('line', 0)} 行\n")
 
             if context.get("selected_text"):
-                prompt += f"- 选中的文本：\n```\n{context['selected_text']}\n```\n"
+                append(f"- 选中的文本：\n```\n{context['selected_text']}\n```\n")
 
             if context.get("recent_analysis"):
                 analysis = context["recent_analysis"]
-                prompt += f"- 最近的分析结果：{analysis.get('type', '')} - {analysis.get('summary', '')}\n"
+                append(f"- 最近的分析结果：{analysis.get('type', '')} - {analysis.get('summary', '')}\n")
 
-            prompt += "\n"
+            append("\n")
 
         # 添加对话历史
         if chat_history:
-            prompt += "## 对话历史\n"
+            append("## 对话历史\n")
             for msg in chat_history[-5:]:  # 只保留最近5条
                 role = msg.get("role", "")
                 content = msg.get("content", "")
                 if role == "user":
-                    prompt += f"学生：{content}\n"
+                    append(f"学生：{content}\n")
                 elif role == "assistant":
-                    prompt += f"助手：{content}\n"
-            prompt += "\n"
+                    append(f"助手：{content}\n")
+            append("\n")
 
-        prompt += """## 回答要求
-1. 理解学生的真实困惑
-2. 提供引导性的建议，不要直接给答案
-3. 使用适合学生年级的语言
-4. 给出具体可操作的步骤
-5. 提出后续问题，引导学生思考
-
-请开始回答。
-"""
-        return prompt
+        append(_CHAT_TAIL)
+        return "".join(parts)
 
     def parse_response(self, response: str) -> Dict[str, Any]:
         """解析AI响应"""
-        try:
-            response = response.strip()
-
-            if "```json" in response:
-                start = response.find("```json") + 7
-                end = response.find("```", start)
-                response = response[start:end].strip()
-            elif "```" in response:
-                start = response.find("```") + 3
-                end = response.find("```", start)
-                response = response[start:end].strip()
+        match = _JSON_FENCE.search(response)
+        payload = match.group(1) if match else response.strip()
 
-            result = json.loads(response)
+        try:
+            result = orjson.loads(payload)
 
             # 验证必需字段
             if "content" not in result:
@@ -168,11 +190,11 @@ class ChatAgent(BaseAgent):
 
             return result
 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             self.logger.error(f"JSON解析失败: {str(e)}")
             # 如果解析失败，直接返回原始响应
             return {
-                "content": response,
+                "content": payload,
                 "message_type": "response",
                 "action_items": [],
                 "follow_up_questions": []
@@ -181,11 +203,9 @@ class ChatAgent(BaseAgent):
     def validate_inputs(self, **kwargs: Any) -> None:
         """验证输入参数"""
         message = kwargs.get("message")
-        if not message:
-            raise ValueError("message参数不能为空")
-
-        if not isinstance(message, str):
-            raise ValueError("message必须是字符串类型")
+        if not message or not isinstance(message, str):
+            raise ValueError("message参数不能为空且必须是字符串类型")
 
-        if len(message) > 2000:
-            raise ValueError(f"消息过长，最大支持2000字符，当前{len(message)}字符")
+        message_len = len(message)
+        if message_len > _MAX_MESSAGE_CHARS:
+            raise ValueError(f"消息过长，最大支持{_MAX_MESSAGE_CHARS}字符，当前{message_len}字符")
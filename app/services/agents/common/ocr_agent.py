@@ -3,12 +3,123 @@ OCR识别Agent
 使用Qwen视觉模型进行图片文字识别
 """
 
-from typing import Any, Dict
-import base64
-
+import os
+import io
+import time
+import asyncio
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.cache.cache_strategies import ocr_cache
 from app.services.agents.base import BaseAgent, AgentConfig, AgentResult
 from app.services.llm.model_router import TaskType
 
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+# 识别语言映射
+_LANGUAGE_MAP = MappingProxyType({
+    "zh": "中文",
+    "en": "英文",
+    "auto": "自动检测语言"
+})
+
+# 文件扩展名到MIME类型的映射
+_EXT_MIME = MappingProxyType({
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+})
+
+
+def _sniff_mime(data: bytes) -> Optional[str]:
+    """
+    根据文件头魔数识别图片类型
+
+    Args:
+        data: 图片二进制数据
+
+    Returns:
+        MIME类型，无法识别返回None
+    """
+    head = data[:12]
+    if head.startswith(b"\x89PNG"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if head.startswith(b"GIF8"):
+        return "image/gif"
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+# 系统提示词，内容固定，模块加载时生成一次
+_SYSTEM_PROMPT = """你是一个专业的OCR识别助手，擅长识别图片中的文字内容。
+
+## 你的能力
+- 识别印刷体文字
+- 识别手写文字
+- 支持中文和英文
+- 保持原文的格式和结构
+
+## 识别原则
+1. 准确识别每个字符
+2. 保持原文的段落结构
+3. 标注不确定的字符
+4. 给出整体置信度
+
+## 输出格式
+请直接返回识别出的文字内容，保持原文的格式。
+如果有不确定的字符，用[?]标注。
+"""
+
+
+# 缩小后保持原格式保存的图片类型: MIME类型 -> Pillow格式名
+_DOWNSCALE_FORMATS = MappingProxyType({
+    "image/jpeg": "JPEG",
+    "image/png": "PNG",
+    "image/webp": "WEBP",
+})
+
+
+def _downscale_image(data: bytes, mime_type: str, max_side: int) -> bytes:
+    """
+    按最长边等比缩小图片
+
+    视觉模型本身会把大图缩小处理，提前缩小可减少base64编码和上传的数据量
+
+    Args:
+        data: 图片二进制数据
+        mime_type: 图片MIME类型
+        max_side: 缩小后的最长边(像素)
+
+    Returns:
+        缩小后的图片数据（格式不变），无需或无法缩小时返回原数据
+    """
+    image_format = _DOWNSCALE_FORMATS.get(mime_type)
+    if Image is None or image_format is None:
+        return data
+
+    with Image.open(io.BytesIO(data)) as image:
+        if max(image.size) <= max_side:
+            return data
+
+        image.thumbnail((max_side, max_side))
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        output = io.BytesIO()
+        image.save(output, format=image_format)
+
+    return output.getvalue()
+
 
 class OCRAgent(BaseAgent):
     """
@@ -21,6 +132,14 @@ class OCRAgent(BaseAgent):
     4. 返回识别结果和置信度
     """
 
+    system_prompt = _SYSTEM_PROMPT
+
+    # 每张图片独立识别，同一会话可以同时识别多张图片
+    requires_session_lock = False
+
+    consumes = frozenset({"image_data", "image_url", "image_filename", "language", "recognize_handwriting"})
+    produces = frozenset({"text", "confidence"})
+
     def __init__(self, language: str = "zh", recognize_handwriting: bool = False, **kwargs) -> None:
         """
         初始化OCR Agent
@@ -39,28 +158,6 @@ class OCRAgent(BaseAgent):
         self.language = language
         self.recognize_handwriting = recognize_handwriting
 
-    @property
-    def system_prompt(self) -> str:
-        """系统提示词"""
-        return """你是一个专业的OCR识别助手，擅长识别图片中的文字内容。
-
-## 你的能力
-- 识别印刷体文字
-- 识别手写文字
-- 支持中文和英文
-- 保持原文的格式和结构
-
-## 识别原则
-1. 准确识别每个字符
-2. 保持原文的段落结构
-3. 标注不确定的字符
-4. 给出整体置信度
-
-## 输出格式
-请直接返回识别出的文字内容，保持原文的格式。
-如果有不确定的字符，用[?]标注。
-"""
-
     @staticmethod
     def build_user_prompt(**kwargs: Any) -> str:
         """
@@ -76,16 +173,10 @@ class OCRAgent(BaseAgent):
         language = kwargs.get("language", "auto")
         recognize_handwriting = kwargs.get("recognize_handwriting", False)
 
-        language_map = {
-            "zh": "中文",
-            "en": "英文",
-            "auto": "自动检测语言"
-        }
-
         prompt = f"""请识别图片中的文字内容。
 
 ## 识别要求
-- 语言：{language_map.get(language, language)}
+- 语言：{_LANGUAGE_MAP.get(language, language)}
 - 手写识别：{'是' if recognize_handwriting else '否'}
 
 ## 注意事项
@@ -98,11 +189,12 @@ class OCRAgent(BaseAgent):
 """
         return prompt
 
-    async def run(self, **kwargs: Any) -> AgentResult:
+    async def run(self, skip_validation: bool = False, **kwargs: Any) -> AgentResult:
         """
         执行OCR识别
 
         Args:
+            skip_validation: 输入已由请求模型校验时可跳过参数验证
             image_url: 图片URL或base64编码（可选）
             image_data: 图片二进制数据（可选）
             image_filename: 图片文件名（可选）
@@ -112,56 +204,88 @@ class OCRAgent(BaseAgent):
         Returns:
             AgentResult对象
         """
-        import time
-        import base64
-
         start_time = time.time()
 
         try:
             # 验证输入
-            self.validate_inputs(**kwargs)
+            if not skip_validation:
+                self.validate_inputs(**kwargs)
 
             # 处理图片数据
             image_url = kwargs.get("image_url", "")
             image_data = kwargs.get("image_data")
 
-            # 如果提供了image_data，转换为base64 data URL
-            if image_data and not image_url:
-                # 检测图片类型
-                image_filename = kwargs.get("image_filename", "image.jpg")
-                if image_filename.lower().endswith('.png'):
-                    mime_type = "image/png"
-                elif image_filename.lower().endswith('.jpg') or image_filename.lower().endswith('.jpeg'):
-                    mime_type = "image/jpeg"
-                elif image_filename.lower().endswith('.gif'):
-                    mime_type = "image/gif"
-                elif image_filename.lower().endswith('.webp'):
-                    mime_type = "image/webp"
-                else:
-                    mime_type = "image/jpeg"  # 默认
-
-                # 转换为base64
-                base64_data = base64.b64encode(image_data).decode('utf-8')
-                image_url = f"data:{mime_type};base64,{base64_data}"
-
             language = kwargs.get("language", "auto")
+            recognize_handwriting = bool(kwargs.get("recognize_handwriting", False))
+
+            # 按原图内容查缓存，相同图片重复提交时跳过视觉模型调用
+            image_hash: Optional[str] = None
+            if image_data and not image_url and len(image_data) >= settings.ocr_cache_min_bytes:
+                image_hash = ocr_cache.generate_image_hash(image_data)
+                try:
+                    cached_text = await ocr_cache.get_text(image_hash, language, recognize_handwriting)
+                except Exception as e:
+                    self.logger.warning(f"读取OCR缓存失败: {str(e)}")
+                    cached_text = None
+
+                if cached_text:
+                    return AgentResult.model_construct(
+                        success=True,
+                        data={
+                            "text": cached_text,
+                            "confidence": self._estimate_confidence(cached_text),
+                            "language": language
+                        },
+                        metadata={
+                            "from_cache": True,
+                            "execution_time_ms": (time.time() - start_time) * 1000,
+                            "agent": self.config.name
+                        }
+                    )
+
+            # 如果提供了image_data，交由客户端直接编码，不在此构建data URL
+            mime_type = "image/jpeg"
+            if image_data and not image_url:
+                # 优先根据文件头检测图片类型，识别不了再看扩展名，默认JPEG
+                mime_type = _sniff_mime(image_data)
+                if mime_type is None:
+                    image_filename = kwargs.get("image_filename") or "image.jpg"
+                    ext = os.path.splitext(image_filename)[1].lower()
+                    mime_type = _EXT_MIME.get(ext, "image/jpeg")
+
+                # 大图先在线程池中缩小，避免编码和上传整张原图
+                if len(image_data) > settings.ocr_downscale_threshold_kb * 1024:
+                    try:
+                        image_data = await asyncio.to_thread(
+                            _downscale_image, image_data, mime_type, settings.ocr_max_image_side
+                        )
+                    except Exception as e:
+                        self.logger.warning(f"图片缩小失败，使用原图: {str(e)}")
 
             # 构建提示词
             user_prompt = self.build_user_prompt(**kwargs)
 
             # 使用Qwen视觉模型进行OCR
             result_text = await self.llm.analyze_image(
-                image_url=image_url,
+                image_url=image_url or None,
                 prompt=user_prompt,
-                model=self.llm.ocr_model
+                model=self.llm.ocr_model,
+                image_bytes=None if image_url else image_data,
+                mime_type=mime_type
             )
 
+            if image_hash and result_text:
+                try:
+                    await ocr_cache.set_text(image_hash, language, recognize_handwriting, result_text)
+                except Exception as e:
+                    self.logger.warning(f"保存OCR缓存失败: {str(e)}")
+
             # 计算置信度（简单估算）
             confidence = self._estimate_confidence(result_text)
 
             execution_time_ms = (time.time() - start_time) * 1000
 
-            return AgentResult(
+            return AgentResult.model_construct(
                 success=True,
                 data={
                     "text": result_text,
@@ -178,7 +302,7 @@ class OCRAgent(BaseAgent):
             execution_time_ms = (time.time() - start_time) * 1000
             self.logger.error(f"OCR识别失败: {str(e)}")
 
-            return AgentResult(
+            return AgentResult.model_construct(
                 success=False,
                 data=None,
                 error=str(e),
@@ -188,6 +312,48 @@ class OCRAgent(BaseAgent):
                 }
             )
 
+    async def run_batch(
+        self,
+        images: List[Dict[str, Any]],
+        concurrency: Optional[int] = None,
+        **shared: Any
+    ) -> List[AgentResult]:
+        """
+        并发识别多张图片（如多页文档或裁剪区域）
+
+        Args:
+            images: 每张图片的参数，如{"image_data": ..., "image_filename": ...}
+            concurrency: 最大并发数，None使用配置值
+            **shared: 所有图片共用的参数（language等）
+
+        Returns:
+            与images顺序一致的识别结果，单张失败不影响其他图片
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.ocr_concurrency)
+
+        async def _run_one(image: Dict[str, Any]) -> AgentResult:
+            async with semaphore:
+                return await self.run(**{**shared, **image})
+
+        results_list = await asyncio.gather(
+            *(_run_one(image) for image in images),
+            return_exceptions=True
+        )
+
+        results = []
+        for result in results_list:
+            if isinstance(result, BaseException):
+                self.logger.error(f"批量OCR识别异常: {str(result)}")
+                result = AgentResult.model_construct(
+                    success=False,
+                    data=None,
+                    error=str(result),
+                    metadata={"agent": self.config.name}
+                )
+            results.append(result)
+
+        return results
+
     @staticmethod
     def _estimate_confidence(text: str) -> float:
         """
@@ -199,19 +365,15 @@ class OCRAgent(BaseAgent):
         Returns:
             置信度 (0-1)
         """
+        # 空文本直接返回，非空时len(text)必然大于0
         if not text:
             return 0.0
 
-        # 统计不确定字符的数量
-        uncertain_count = text.count("[?]")
-        total_chars = len(text)
-
-        if total_chars == 0:
-            return 0.0
-
         # 简单估算：不确定字符越少，置信度越高
-        confidence = 1.0 - (uncertain_count / total_chars)
-        return max(0.0, min(1.0, confidence))
+        # "[?]"是ASCII子串，str.count直接在内部紧凑表示上做快速搜索，
+        # 无需先编码成UTF-8字节
+        confidence = 1.0 - text.count("[?]") / len(text)
+        return max(0.0, confidence)
 
     def parse_response(self, response: str) -> Dict[str, Any]:
         """
@@ -254,3 +416,7 @@ class OCRAgent(BaseAgent):
         if image_data:
             if not isinstance(image_data, bytes):
                 raise ValueError("image_data必须是bytes类型")
+
+            # 超限图片在编码和调用模型之前直接拒绝
+            if len(image_data) > settings.max_upload_size_bytes:
+                raise ValueError(f"图片过大，最大支持{settings.max_upload_size_mb}MB")
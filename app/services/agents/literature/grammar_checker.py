@@ -3,12 +3,12 @@
 使用Chain of Thought模式进行语法检查
 """
 
-import json
+import orjson
 from typing import Any, Dict, List
 
 from app.services.agents.base import BaseAgent, AgentConfig
 from app.services.llm.model_router import TaskType
-from app.services.llm.prompt_manager import prompt_manager
+from app.services.llm.prompt_manager import get_prompt_manager
 
 
 class GrammarCheckerAgent(BaseAgent):
@@ -22,6 +22,12 @@ class GrammarCheckerAgent(BaseAgent):
     4. 标注标点符号误用
     """
 
+    # 检查结果只取决于输入文本，同一会话的多段文本可以并发检查
+    requires_session_lock = False
+
+    consumes = frozenset({"content", "context", "check_types", "language"})
+    produces = frozenset({"errors", "summary"})
+
     def __init__(self, grade_level: str = "middle") -> None:
         """
         初始化语法检查Agent
@@ -35,16 +41,14 @@ class GrammarCheckerAgent(BaseAgent):
             temperature=0.3,  # 语法检查需要精确
             enable_cache=True
         )
-        super().__init__(config)
         self.grade_level = grade_level
 
-    @property
-    def system_prompt(self) -> str:
-        """系统提示词"""
-        return prompt_manager.render_prompt(
+        # Agent按请求创建，系统提示词只依赖年级，渲染结果由提示词管理器缓存复用
+        self.system_prompt = get_prompt_manager().render_prompt(
             "grammar_checker_system",
-            grade_level=self.grade_level
+            grade_level=grade_level
         )
+        super().__init__(config)
 
     def build_user_prompt(self, **kwargs: Any) -> str:
         """
@@ -149,21 +153,11 @@ class GrammarCheckerAgent(BaseAgent):
             解析后的结构化数据
         """
         try:
-            # 尝试提取JSON内容
-            response = response.strip()
-
-            # 如果响应包含```json标记，提取其中的JSON
-            if "```json" in response:
-                start = response.find("```json") + 7
-                end = response.find("```", start)
-                response = response[start:end].strip()
-            elif "```" in response:
-                start = response.find("```") + 3
-                end = response.find("```", start)
-                response = response[start:end].strip()
+            # 去掉```json代码块标记
+            response = self._unfence(response)
 
             # 解析JSON
-            result = json.loads(response)
+            result = orjson.loads(response)
 
             # 验证必需字段
             if "errors" not in result:
@@ -191,7 +185,7 @@ class GrammarCheckerAgent(BaseAgent):
 
             return result
 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             self.logger.error(f"JSON解析失败: {str(e)}, 响应: {response[:200]}")
             # 返回空结果
             return {
@@ -3,37 +3,15 @@
 使用Multi-dimensional CoT模式进行多维度评分
 """
 
-import json
+import orjson
 from typing import Any, Dict
 
 from app.services.agents.base import BaseAgent, AgentConfig
 from app.services.llm.model_router import TaskType
 
 
-class HealthScorerAgent(BaseAgent):
-    """
-    健康度评分Agent
-
-    功能：
-    1. 多维度评估文章质量
-    2. 给出具体的改进建议
-    3. 识别优势和不足
-    """
-
-    def __init__(self) -> None:
-        """初始化健康度评分Agent"""
-        config = AgentConfig(
-            name="health_scorer",
-            task_type=TaskType.HEALTH_SCORE,
-            temperature=0.5,
-            enable_cache=True
-        )
-        super().__init__(config)
-
-    @property
-    def system_prompt(self) -> str:
-        """系统提示词"""
-        return """你是一位专业的作文评分专家，擅长从多个维度评估文章质量。
+# 系统提示词，内容固定，模块加载时生成一次
+_SYSTEM_PROMPT = """你是一位专业的作文评分专家，擅长从多个维度评估文章质量。
 
 ## 评分维度
 1. **结构** (structure): 文章组织是否清晰、层次是否分明
@@ -73,6 +51,38 @@ class HealthScorerAgent(BaseAgent):
 ```
 """
 
+
+class HealthScorerAgent(BaseAgent):
+    """
+    健康度评分Agent
+
+    功能：
+    1. 多维度评估文章质量
+    2. 给出具体的改进建议
+    3. 识别优势和不足
+    """
+
+    system_prompt = _SYSTEM_PROMPT
+
+    # 评分结果与字符位置无关，首尾空白不同的相同文章共用缓存
+    cache_normalized_fields = ("content",)
+
+    # 流式调用时总分和等级先于各维度详情生成，可提前展示
+    partial_paths = ("overall_score", "grade", "dimensions")
+
+    consumes = frozenset({"content", "grade_level"})
+    produces = frozenset({"overall_score", "grade", "dimensions", "top_priorities", "strengths"})
+
+    def __init__(self) -> None:
+        """初始化健康度评分Agent"""
+        config = AgentConfig(
+            name="health_scorer",
+            task_type=TaskType.HEALTH_SCORE,
+            temperature=0.5,
+            enable_cache=True
+        )
+        super().__init__(config)
+
     @staticmethod
     def build_user_prompt(**kwargs: Any) -> str:
         """
@@ -123,18 +133,8 @@ class HealthScorerAgent(BaseAgent):
     def parse_response(self, response: str) -> Dict[str, Any]:
         """解析AI响应"""
         try:
-            response = response.strip()
-
-            if "```json" in response:
-                start = response.find("```json") + 7
-                end = response.find("```", start)
-                response = response[start:end].strip()
-            elif "```" in response:
-                start = response.find("```") + 3
-                end = response.find("```", start)
-                response = response[start:end].strip()
-
-            result = json.loads(response)
+            # 提取并解析JSON内容
+            result = self._extract_json(response)
 
             # 验证必需字段
             if "overall_score" not in result:
@@ -173,7 +173,7 @@ class HealthScorerAgent(BaseAgent):
 
             return result
 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             self.logger.error(f"JSON解析失败: {str(e)}")
             return {
                 "overall_score": 0.0,
@@ -189,8 +189,7 @@ class HealthScorerAgent(BaseAgent):
                 "strengths": []
             }
 
-    @staticmethod
-    def validate_inputs(**kwargs: Any) -> None:
+    def validate_inputs(self, **kwargs: Any) -> None:
         """验证输入参数"""
         content = kwargs.get("content")
         if not content:
@@ -201,3 +200,5 @@ class HealthScorerAgent(BaseAgent):
 
         if len(content) > 50000:
             raise ValueError(f"文章过长，最大支持50000字符")
+
+        self.reject_low_entropy(content)
@@ -3,39 +3,16 @@
 使用ReAct模式进行文本润色
 """
 
-import json
+import orjson
+from types import MappingProxyType
 from typing import Any, Dict, List
 
 from app.services.agents.base import BaseAgent, AgentConfig
 from app.services.llm.model_router import TaskType
-from app.services.llm.prompt_manager import prompt_manager
 
 
-class PolishAgent(BaseAgent):
-    """
-    文本润色Agent
-
-    功能：
-    1. 优化句式结构
-    2. 丰富词汇运用
-    3. 增强文采
-    4. 保持学生原有风格
-    """
-
-    def __init__(self) -> None:
-        """初始化文本润色Agent"""
-        config = AgentConfig(
-            name="polish_agent",
-            task_type=TaskType.POLISH,
-            temperature=0.7,  # 润色需要创造性
-            enable_cache=True
-        )
-        super().__init__(config)
-
-    @property
-    def system_prompt(self) -> str:
-        """系统提示词"""
-        return """你是一位经验丰富的写作指导老师，擅长帮助学生提升文章质量。
+# 系统提示词，内容固定，模块加载时生成一次
+_SYSTEM_PROMPT = """你是一位经验丰富的写作指导老师，擅长帮助学生提升文章质量。
 
 ## 你的专长
 - 优化句式结构，使表达更流畅
@@ -68,6 +45,52 @@ class PolishAgent(BaseAgent):
 ```
 """
 
+
+# 润色方向映射
+_DIRECTION_MAP = MappingProxyType({
+    "enhance_fluency": "增强流畅度",
+    "add_vividness": "增加生动性",
+    "simplify": "简化表达",
+    "formalize": "正式化表达"
+})
+
+# 风格映射
+_STYLE_MAP = MappingProxyType({
+    "formal": "正式",
+    "casual": "随意",
+    "literary": "文学性"
+})
+
+
+class PolishAgent(BaseAgent):
+    """
+    文本润色Agent
+
+    功能：
+    1. 优化句式结构
+    2. 丰富词汇运用
+    3. 增强文采
+    4. 保持学生原有风格
+    """
+
+    system_prompt = _SYSTEM_PROMPT
+
+    # 流式调用时每个润色版本生成完毕即可展示
+    partial_paths = ("versions.item",)
+
+    consumes = frozenset({"text", "context", "grade_level", "polish_direction", "target_style"})
+    produces = frozenset({"versions", "recommended", "recommendation_reason"})
+
+    def __init__(self) -> None:
+        """初始化文本润色Agent"""
+        config = AgentConfig(
+            name="polish_agent",
+            task_type=TaskType.POLISH,
+            temperature=0.7,  # 润色需要创造性
+            enable_cache=True
+        )
+        super().__init__(config)
+
     def build_user_prompt(self, **kwargs: Any) -> str:
         """
         构建用户提示词
@@ -88,21 +111,6 @@ class PolishAgent(BaseAgent):
         context = kwargs.get("context") or {}  # 确保context不是None
         grade_level = kwargs.get("grade_level", "middle")
 
-        # 润色方向映射
-        direction_map = {
-            "enhance_fluency": "增强流畅度",
-            "add_vividness": "增加生动性",
-            "simplify": "简化表达",
-            "formalize": "正式化表达"
-        }
-
-        # 风格映射
-        style_map = {
-            "formal": "正式",
-            "casual": "随意",
-            "literary": "文学性"
-        }
-
         prompt = f"""## 当前任务
 请对以下{grade_level}年级学生的文本进行润色。
 
@@ -112,10 +120,10 @@ class PolishAgent(BaseAgent):
 ```
 
 ### 润色方向
-{direction_map.get(polish_direction, polish_direction)}
+{_DIRECTION_MAP.get(polish_direction, polish_direction)}
 
 ### 目标风格
-{style_map.get(target_style, target_style)}
+{_STYLE_MAP.get(target_style, target_style)}
 
 """
 
@@ -163,20 +171,8 @@ class PolishAgent(BaseAgent):
             解析后的结构化数据
         """
         try:
-            # 提取JSON内容
-            response = response.strip()
-
-            if "```json" in response:
-                start = response.find("```json") + 7
-                end = response.find("```", start)
-                response = response[start:end].strip()
-            elif "```" in response:
-                start = response.find("```") + 3
-                end = response.find("```", start)
-                response = response[start:end].strip()
-
-            # 解析JSON
-            result = json.loads(response)
+            # 提取并解析JSON内容
+            result = self._extract_json(response)
 
             # 验证必需字段
             if "versions" not in result:
@@ -203,7 +199,7 @@ class PolishAgent(BaseAgent):
 
             return result
 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             self.logger.error(f"JSON解析失败: {str(e)}, 响应: {response[:200]}")
             return {
                 "versions": [],
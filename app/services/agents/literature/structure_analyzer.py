@@ -3,38 +3,15 @@
 使用Tree of Thought模式分析文章结构
 """
 
-import json
+import orjson
 from typing import Any, Dict, List
 
 from app.services.agents.base import BaseAgent, AgentConfig
 from app.services.llm.model_router import TaskType
 
 
-class StructureAnalyzerAgent(BaseAgent):
-    """
-    结构分析Agent
-
-    功能：
-    1. 分析文章整体结构
-    2. 识别段落层次关系
-    3. 分析逻辑连贯性
-    4. 生成结构树
-    """
-
-    def __init__(self) -> None:
-        """初始化结构分析Agent"""
-        config = AgentConfig(
-            name="structure_analyzer",
-            task_type=TaskType.STRUCTURE_ANALYSIS,
-            temperature=0.5,
-            enable_cache=True
-        )
-        super().__init__(config)
-
-    @property
-    def system_prompt(self) -> str:
-        """系统提示词"""
-        return """你是一位专业的文章结构分析专家，擅长分析文章的组织结构和逻辑关系。
+# 系统提示词，内容固定，模块加载时生成一次
+_SYSTEM_PROMPT = """你是一位专业的文章结构分析专家，擅长分析文章的组织结构和逻辑关系。
 
 ## 你的能力
 - 识别文章的整体结构模式（总分总、并列式、递进式等）
@@ -80,6 +57,36 @@ class StructureAnalyzerAgent(BaseAgent):
 ```
 """
 
+
+class StructureAnalyzerAgent(BaseAgent):
+    """
+    结构分析Agent
+
+    功能：
+    1. 分析文章整体结构
+    2. 识别段落层次关系
+    3. 分析逻辑连贯性
+    4. 生成结构树
+    """
+
+    system_prompt = _SYSTEM_PROMPT
+
+    # 流式调用时结构类型和每个一级子节点生成完毕即可展示
+    partial_paths = ("structure_type", "overall_pattern", "tree.children.item")
+
+    consumes = frozenset({"content", "grade_level"})
+    produces = frozenset({"structure_type", "overall_pattern", "tree", "relationships", "analysis"})
+
+    def __init__(self) -> None:
+        """初始化结构分析Agent"""
+        config = AgentConfig(
+            name="structure_analyzer",
+            task_type=TaskType.STRUCTURE_ANALYSIS,
+            temperature=0.5,
+            enable_cache=True
+        )
+        super().__init__(config)
+
     @staticmethod
     def build_user_prompt(**kwargs: Any) -> str:
         """
@@ -124,18 +131,8 @@ class StructureAnalyzerAgent(BaseAgent):
     def parse_response(self, response: str) -> Dict[str, Any]:
         """解析AI响应"""
         try:
-            response = response.strip()
-
-            if "```json" in response:
-                start = response.find("```json") + 7
-                end = response.find("```", start)
-                response = response[start:end].strip()
-            elif "```" in response:
-                start = response.find("```") + 3
-                end = response.find("```", start)
-                response = response[start:end].strip()
-
-            result = json.loads(response)
+            # 提取并解析JSON内容
+            result = self._extract_json(response)
 
             # 验证必需字段
             if "structure_type" not in result:
@@ -168,7 +165,7 @@ class StructureAnalyzerAgent(BaseAgent):
 
             return result
 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             self.logger.error(f"JSON解析失败: {str(e)}")
             return {
                 "structure_type": "unknown",
@@ -191,8 +188,7 @@ class StructureAnalyzerAgent(BaseAgent):
                 }
             }
 
-    @staticmethod
-    def validate_inputs(**kwargs: Any) -> None:
+    def validate_inputs(self, **kwargs: Any) -> None:
         """验证输入参数"""
         content = kwargs.get("content")
         if not content:
@@ -203,3 +199,5 @@ class StructureAnalyzerAgent(BaseAgent):
 
         if len(content) > 50000:
             raise ValueError(f"文章过长，最大支持50000字符")
+
+        self.reject_low_entropy(content)
@@ -4,77 +4,53 @@ Debugger Agent - 断点调试Agent
 """
 
 from typing import Dict, Any, List, Optional
-from pydantic import BaseModel, Field
 
 from app.services.agents.base import BaseAgent, AgentConfig, AgentResult
 from app.services.llm.qwen_client import QwenClient
+from app.services.llm.model_router import TaskType
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 
 
-class VariableState(BaseModel):
-    """变量状态"""
-    name: str
-    value: str
-    type: str  # 'known', 'unknown', 'derived'
-    how_derived: Optional[str] = None
-    constraints: Optional[str] = None
-
-
-class ExecutionStep(BaseModel):
-    """执行步骤"""
-    step_number: int
-    content: str
-    formula: Optional[str] = None
-    variables_before: Dict[str, VariableState]
-    variables_after: Dict[str, VariableState]
-    operation: str
-    is_valid: bool
-    notes: Optional[str] = None
-
-
-class DebugInsight(BaseModel):
-    """调试洞察"""
-    type: str  # 'warning', 'suggestion', 'error', 'info'
-    message: str
-    related_step: Optional[int] = None
-    severity: str = 'medium'
-
-
-class DebuggerAgent(BaseAgent):
+def _trace_to_soa(trace: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
-    断点调试Agent
+    将按步骤组织的执行追踪转换为按变量组织的时间线
 
-    职责：
-    1. 在指定步骤设置断点
-    2. 追踪变量状态变化
-    3. 检查已用和未用条件
-    4. 提供调试洞察和建议
-    5. 验证当前状态的正确性
+    每个变量只出现一次，值按步骤顺序排列，便于逐变量对比变化
 
-    使用State Tracking模式：
-    - 维护完整的状态历史
-    - 追踪每个变量的来源
-    - 识别未使用的条件
-    - 提供下一步可能的操作
+    Args:
+        trace: 执行追踪（每步含variables_after）
+
+    Returns:
+        {"step_numbers": [...], "operations": [...], "variables": {变量名: [每步的值]}}
     """
+    steps = [step for step in trace if isinstance(step, dict)]
+    snapshots = [
+        step.get("variables_after") if isinstance(step.get("variables_after"), dict) else {}
+        for step in steps
+    ]
+
+    # dict保持插入顺序，变量按首次出现的顺序排列
+    names = dict.fromkeys(name for snapshot in snapshots for name in snapshot)
+
+    variables: Dict[str, List[Optional[str]]] = {}
+    for name in names:
+        values: List[Optional[str]] = []
+        for snapshot in snapshots:
+            state = snapshot.get(name)
+            values.append(state.get("value") if isinstance(state, dict) else state)
+        variables[name] = values
+
+    return {
+        "step_numbers": [step.get("step_number", i) for i, step in enumerate(steps, 1)],
+        "operations": [step.get("operation", "") for step in steps],
+        "variables": variables
+    }
 
-    def __init__(self, **kwargs) -> None:
-        """初始化调试Agent"""
-        config = AgentConfig(
-            name="debugger",
-            task_type="debug",
-            temperature=0.3,
-            enable_cache=False
-        )
-        super().__init__(config)
-        self.logger = logger
 
-    @property
-    def system_prompt(self) -> str:
-        """系统提示词"""
-        return """你是一个专业的数学解题调试助手，帮助学生理解解题过程中的每一步。
+# 系统提示词，内容固定，模块加载时生成一次
+_SYSTEM_PROMPT = """你是一个专业的数学解题调试助手，帮助学生理解解题过程中的每一步。
 
 ## 你的角色
 - 像调试器一样，追踪解题过程中的状态变化
@@ -170,6 +146,47 @@ class DebuggerAgent(BaseAgent):
 - 发现问题时要指出具体位置
 """
 
+
+class DebuggerAgent(BaseAgent):
+    """
+    断点调试Agent
+
+    职责：
+    1. 在指定步骤设置断点
+    2. 追踪变量状态变化
+    3. 检查已用和未用条件
+    4. 提供调试洞察和建议
+    5. 验证当前状态的正确性
+
+    使用State Tracking模式：
+    - 维护完整的状态历史
+    - 追踪每个变量的来源
+    - 识别未使用的条件
+    - 提供下一步可能的操作
+    """
+
+    system_prompt = _SYSTEM_PROMPT
+
+    # 流式调用时每个执行步骤追踪完成即可展示
+    partial_paths = ("execution_trace.item",)
+
+    consumes = frozenset({"problem_statement", "steps", "breakpoint_step_number", "grade_level"})
+    produces = frozenset({
+        "execution_trace", "current_state",
+        "insights", "next_possible_actions", "validation"
+    })
+
+    def __init__(self, **kwargs) -> None:
+        """初始化调试Agent"""
+        config = AgentConfig(
+            name="debugger",
+            task_type=TaskType.DEBUG,
+            temperature=0.3,
+            enable_cache=False
+        )
+        super().__init__(config)
+        self.logger = logger
+
     def build_user_prompt(self, **kwargs) -> str:
         """生成用户提示词（实现BaseAgent的抽象方法）"""
         problem_statement = kwargs.get('problem_statement', '')
@@ -177,13 +194,14 @@ class DebuggerAgent(BaseAgent):
         breakpoint_step = kwargs.get('breakpoint_step_number', len(steps))
         grade_level = kwargs.get('grade_level', 'middle')
 
-        # 构建步骤列表
-        steps_text = ""
+        # 构建步骤列表（列表收集后一次拼接，避免长步骤列表反复复制字符串）
+        parts: List[str] = []
         for i, step in enumerate(steps, 1):
-            steps_text += f"\n步骤 {i}:\n"
-            steps_text += f"  内容: {step.get('content', '')}\n"
-            if step.get('formula'):
-                steps_text += f"  公式: {step.get('formula')}\n"
+            parts.append(f"\n步骤 {i}:\n  内容: {step.get('content', '')}\n")
+            formula = step.get('formula')
+            if formula:
+                parts.append(f"  公式: {formula}\n")
+        steps_text = "".join(parts)
 
         prompt = f"""## 调试任务
 
@@ -223,26 +241,24 @@ class DebuggerAgent(BaseAgent):
         if 'steps' not in kwargs or not kwargs['steps']:
             raise ValueError("缺少steps参数或steps为空")
 
+    @staticmethod
+    def build_variable_timeline(trace: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        按需生成按变量组织的时间线，不随每次调试结果返回
+
+        Args:
+            trace: parse_response返回的执行追踪
+
+        Returns:
+            按变量组织的时间线
+        """
+        return _trace_to_soa(trace)
+
     def parse_response(self, response: str) -> Dict[str, Any]:
         """解析AI响应（实现BaseAgent的抽象方法）"""
         try:
-            import json
-
-            # 清理响应字符串
-            response = response.strip()
-
-            # 提取JSON内容
-            if "```json" in response:
-                start = response.find("```json") + 7
-                end = response.find("```", start)
-                response = response[start:end].strip()
-            elif "```" in response:
-                start = response.find("```") + 3
-                end = response.find("```", start)
-                response = response[start:end].strip()
-
-            # 解析JSON
-            result = json.loads(response)
+            # 提取并解析JSON内容
+            result = self._extract_json(response)
 
             # 验证必需字段
             required_fields = ['execution_trace', 'current_state', 'insights', 'next_possible_actions']
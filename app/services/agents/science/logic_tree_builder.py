@@ -3,11 +3,87 @@
 使用Backward Chaining模式构建逻辑推导树
 """
 
-import json
-from typing import Any, Dict, List
+import orjson
+from typing import Any, Dict, List, Set
 
-from app.services.agents.base import BaseAgent, AgentConfig
+from pydantic import TypeAdapter
+
+from app.services.agents.base import BaseAgent, AgentConfig, OutputSchema
 from app.services.llm.model_router import TaskType
+from app.services.llm.prompt_manager import LOGIC_TREE_BUILDER_SYSTEM
+
+
+# 系统提示词统一定义在prompt_manager中，模板不含变量，模块加载时渲染一次
+_SYSTEM_PROMPT = LOGIC_TREE_BUILDER_SYSTEM.render().lstrip()
+
+
+# 用户提示词的固定部分放在前面、题目和已有推导放在最后：
+# 服务端按最长公共前缀复用缓存，动态内容越靠后，可复用的前缀越长
+_PROMPT_HEAD = """## 当前任务
+请为下面给出的数学问题构建逻辑推导树。
+
+### 构建要求
+1. 分析问题，识别所有已知条件和求解目标
+2. 使用反向推理，从目标反推需要什么
+3. 构建完整的逻辑推导树
+4. 识别所有可能的推导路径
+5. 标注缺失的中间步骤
+6. 给出推导建议
+
+### 构建步骤
+1. **问题分解**: 提取已知条件和目标
+2. **变量识别**: 列出所有涉及的变量
+3. **反向推理**: 从目标开始反推
+4. **节点连接**: 建立节点间的依赖关系
+5. **路径分析**: 找出所有可行的推导路径
+6. **完整性检查**: 标注缺失的步骤
+
+"""
+
+_PROMPT_TAIL = """请开始构建逻辑树。
+"""
+
+
+class _NodeRef(OutputSchema, total=False):
+    """已知条件、求解目标"""
+    id: str
+
+
+class _TreeNode(OutputSchema, total=False):
+    """逻辑树节点"""
+    id: str
+    type: str
+    status: str
+    depends_on: List[str]
+    required_by: List[str]
+
+
+class _LogicTree(OutputSchema, total=False):
+    nodes: List[_TreeNode]
+
+
+class _ProblemAnalysis(OutputSchema, total=False):
+    knowns: List[_NodeRef]
+    target: _NodeRef
+    variables: List[str]
+
+
+class _DerivationPath(OutputSchema, total=False):
+    """推导路径"""
+    steps: List[str]
+    is_complete: bool
+
+
+class _LogicTreeOutput(OutputSchema, total=False):
+    """LLM输出中下游直接使用的字段，其余字段原样保留"""
+    problem_analysis: _ProblemAnalysis
+    logic_tree: _LogicTree
+    derivation_paths: List[_DerivationPath]
+    suggestions: List[str]
+
+
+# 模块加载时构建一次，校验在pydantic-core中完成
+_OUTPUT_ADAPTER = TypeAdapter(_LogicTreeOutput)
 
 
 class LogicTreeBuilderAgent(BaseAgent):
@@ -21,6 +97,16 @@ class LogicTreeBuilderAgent(BaseAgent):
     4. 发现缺失的步骤
     """
 
+    system_prompt = _SYSTEM_PROMPT
+
+    # 流式调用时问题分析、逐个树节点和推导路径完成即可展示
+    partial_paths = ("problem_analysis", "logic_tree.nodes.item", "derivation_paths.item")
+
+    cache_normalized_fields = ("problem_statement",)
+
+    consumes = frozenset({"problem_statement", "existing_steps"})
+    produces = frozenset({"problem_analysis", "logic_tree", "derivation_paths", "suggestions"})
+
     def __init__(self) -> None:
         """初始化逻辑树构建Agent"""
         config = AgentConfig(
@@ -31,71 +117,26 @@ class LogicTreeBuilderAgent(BaseAgent):
         )
         super().__init__(config)
 
-    @property
-    def system_prompt(self) -> str:
-        """系统提示词"""
-        return """你是一位逻辑推理专家，擅长构建数学问题的逻辑推导树。
-
-## 你的能力
-- 分析问题的已知条件和求解目标
-- 使用反向推理构建逻辑树
-- 识别所有可能的推导路径
-- 发现缺失的中间步骤
-
-## 构建方法
-1. **目标分析**: 明确要求解什么
-2. **条件识别**: 列出所有已知条件
-3. **反向推理**: 从目标反推需要什么
-4. **路径构建**: 连接已知和目标
-5. **完整性检查**: 确保推导完整
-
-## 输出格式
-请以JSON格式返回结果：
-```json
-{
-  "problem_analysis": {
-    "knowns": [
-      {
-        "id": "节点ID",
-        "description": "描述",
-        "symbolic": "符号表示",
-        "type": "类型(equation/inequality/condition)"
-      }
-    ],
-    "target": {
-      "id": "目标ID",
-      "description": "目标描述",
-      "symbolic": "符号表示"
-    },
-    "variables": ["变量1", "变量2"]
-  },
-  "logic_tree": {
-    "nodes": [
-      {
-        "id": "节点ID",
-        "type": "节点类型(known/target/intermediate/missing)",
-        "content": "内容",
-        "symbolic": "符号形式",
-        "depends_on": ["依赖节点ID"],
-        "required_by": ["被依赖节点ID"],
-        "status": "状态(complete/incomplete/missing)",
-        "reasoning": "推理说明"
-      }
-    ]
-  },
-  "derivation_paths": [
-    {
-      "path_id": 路径ID(整数),
-      "steps": ["节点ID序列"],
-      "is_complete": 是否完整(布尔值),
-      "feasibility": "可行性(high/medium/low)",
-      "description": "路径描述"
-    }
-  ],
-  "suggestions": ["建议1", "建议2"]
-}
-```
-"""
+    def normalize_cache_inputs(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        规范化用于生成缓存键的输入，已有推导步骤同样去掉首尾空白
+
+        Args:
+            kwargs: 输入参数
+
+        Returns:
+            规范化后的输入参数
+        """
+        normalized = super().normalize_cache_inputs(kwargs)
+        existing_steps = normalized.get("existing_steps")
+        if existing_steps:
+            normalized = {
+                **normalized,
+                "existing_steps": [
+                    step.strip() if isinstance(step, str) else step for step in existing_steps
+                ]
+            }
+        return normalized
 
     def build_user_prompt(self, **kwargs: Any) -> str:
         """
@@ -111,91 +152,116 @@ class LogicTreeBuilderAgent(BaseAgent):
         problem_statement = kwargs.get("problem_statement", "")
         existing_steps = kwargs.get("existing_steps", [])
 
-        prompt = f"""## 当前任务
-请为以下数学问题构建逻辑推导树。
-
-### 问题描述
+        parts = [_PROMPT_HEAD, f"""### 问题描述
 ```
 {problem_statement}
 ```
 
-"""
-
+"""]
+        # 列表收集后一次拼接，避免已有步骤多时反复复制整个提示词
         if existing_steps:
-            prompt += """### 学生已有的推导
-"""
-            for i, step in enumerate(existing_steps, 1):
-                prompt += f"{i}. {step}\n"
-            prompt += "\n"
+            parts.append("### 学生已有的推导\n")
+            parts.extend(f"{i}. {step}\n" for i, step in enumerate(existing_steps, 1))
+            parts.append("\n")
+        parts.append(_PROMPT_TAIL)
 
-        prompt += """### 构建要求
-1. 分析问题，识别所有已知条件和求解目标
-2. 使用反向推理，从目标反推需要什么
-3. 构建完整的逻辑推导树
-4. 识别所有可能的推导路径
-5. 标注缺失的中间步骤
-6. 给出推导建议
-
-### 构建步骤
-1. **问题分解**: 提取已知条件和目标
-2. **变量识别**: 列出所有涉及的变量
-3. **反向推理**: 从目标开始反推
-4. **节点连接**: 建立节点间的依赖关系
-5. **路径分析**: 找出所有可行的推导路径
-6. **完整性检查**: 标注缺失的步骤
-
-请开始构建逻辑树。
-"""
-        return prompt
+        return "".join(parts)
 
     def parse_response(self, response: str) -> Dict[str, Any]:
         """解析AI响应"""
         try:
-            response = response.strip()
-
-            if "```json" in response:
-                start = response.find("```json") + 7
-                end = response.find("```", start)
-                response = response[start:end].strip()
-            elif "```" in response:
-                start = response.find("```") + 3
-                end = response.find("```", start)
-                response = response[start:end].strip()
-
-            result = json.loads(response)
-
-            # 验证必需字段
-            if "problem_analysis" not in result:
-                result["problem_analysis"] = {
-                    "knowns": [],
-                    "target": {"id": "t1", "description": "", "symbolic": ""},
-                    "variables": []
-                }
+            # 去掉```json代码块标记
+            response = self._unfence(response)
 
-            if "logic_tree" not in result:
-                result["logic_tree"] = {"nodes": []}
+            result = self._conform(self._loads_lenient(response), _OUTPUT_ADAPTER)
+            if result is None:
+                self.logger.error("逻辑树结果不是JSON对象")
+                return self._failed_result()
 
-            if "derivation_paths" not in result:
-                result["derivation_paths"] = []
-
-            if "suggestions" not in result:
-                result["suggestions"] = []
-
-            return result
-
-        except json.JSONDecodeError as e:
-            self.logger.error(f"JSON解析失败: {str(e)}")
-            return {
+            # 一次合并补全缺失或类型不符的顶层字段
+            result = {
                 "problem_analysis": {
                     "knowns": [],
-                    "target": {"id": "t1", "description": "解析失败", "symbolic": ""},
+                    "target": {"id": "t1", "description": "", "symbolic": ""},
                     "variables": []
                 },
                 "logic_tree": {"nodes": []},
                 "derivation_paths": [],
-                "suggestions": ["解析失败，请重试"]
+                "suggestions": [],
+                **result
             }
 
+            self._validate_tree(result)
+            return result
+
+        except orjson.JSONDecodeError as e:
+            self.logger.error(f"JSON解析失败: {str(e)}")
+            return self._failed_result()
+
+    def _validate_tree(self, result: Dict[str, Any]) -> List[str]:
+        """
+        检查推导路径与逻辑树节点是否一致
+
+        路径引用了未声明的节点或缺失节点时，将其is_complete改为False；
+        depends_on与required_by不对称只记录日志。节点通常只有几十个，
+        用集合做一遍线性检查即可
+
+        Args:
+            result: 已按schema修正并补全顶层字段的解析结果，会被原地修改
+
+        Returns:
+            发现的问题列表
+        """
+        analysis = result["problem_analysis"]
+        nodes = [node for node in result["logic_tree"].get("nodes", []) if "id" in node]
+        declared: Set[str] = {node["id"] for node in nodes}
+        declared.update(known["id"] for known in analysis.get("knowns", []) if "id" in known)
+        if "id" in analysis.get("target", {}):
+            declared.add(analysis["target"]["id"])
+        missing = {
+            node["id"] for node in nodes
+            if node.get("type") == "missing" or node.get("status") == "missing"
+        }
+
+        issues: List[str] = []
+        for path in result["derivation_paths"]:
+            steps = path.get("steps", [])
+            undeclared = [step for step in steps if step not in declared]
+            if undeclared:
+                issues.append(f"路径{path.get('path_id')}引用了未声明的节点: {undeclared}")
+            if undeclared or not missing.isdisjoint(steps):
+                path["is_complete"] = False
+
+        # 依赖边应成对出现：a依赖b时b的required_by应包含a
+        required_by = {node["id"]: set(node.get("required_by", ())) for node in nodes}
+        for node in nodes:
+            for dependency in node.get("depends_on", ()):
+                if dependency in required_by and node["id"] not in required_by[dependency]:
+                    issues.append(f"节点{dependency}的required_by缺少{node['id']}")
+
+        if issues:
+            self.logger.warning(f"逻辑树不一致: {'; '.join(issues)}")
+        return issues
+
+    @staticmethod
+    def _failed_result() -> Dict[str, Any]:
+        """
+        无法解析时的逻辑树结果
+
+        每次用字面量新建：比对模块级常量做deepcopy快一个数量级，
+        调用方也可以放心修改返回的结果
+        """
+        return {
+            "problem_analysis": {
+                "knowns": [],
+                "target": {"id": "t1", "description": "解析失败", "symbolic": ""},
+                "variables": []
+            },
+            "logic_tree": {"nodes": []},
+            "derivation_paths": [],
+            "suggestions": ["解析失败，请重试"]
+        }
+
     def validate_inputs(self, **kwargs: Any) -> None:
         """验证输入参数"""
         problem_statement = kwargs.get("problem_statement")
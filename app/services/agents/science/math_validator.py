@@ -3,11 +3,264 @@
 使用Symbolic CoT模式进行数学步骤验证
 """
 
-import json
-from typing import Any, Dict, List
-
-from app.services.agents.base import BaseAgent, AgentConfig
+import asyncio
+import re
+import string
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from pydantic import TypeAdapter
+from sympy import Expr, Pow, Symbol, simplify
+from sympy.parsing.sympy_parser import (
+    convert_xor,
+    implicit_multiplication_application,
+    parse_expr,
+    standard_transformations,
+)
+
+from app.config import settings
+from app.services.agents.base import BaseAgent, AgentConfig, OutputSchema
 from app.services.llm.model_router import TaskType
+from app.services.llm.prompt_manager import MATH_VALIDATOR_SYSTEM
+
+
+# 系统提示词统一定义在prompt_manager中，模板不含变量，模块加载时渲染一次
+_SYSTEM_PROMPT = MATH_VALIDATOR_SYSTEM.render().lstrip()
+
+
+# 本地符号验证：公式只含这些字符和函数名时才交给SymPy，
+# parse_expr内部使用eval，不能接受任意输入，其余情况一律交给LLM
+_FORMULA_CHARS = re.compile(r"[0-9a-zA-Z+\-*/^().= ]+")
+_FORMULA_IDENTIFIER = re.compile(r"[a-zA-Z]+")
+_FORMULA_FUNCTIONS = frozenset({"sqrt", "sin", "cos", "tan", "log", "ln", "exp", "pi"})
+_FORMULA_MAX_CHARS = 120
+# 数值指数的绝对值上限，且幂不能嵌套：9^9^9这类短公式求值会得到上亿位的整数，
+# 线程中的计算无法取消，会一直占用工作线程
+_FORMULA_MAX_EXPONENT = 20
+_FORMULA_REPLACEMENTS = str.maketrans({"×": "*", "÷": "/", "²": "**2", "³": "**3", "−": "-"})
+_FORMULA_TRANSFORMATIONS = standard_transformations + (implicit_multiplication_application, convert_xor)
+# 单个字母一律视为变量，避免E、I、N、S等被解析为SymPy内置对象
+_FORMULA_SYMBOLS = MappingProxyType({c: Symbol(c) for c in string.ascii_letters})
+# 题目中由公式字符组成的等式片段，如"已知 2x=10，求x"中的"2x=10"
+_STATEMENT_EQUATION = re.compile(r"[0-9a-zA-Z+\-*/^(). ]+=[0-9a-zA-Z+\-*/^(). ]+")
+
+
+@lru_cache(maxsize=1024)
+def _parse_formula(formula: str) -> Optional[Tuple[Expr, bool]]:
+    """
+    将步骤公式解析为SymPy表达式
+
+    Args:
+        formula: 步骤公式
+
+    Returns:
+        (表达式, 是否为等式)，等式的表达式为"左边-右边"；无法本地解析时为None
+    """
+    formula = formula.translate(_FORMULA_REPLACEMENTS).strip()
+    if (
+        not formula
+        or len(formula) > _FORMULA_MAX_CHARS
+        or formula.count("=") > 1
+        or not _FORMULA_CHARS.fullmatch(formula)
+    ):
+        return None
+    for name in _FORMULA_IDENTIFIER.findall(formula):
+        if len(name) > 1 and name not in _FORMULA_FUNCTIONS:
+            return None
+
+    try:
+        # 先不求值解析，检查幂的大小后再求值
+        if not all(_powers_bounded(_parse_side(side, evaluate=False)) for side in formula.split("=")):
+            return None
+        sides = [_parse_side(side, evaluate=True) for side in formula.split("=")]
+    except Exception:
+        return None
+
+    if len(sides) == 2:
+        return sides[0] - sides[1], True
+    return sides[0], False
+
+
+def _parse_side(side: str, evaluate: bool) -> Expr:
+    """解析等式的一边"""
+    return parse_expr(
+        side,
+        local_dict=dict(_FORMULA_SYMBOLS),
+        transformations=_FORMULA_TRANSFORMATIONS,
+        evaluate=evaluate
+    )
+
+
+def _powers_bounded(expr: Expr) -> bool:
+    """
+    检查未求值表达式中的幂，求值时不会产生巨大的数
+
+    Args:
+        expr: 不求值解析得到的表达式
+
+    Returns:
+        幂都不嵌套、数值指数都不超过上限时为True
+    """
+    for power in expr.atoms(Pow):
+        # 除法解析为指数-1的幂，不计入嵌套
+        if power.exp == -1:
+            continue
+        inner = power.base.atoms(Pow) | power.exp.atoms(Pow)
+        if any(p.exp != -1 for p in inner):
+            return False
+        # 含变量的指数不会求出具体数值
+        if power.exp.is_number and not abs(float(power.exp)) <= _FORMULA_MAX_EXPONENT:
+            return False
+    return True
+
+
+def _statement_equations(problem_statement: str) -> List[Tuple[Expr, bool]]:
+    """
+    解析题目中给出的等式
+
+    Args:
+        problem_statement: 问题描述
+
+    Returns:
+        能本地解析的等式列表
+    """
+    equations = []
+    for candidate in _STATEMENT_EQUATION.findall(problem_statement.translate(_FORMULA_REPLACEMENTS)):
+        parsed = _parse_formula(candidate.strip())
+        if parsed is not None and parsed[1]:
+            equations.append(parsed)
+    return equations
+
+
+def _isolates_unknown(formula: str, givens: List[Tuple[Expr, bool]]) -> bool:
+    """
+    步骤公式是否求出了题目中的一个未知数，即形如"x=5"
+
+    Args:
+        formula: 步骤公式
+        givens: 题目中给出的等式
+
+    Returns:
+        一边是题目中的变量、另一边不含变量时为True
+    """
+    if _parse_formula(formula) is None:
+        return False
+    sides = formula.translate(_FORMULA_REPLACEMENTS).split("=")
+    if len(sides) != 2:
+        return False
+    try:
+        left, right = (_parse_side(side, evaluate=True) for side in sides)
+    except Exception:
+        return False
+
+    unknowns = set().union(*(expr.free_symbols for expr, _ in givens))
+    for variable, value in ((left, right), (right, left)):
+        if isinstance(variable, Symbol) and variable in unknowns and not value.free_symbols:
+            return True
+    return False
+
+
+def _is_zero(expr: Expr) -> bool:
+    """表达式是否恒为0"""
+    return simplify(expr) == 0
+
+
+def _step_holds(prev: Optional[Tuple[Expr, bool]], curr: Tuple[Expr, bool]) -> bool:
+    """
+    判断一个步骤能否由本地符号计算确认正确
+
+    等式本身恒成立（含纯算术），或与上一步等价（等式两边差互为非零常数倍、
+    表达式之差恒为0）时成立；其余情况无法确认，交给LLM判断
+
+    Args:
+        prev: 上一步的解析结果，没有可比较的上一步时为None
+        curr: 当前步骤的解析结果
+
+    Returns:
+        是否确认正确
+    """
+    expr, is_equation = curr
+    if is_equation and _is_zero(expr):
+        return True
+    # 不含变量又不恒成立的等式是算错了
+    if is_equation and not expr.free_symbols:
+        return False
+    if prev is None or prev[1] != is_equation:
+        return False
+
+    prev_expr = prev[0]
+    if not is_equation:
+        return _is_zero(prev_expr - expr)
+    if _is_zero(prev_expr):
+        return False
+    ratio = simplify(prev_expr / expr)
+    return not ratio.free_symbols and ratio.is_nonzero is True and ratio.is_finite is True
+
+
+# 验证结果的标量缺省字段
+_DEFAULT_VALIDATION = MappingProxyType({
+    "step_number": 0,
+    "is_valid": False,
+    "symbolic_form": "",
+    "next_step_hint": ""
+})
+
+
+class _StepValidation(OutputSchema, total=False):
+    """单个步骤的验证结果"""
+    step_number: int
+    is_valid: bool
+    symbolic_form: str
+    variables_state: Dict[str, Any]
+    errors: List[Dict[str, Any]]
+    warnings: List[Any]
+    next_step_hint: str
+
+
+class _ValidationOutput(OutputSchema, total=False):
+    """LLM输出中下游直接使用的字段，其余字段原样保留"""
+    validation_results: List[_StepValidation]
+    overall_assessment: Dict[str, Any]
+
+
+# 模块加载时构建一次，校验在pydantic-core中完成
+_OUTPUT_ADAPTER = TypeAdapter(_ValidationOutput)
+
+
+# 用户提示词的固定部分放在前面、题目和步骤放在最后：
+# 服务端按最长公共前缀复用缓存，动态内容越靠后，可复用的前缀越长
+_PROMPT_HEAD = """## 当前任务
+请验证下面给出的数学解题步骤的正确性。
+
+### 验证要求
+1. 逐步验证每个步骤的正确性
+2. 将步骤转换为符号化形式
+3. 追踪每个步骤后的变量状态
+4. 识别错误并给出正确做法
+5. 提供下一步的提示
+
+### 验证步骤
+1. **理解问题**: 明确已知条件和求解目标
+2. **符号化**: 将每个步骤转换为数学符号
+3. **逻辑验证**: 检查推导是否合理
+4. **运算检查**: 验证计算是否正确
+5. **状态追踪**: 记录变量的变化
+6. **完整性**: 检查是否遗漏步骤
+
+"""
+
+_PROMPT_TAIL = """
+请开始验证。
+"""
+
+# 批量验证的结尾说明（{count}为题目数）
+_BATCH_PROMPT_TAIL = """
+请依次验证以上{count}道题。
+以JSON数组返回结果：数组第k个元素是第k题的验证结果，格式与单题输出格式相同，
+元素个数必须为{count}，不要输出数组以外的内容。
+"""
 
 
 class MathValidatorAgent(BaseAgent):
@@ -21,6 +274,16 @@ class MathValidatorAgent(BaseAgent):
     4. 追踪变量状态变化
     """
 
+    system_prompt = _SYSTEM_PROMPT
+
+    # 流式调用时每个步骤的验证结果完成即可展示
+    partial_paths = ("validation_results.item",)
+
+    cache_normalized_fields = ("problem_statement",)
+
+    consumes = frozenset({"problem_statement", "steps"})
+    produces = frozenset({"validation_results", "overall_assessment"})
+
     def __init__(self, mode: str = "validate", grade_level: str = "middle", **kwargs) -> None:
         """
         初始化数学验证Agent
@@ -39,57 +302,117 @@ class MathValidatorAgent(BaseAgent):
         self.mode = mode
         self.grade_level = grade_level
 
-    @property
-    def system_prompt(self) -> str:
-        """系统提示词"""
-        return """你是一位严谨的数学老师，专门帮助学生检查数学解题步骤。
-
-## 你的职责
-- 验证每个步骤的数学正确性
-- 检查逻辑推导是否严密
-- 识别常见错误（符号错误、运算错误等）
-- 追踪变量状态变化
-
-## 验证方法
-1. **符号化表示**: 将步骤转换为数学符号
-2. **逻辑检查**: 验证推导是否合理
-3. **运算验证**: 检查计算是否正确
-4. **完整性检查**: 是否遗漏必要步骤
-
-## 输出格式
-请以JSON格式返回结果：
-```json
-{
-  "validation_results": [
-    {
-      "step_number": 步骤号(整数),
-      "is_valid": 是否有效(布尔值),
-      "symbolic_form": "符号化形式",
-      "variables_state": {
-        "变量名": {
-          "value": "值",
-          "constraints": "约束条件"
-        }
-      },
-      "errors": [
-        {
-          "type": "错误类型",
-          "description": "错误描述",
-          "correction": "正确做法"
-        }
-      ],
-      "warnings": ["警告1", "警告2"],
-      "next_step_hint": "下一步提示"
-    }
-  ],
-  "overall_assessment": {
-    "total_steps": 总步骤数(整数),
-    "valid_steps": 有效步骤数(整数),
-    "completion_status": "完成状态(complete/incomplete/invalid)"
-  }
-}
-```
-"""
+    @staticmethod
+    def _symbolic_check(problem_statement: str, steps: List[Dict[str, Any]]) -> List[Tuple[int, bool]]:
+        """
+        用SymPy逐步检查步骤公式
+
+        第一步与题目中给出的某个等式比较
+
+        Args:
+            problem_statement: 问题描述
+            steps: 解题步骤列表
+
+        Returns:
+            (步骤序号, 是否确认正确)列表
+        """
+        givens = _statement_equations(problem_statement)
+        checks = []
+        prev = None
+        for i, step in enumerate(steps, 1):
+            formula = str(step.get("formula") or "")
+            curr = _parse_formula(formula)
+            if curr is None:
+                checks.append((i, False))
+                prev = None
+                continue
+            holds = _step_holds(prev, curr) or (
+                i == 1 and any(_step_holds(given, curr) for given in givens)
+            )
+            checks.append((i, holds))
+            prev = curr
+        return checks
+
+    @classmethod
+    def _solved_locally(cls, problem_statement: str, steps: List[Dict[str, Any]]) -> bool:
+        """
+        所有步骤都能确认正确，且最后一步求出了题目中的未知数
+
+        只确认步骤正确而题目尚未解完时，仍需LLM给出下一步提示
+
+        Args:
+            problem_statement: 问题描述
+            steps: 解题步骤列表
+
+        Returns:
+            是否可以不调用LLM直接给出结果
+        """
+        if not all(holds for _, holds in cls._symbolic_check(problem_statement, steps)):
+            return False
+        return _isolates_unknown(
+            str(steps[-1].get("formula") or ""), _statement_equations(problem_statement)
+        )
+
+    async def resolve_locally(self, **kwargs: Any) -> Optional[Dict[str, Any]]:
+        """
+        所有步骤都能由SymPy确认正确、且最后一步求出未知数时直接返回结果，不调用LLM
+
+        Args:
+            problem_statement: 问题描述
+            steps: 解题步骤列表
+
+        Returns:
+            验证结果，有步骤无法本地确认或未求出未知数时为None
+        """
+        steps = kwargs.get("steps") or []
+        if self.mode != "validate" or not steps:
+            return None
+
+        # SymPy化简是CPU密集操作，放到线程中执行，避免阻塞事件循环
+        solved = await asyncio.to_thread(
+            self._solved_locally, kwargs.get("problem_statement", ""), steps
+        )
+        if not solved:
+            return None
+
+        self.logger.debug(f"全部{len(steps)}个步骤通过本地符号验证")
+        return self._normalize_result({
+            "validation_results": [
+                {
+                    "step_number": i,
+                    "is_valid": True,
+                    "symbolic_form": str(step.get("formula", "")).strip()
+                }
+                for i, step in enumerate(steps, 1)
+            ]
+        })
+
+    def normalize_cache_inputs(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        规范化用于生成缓存键的输入
+
+        提示词按位置给步骤编号，步骤只保留描述和公式；公式去掉全部空白，
+        学生小改后重新提交相同步骤时可以命中缓存
+
+        Args:
+            kwargs: 输入参数
+
+        Returns:
+            规范化后的输入参数
+        """
+        normalized = super().normalize_cache_inputs(kwargs)
+        steps = normalized.get("steps")
+        if isinstance(steps, list):
+            normalized = {
+                **normalized,
+                "steps": [
+                    (str(step.get("content", "")).strip(), "".join(str(step.get("formula", "")).split()))
+                    if isinstance(step, dict) else step
+                    for step in steps
+                ]
+            }
+        normalized["mode"] = self.mode
+        return normalized
 
     def build_user_prompt(self, **kwargs: Any) -> str:
         """
@@ -105,106 +428,181 @@ class MathValidatorAgent(BaseAgent):
         problem_statement = kwargs.get("problem_statement", "")
         steps = kwargs.get("steps", [])
 
-        prompt = f"""## 当前任务
-请验证以下数学解题步骤的正确性。
+        return "".join([_PROMPT_HEAD, *self._problem_parts(problem_statement, steps), _PROMPT_TAIL])
+
+    @staticmethod
+    def _problem_parts(problem_statement: str, steps: List[Dict[str, Any]]) -> List[str]:
+        """
+        生成单道题的问题描述和步骤段落
+
+        Args:
+            problem_statement: 问题描述
+            steps: 解题步骤列表
 
-### 问题描述
+        Returns:
+            提示词片段列表
+        """
+        parts = [f"""### 问题描述
 ```
 {problem_statement}
 ```
 
 ### 学生的解题步骤
-"""
-
+"""]
+        # 列表收集后一次拼接，避免步骤多时反复复制整个提示词
         for i, step in enumerate(steps, 1):
-            step_content = step.get("content", "")
-            formula = step.get("formula", "")
-            prompt += f"""
+            parts.append(f"""
 **步骤 {i}**:
-- 描述: {step_content}
-- 公式: {formula}
-"""
+- 描述: {step.get("content", "")}
+- 公式: {step.get("formula", "")}
+""")
+        return parts
 
-        prompt += """
+    def build_batch_prompt(self, problems: List[Dict[str, Any]]) -> str:
+        """
+        构建批量验证的用户提示词，多道题共用一份固定说明
 
-### 验证要求
-1. 逐步验证每个步骤的正确性
-2. 将步骤转换为符号化形式
-3. 追踪每个步骤后的变量状态
-4. 识别错误并给出正确做法
-5. 提供下一步的提示
+        Args:
+            problems: 题目列表，每项包含problem_statement和steps
 
-### 验证步骤
-1. **理解问题**: 明确已知条件和求解目标
-2. **符号化**: 将每个步骤转换为数学符号
-3. **逻辑验证**: 检查推导是否合理
-4. **运算检查**: 验证计算是否正确
-5. **状态追踪**: 记录变量的变化
-6. **完整性**: 检查是否遗漏步骤
+        Returns:
+            用户提示词
+        """
+        parts = [_PROMPT_HEAD]
+        for k, problem in enumerate(problems, 1):
+            parts.append(f"## 第{k}题\n\n")
+            parts.extend(self._problem_parts(problem.get("problem_statement", ""), problem.get("steps", [])))
+            parts.append("\n")
+        parts.append(_BATCH_PROMPT_TAIL.format(count=len(problems)))
+
+        return "".join(parts)
+
+    async def validate_batch(
+        self,
+        problems: List[Dict[str, Any]],
+        concurrency: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        批量验证多道题，多道题合并为一次LLM调用
 
-请开始验证。
-"""
-        return prompt
+        单次调用的题目数受模型输出上限约束，超出时拆成多批并发调用，
+        同时进行的调用数不超过concurrency，避免题目多时触发速率限制
+
+        Args:
+            problems: 题目列表，每项包含problem_statement和steps
+            concurrency: 最大并发调用数，None使用配置值
+
+        Returns:
+            与problems顺序一致的验证结果，格式与parse_response相同
+
+        Raises:
+            ValueError: 参数验证失败
+            AgentExecutionException: LLM调用失败
+        """
+        for problem in problems:
+            self.validate_inputs(**problem)
+
+        batch_size = max(1, settings.llm_max_output_tokens // self.max_tokens)
+        batches = [problems[i:i + batch_size] for i in range(0, len(problems), batch_size)]
+
+        semaphore = asyncio.Semaphore(concurrency or settings.math_batch_concurrency)
+
+        async def _run_one(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return await self._validate_one_batch(batch)
+
+        results = await asyncio.gather(*(_run_one(batch) for batch in batches))
+        return [result for batch_results in results for result in batch_results]
+
+    async def _validate_one_batch(self, problems: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """执行一批验证"""
+        response = await self.execute_llm(
+            self.build_batch_prompt(problems),
+            max_tokens=min(self.max_tokens * len(problems), settings.llm_max_output_tokens)
+        )
+        return self.parse_batch_response(response.content, len(problems))
+
+    def parse_batch_response(self, response: str, count: int) -> List[Dict[str, Any]]:
+        """
+        解析批量验证响应
+
+        Args:
+            response: AI响应文本
+            count: 题目数
+
+        Returns:
+            count个验证结果，缺失或无法解析的位置为无效结果
+        """
+        try:
+            items = self._loads_lenient(self._unfence(response))
+        except orjson.JSONDecodeError as e:
+            self.logger.error(f"批量验证JSON解析失败: {str(e)}")
+            items = []
+
+        if not isinstance(items, list):
+            items = []
+        if len(items) != count:
+            self.logger.warning(f"批量验证结果数量不符: 期望{count}，实际{len(items)}")
+
+        results = []
+        for item in items[:count]:
+            item = self._conform(item, _OUTPUT_ADAPTER)
+            results.append(self._invalid_result() if item is None else self._normalize_result(item))
+        results.extend(self._invalid_result() for _ in range(count - len(results)))
+        return results
 
     def parse_response(self, response: str) -> Dict[str, Any]:
         """解析AI响应"""
         try:
-            response = response.strip()
-
-            if "```json" in response:
-                start = response.find("```json") + 7
-                end = response.find("```", start)
-                response = response[start:end].strip()
-            elif "```" in response:
-                start = response.find("```") + 3
-                end = response.find("```", start)
-                response = response[start:end].strip()
-
-            result = json.loads(response)
-
-            # 验证必需字段
-            if "validation_results" not in result:
-                result["validation_results"] = []
-
-            # 确保每个验证结果都有必需字段
-            for validation in result["validation_results"]:
-                if "step_number" not in validation:
-                    validation["step_number"] = 0
-                if "is_valid" not in validation:
-                    validation["is_valid"] = False
-                if "symbolic_form" not in validation:
-                    validation["symbolic_form"] = ""
-                if "variables_state" not in validation:
-                    validation["variables_state"] = {}
-                if "errors" not in validation:
-                    validation["errors"] = []
-                if "warnings" not in validation:
-                    validation["warnings"] = []
-                if "next_step_hint" not in validation:
-                    validation["next_step_hint"] = ""
-
-            if "overall_assessment" not in result:
-                total = len(result["validation_results"])
-                valid = sum(1 for v in result["validation_results"] if v.get("is_valid", False))
-                result["overall_assessment"] = {
-                    "total_steps": total,
-                    "valid_steps": valid,
-                    "completion_status": "complete" if valid == total else "incomplete"
-                }
+            # 去掉```json代码块标记
+            response = self._unfence(response)
 
-            return result
+            result = self._conform(self._loads_lenient(response), _OUTPUT_ADAPTER)
+            if result is None:
+                self.logger.error("验证结果不是JSON对象")
+                return self._invalid_result()
+            return self._normalize_result(result)
 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             self.logger.error(f"JSON解析失败: {str(e)}")
-            return {
-                "validation_results": [],
-                "overall_assessment": {
-                    "total_steps": 0,
-                    "valid_steps": 0,
-                    "completion_status": "invalid"
-                }
+            return self._invalid_result()
+
+    @classmethod
+    def _normalize_result(cls, result: Dict[str, Any]) -> Dict[str, Any]:
+        """补全单道题验证结果的缺省字段，缺少逐步验证结果时视为无效结果"""
+        # validation_results缺失或因类型不符被去掉时，不能按0个步骤报告完成
+        if "validation_results" not in result:
+            return cls._invalid_result()
+
+        # 补全每个验证结果的缺省字段（可变容器每次新建，避免结果之间共享）
+        result["validation_results"] = [
+            {**_DEFAULT_VALIDATION, "variables_state": {}, "errors": [], "warnings": [], **validation}
+            for validation in result["validation_results"]
+        ]
+
+        if "overall_assessment" not in result:
+            total = len(result["validation_results"])
+            valid = sum(1 for v in result["validation_results"] if v.get("is_valid", False))
+            result["overall_assessment"] = {
+                "total_steps": total,
+                "valid_steps": valid,
+                "completion_status": "complete" if total and valid == total else "incomplete"
             }
 
+        return result
+
+    @staticmethod
+    def _invalid_result() -> Dict[str, Any]:
+        """无法解析时的验证结果"""
+        return {
+            "validation_results": [],
+            "overall_assessment": {
+                "total_steps": 0,
+                "valid_steps": 0,
+                "completion_status": "invalid"
+            }
+        }
+
     def validate_inputs(self, **kwargs: Any) -> None:
         """验证输入参数"""
         problem_statement = kwargs.get("problem_statement")
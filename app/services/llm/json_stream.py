@@ -0,0 +1,115 @@
+"""
+LLM输出的增量JSON解析
+在流式响应到达的过程中解析JSON，指定路径的值一旦完整即可取出
+"""
+
+from typing import Any, Iterable, List, Tuple
+
+import ijson
+
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_START_EVENTS = frozenset({"start_map", "start_array"})
+_END_EVENTS = frozenset({"end_map", "end_array"})
+
+
+class PartialJSONParser:
+    """
+    增量JSON解析器
+
+    路径使用ijson前缀语法，例如：
+    - "overall_score": 顶层标量
+    - "versions.item.polished_text": 数组中每个元素的字段
+    - "tree.children.item": 数组中每个完整的子对象
+
+    LLM输出中JSON之前的文字（如```json代码块标记）会被跳过，
+    顶层JSON结束后的内容被忽略。解析出错时停止增量解析，
+    由调用方在完整响应上回退到常规解析。
+    """
+
+    def __init__(self, paths: Iterable[str]) -> None:
+        """
+        初始化解析器
+
+        Args:
+            paths: 需要提取的ijson前缀路径
+        """
+        self._paths = frozenset(paths)
+        self._events = ijson.sendable_list()
+        self._coro = ijson.parse_coro(self._events, use_float=True)
+        # 正在构建的复合值: [前缀, 构建器, 嵌套深度]
+        self._builders: List[List[Any]] = []
+        self._started = False
+        self._done = False
+
+    @property
+    def done(self) -> bool:
+        """顶层JSON已结束或解析已放弃"""
+        return self._done
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        输入一段响应文本
+
+        Args:
+            chunk: 流式响应片段
+
+        Returns:
+            本次新完成的(路径, 值)列表
+        """
+        if self._done or not chunk:
+            return []
+
+        if not self._started:
+            start = chunk.find("{")
+            if start < 0:
+                return []
+            chunk = chunk[start:]
+            self._started = True
+
+        try:
+            self._coro.send(chunk.encode("utf-8"))
+        except ijson.JSONError as e:
+            # 顶层结束后的多余内容同样会触发异常，此时已取到的值仍然有效
+            completed = self._drain()
+            if not self._done:
+                logger.debug(f"增量JSON解析中止: {str(e)}")
+            self._done = True
+            return completed
+
+        return self._drain()
+
+    def _drain(self) -> List[Tuple[str, Any]]:
+        """处理已解析出的事件"""
+        completed: List[Tuple[str, Any]] = []
+
+        for prefix, event, value in self._events:
+            if self._done:
+                break
+
+            # 推进正在构建的复合值
+            for entry in self._builders:
+                entry[1].event(event, value)
+                if event in _START_EVENTS:
+                    entry[2] += 1
+                elif event in _END_EVENTS:
+                    entry[2] -= 1
+            while self._builders and self._builders[-1][2] == 0:
+                path, builder, _ = self._builders.pop()
+                completed.append((path, builder.value))
+
+            if prefix in self._paths and event != "map_key":
+                if event in _START_EVENTS:
+                    builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+                    self._builders.append([prefix, builder, 1])
+                elif event not in _END_EVENTS:
+                    completed.append((prefix, value))
+
+            if prefix == "" and event in _END_EVENTS:
+                self._done = True
+
+        del self._events[:]
+        return completed
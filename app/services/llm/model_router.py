@@ -3,6 +3,8 @@
 根据任务特征选择最合适的模型
 """
 
+from functools import lru_cache
+from types import MappingProxyType
 from typing import Optional
 from enum import Enum
 
@@ -26,6 +28,35 @@ class TaskType(str, Enum):
     QUICK_RESPONSE = "quick_response"
 
 
+# 不同任务类型的推荐温度
+_TEMPERATURE_MAP = MappingProxyType({
+    TaskType.GRAMMAR_CHECK: 0.3,      # 语法检查需要精确
+    TaskType.POLISH: 0.7,             # 润色需要创造性
+    TaskType.STRUCTURE_ANALYSIS: 0.5, # 结构分析需要平衡
+    TaskType.HEALTH_SCORE: 0.5,       # 评分需要客观
+    TaskType.MATH_VALIDATION: 0.1,    # 数学验证需要极度精确
+    TaskType.LOGIC_TREE: 0.3,         # 逻辑推导需要精确
+    TaskType.DEBUG: 0.3,              # 调试需要精确
+    TaskType.CHAT: 0.8,               # 对话需要自然
+    TaskType.OCR: 0.1,                # OCR需要精确
+    TaskType.QUICK_RESPONSE: 0.7,     # 快速响应可以灵活
+})
+
+# 不同任务类型的推荐最大token数
+_MAX_TOKENS_MAP = MappingProxyType({
+    TaskType.GRAMMAR_CHECK: 2000,
+    TaskType.POLISH: 3000,
+    TaskType.STRUCTURE_ANALYSIS: 4000,
+    TaskType.HEALTH_SCORE: 2000,
+    TaskType.MATH_VALIDATION: 3000,
+    TaskType.LOGIC_TREE: 4000,
+    TaskType.DEBUG: 3000,
+    TaskType.CHAT: 2000,
+    TaskType.OCR: 2000,
+    TaskType.QUICK_RESPONSE: 1000,
+})
+
+
 class ComplexityLevel(str, Enum):
     """复杂度级别"""
     LOW = "low"
@@ -46,21 +77,13 @@ class ModelRouter:
         self.ocr_model = settings.qwen_ocr_model
         self.embedding_model = settings.qwen_embedding_model
 
-        # 任务类型到模型的映射
-        self.task_model_map = {
-            TaskType.GRAMMAR_CHECK: self.text_model,
-            TaskType.POLISH: self.text_model,
-            TaskType.STRUCTURE_ANALYSIS: self.text_model,
-            TaskType.HEALTH_SCORE: self.text_model,
-            TaskType.MATH_VALIDATION: self.text_model,
-            TaskType.LOGIC_TREE: self.text_model,
-            TaskType.DEBUG: self.text_model,
-            TaskType.CHAT: self.text_model,
-            TaskType.OCR: self.ocr_model,
-            TaskType.QUICK_RESPONSE: self.text_model,
-        }
-
-        logger.info(f"模型路由器已初始化: text={self.text_model}, ocr={self.ocr_model}")
+        # 任务类型到模型的映射：除OCR外均使用文本模型
+        self.task_model_map = MappingProxyType({
+            task_type: self.ocr_model if task_type is TaskType.OCR else self.text_model
+            for task_type in TaskType
+        })
+
+        logger.info("模型路由器已初始化: text=%s, ocr=%s", self.text_model, self.ocr_model)
 
     def select_model(
         self,
@@ -86,7 +109,7 @@ class ModelRouter:
 
         # OCR任务直接返回OCR模型
         if task_type == TaskType.OCR:
-            logger.debug(f"任务类型: {task_type}, 选择模型: {base_model}")
+            logger.debug("任务类型: %s, 选择模型: %s", task_type, base_model)
             return base_model
 
         # 根据内容长度和复杂度调整
@@ -95,9 +118,10 @@ class ModelRouter:
 
         selected_model = base_model
 
+        # 使用%s延迟格式化，DEBUG级别未开启时不拼接字符串
         logger.debug(
-            f"任务类型: {task_type}, 内容长度: {content_length}, "
-            f"复杂度: {complexity}, 选择模型: {selected_model}"
+            "任务类型: %s, 内容长度: %s, 复杂度: %s, 选择模型: %s",
+            task_type, content_length, complexity, selected_model
         )
 
         return selected_model
@@ -112,21 +136,7 @@ class ModelRouter:
         Returns:
             温度值
         """
-        # 不同任务类型的推荐温度
-        temperature_map = {
-            TaskType.GRAMMAR_CHECK: 0.3,      # 语法检查需要精确
-            TaskType.POLISH: 0.7,             # 润色需要创造性
-            TaskType.STRUCTURE_ANALYSIS: 0.5, # 结构分析需要平衡
-            TaskType.HEALTH_SCORE: 0.5,       # 评分需要客观
-            TaskType.MATH_VALIDATION: 0.1,    # 数学验证需要极度精确
-            TaskType.LOGIC_TREE: 0.3,         # 逻辑推导需要精确
-            TaskType.DEBUG: 0.3,              # 调试需要精确
-            TaskType.CHAT: 0.8,               # 对话需要自然
-            TaskType.OCR: 0.1,                # OCR需要精确
-            TaskType.QUICK_RESPONSE: 0.7,     # 快速响应可以灵活
-        }
-
-        return temperature_map.get(task_type, 0.7)
+        return _TEMPERATURE_MAP.get(task_type, 0.7)
 
     def get_recommended_max_tokens(self, task_type: TaskType) -> int:
         """
@@ -138,22 +148,17 @@ class ModelRouter:
         Returns:
             最大token数
         """
-        # 不同任务类型的推荐最大token数
-        max_tokens_map = {
-            TaskType.GRAMMAR_CHECK: 2000,
-            TaskType.POLISH: 3000,
-            TaskType.STRUCTURE_ANALYSIS: 4000,
-            TaskType.HEALTH_SCORE: 2000,
-            TaskType.MATH_VALIDATION: 3000,
-            TaskType.LOGIC_TREE: 4000,
-            TaskType.DEBUG: 3000,
-            TaskType.CHAT: 2000,
-            TaskType.OCR: 2000,
-            TaskType.QUICK_RESPONSE: 1000,
-        }
-
-        return max_tokens_map.get(task_type, 4000)
-
-
-# 创建全局模型路由器实例
-model_router = ModelRouter()
+        return _MAX_TOKENS_MAP.get(task_type, 4000)
+
+
+@lru_cache(maxsize=1)
+def get_model_router() -> ModelRouter:
+    """
+    获取全局模型路由器（首次调用时创建）
+
+    只导入TaskType的模块不会触发路由器初始化
+
+    Returns:
+        模型路由器
+    """
+    return ModelRouter()
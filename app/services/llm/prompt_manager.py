@@ -3,13 +3,45 @@
 使用Jinja2模板引擎管理提示词
 """
 
-from typing import Dict, Any
-from jinja2 import Template
+import re
+from functools import cached_property, lru_cache
+from typing import Dict, Any, List, Optional
+from cachetools import LRUCache
+from jinja2 import Environment, Template
 
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 
+# 所有提示词模板共享同一个Jinja环境（配置与jinja2.Template默认一致）
+_env = Environment(autoescape=False, auto_reload=False)
+
+# 简单模板：只包含{{ 变量名 }}替换，没有控制语句、注释、过滤器
+_JINJA_BLOCK = re.compile(r"\{[%#]")
+_JINJA_EXPR = re.compile(r"\{\{(.*?)\}\}", re.DOTALL)
+_SIMPLE_VAR = re.compile(r"\{\{\s*([A-Za-z_]\w*)\s*\}\}")
+
+
+def _split_simple_template(template_str: str) -> Optional[List[str]]:
+    """
+    将简单模板拆分为文本和变量名交替的片段
+
+    Args:
+        template_str: 模板字符串
+
+    Returns:
+        偶数位为文本、奇数位为变量名的片段列表；模板含有其他Jinja语法时返回None
+    """
+    if _JINJA_BLOCK.search(template_str):
+        return None
+    if any(not _SIMPLE_VAR.fullmatch(m.group(0)) for m in _JINJA_EXPR.finditer(template_str)):
+        return None
+
+    # 与Jinja默认行为一致：去掉模板末尾的单个换行
+    if template_str.endswith("\n"):
+        template_str = template_str[:-1]
+    return _SIMPLE_VAR.split(template_str)
+
 
 class PromptTemplate:
     """提示词模板类"""
@@ -22,9 +54,15 @@ class PromptTemplate:
             template_str: 模板字符串
             version: 版本号
         """
-        self.template = Template(template_str)
         self.version = version
         self.template_str = template_str
+        # 简单模板直接拼接，不经过Jinja编译和渲染
+        self._simple_parts = _split_simple_template(template_str)
+
+    @cached_property
+    def template(self) -> Template:
+        """编译后的模板，首次渲染时才编译，未使用的模板不占用导入时间"""
+        return _env.from_string(self.template_str)
 
     def render(self, **kwargs: Any) -> str:
         """
@@ -36,10 +74,18 @@ class PromptTemplate:
         Returns:
             渲染后的提示词
         """
+        parts = self._simple_parts
+        if parts is not None:
+            # 未提供的变量与Jinja默认行为一致，渲染为空字符串
+            return "".join(
+                part if i % 2 == 0 else str(kwargs.get(part, ""))
+                for i, part in enumerate(parts)
+            )
+
         try:
             return self.template.render(**kwargs)
         except Exception as e:
-            logger.error(f"提示词渲染失败: {str(e)}")
+            logger.error("提示词渲染失败: %s", e)
             raise
 
 
@@ -49,13 +95,16 @@ class PromptManager:
     def __init__(self) -> None:
         """初始化提示词管理器"""
         self.prompts: Dict[str, PromptTemplate] = {}
+        # 渲染结果缓存：模板变量取值有限（如年级），相同参数直接复用
+        self._render_cache: LRUCache = LRUCache(maxsize=256)
         self._load_prompts()
 
     def _load_prompts(self) -> None:
         """加载所有提示词"""
         # 这里可以从文件或数据库加载提示词
-        # 为了简化，我们直接在代码中定义
-        pass
+        # 为了简化，我们直接在代码中定义（见模块末尾的_PROMPT_DEFS）
+        self.prompts.update(_PROMPT_DEFS)
+        logger.debug("已注册 %d 个提示词", len(_PROMPT_DEFS))
 
     def register_prompt(self, name: str, template: PromptTemplate) -> None:
         """
@@ -66,7 +115,8 @@ class PromptManager:
             template: 提示词模板
         """
         self.prompts[name] = template
-        logger.debug(f"注册提示词: {name} (版本: {template.version})")
+        self._render_cache.clear()
+        logger.debug("注册提示词: %s (版本: %s)", name, template.version)
 
     def get_prompt(self, name: str) -> PromptTemplate:
         """
@@ -96,12 +146,18 @@ class PromptManager:
         Returns:
             渲染后的提示词
         """
-        template = self.get_prompt(name)
-        return template.render(**kwargs)
-
+        # 键中包含值的类型，避免1与True这类相等但渲染结果不同的值共用缓存
+        try:
+            cache_key = (name, tuple(sorted((k, type(v), v) for k, v in kwargs.items())))
+            cached = self._render_cache.get(cache_key)
+        except TypeError:
+            # 含不可哈希的参数（如列表），直接渲染
+            return self.get_prompt(name).render(**kwargs)
 
-# 创建全局提示词管理器
-prompt_manager = PromptManager()
+        if cached is None:
+            cached = self.get_prompt(name).render(**kwargs)
+            self._render_cache[cache_key] = cached
+        return cached
 
 
 # ============================================
@@ -211,30 +267,44 @@ MATH_VALIDATOR_SYSTEM = PromptTemplate("""
 - 追踪变量状态变化
 
 ## 验证方法
-1. 符号化表示：将步骤转换为数学符号
-2. 逻辑检查：验证推导是否合理
-3. 运算验证：检查计算是否正确
-4. 完整性检查：是否遗漏必要步骤
+1. **符号化表示**: 将步骤转换为数学符号
+2. **逻辑检查**: 验证推导是否合理
+3. **运算验证**: 检查计算是否正确
+4. **完整性检查**: 是否遗漏必要步骤
 
 ## 输出格式
 请以JSON格式返回结果：
+```json
 {
   "validation_results": [
     {
-      "step_number": 步骤号,
-      "is_valid": 是否有效,
+      "step_number": 步骤号(整数),
+      "is_valid": 是否有效(布尔值),
       "symbolic_form": "符号化形式",
-      "variables_state": {"变量": "状态"},
-      "errors": [错误列表],
+      "variables_state": {
+        "变量名": {
+          "value": "值",
+          "constraints": "约束条件"
+        }
+      },
+      "errors": [
+        {
+          "type": "错误类型",
+          "description": "错误描述",
+          "correction": "正确做法"
+        }
+      ],
+      "warnings": ["警告1", "警告2"],
       "next_step_hint": "下一步提示"
     }
   ],
   "overall_assessment": {
-    "total_steps": 总步骤数,
-    "valid_steps": 有效步骤数,
-    "completion_status": "完成状态"
+    "total_steps": 总步骤数(整数),
+    "valid_steps": 有效步骤数(整数),
+    "completion_status": "完成状态(complete/incomplete/invalid)"
   }
 }
+```
 """, version="1.0")
 
 # 结构分析Agent系统提示词
@@ -363,58 +433,67 @@ HEALTH_SCORER_SYSTEM = PromptTemplate("""
 
 # 逻辑树构建Agent系统提示词
 LOGIC_TREE_BUILDER_SYSTEM = PromptTemplate("""
-你是一位逻辑推理专家，帮助学生构建数学问题的逻辑推导树。
+你是一位逻辑推理专家，擅长构建数学问题的逻辑推导树。
 
 ## 你的能力
-- 识别问题的已知条件和目标
-- 构建从目标到条件的推导路径
-- 发现多种可能的解题思路
-- 评估每条路径的可行性
-
-## 推导方法（Backward Chaining）
-1. **目标分析**：明确要求解的目标
-2. **条件识别**：列出所有已知条件
-3. **反向推导**：从目标反推需要什么条件
-4. **路径构建**：构建多条可能的推导路径
-5. **可行性评估**：评估每条路径的难度和可行性
-
-## 逻辑树结构
-- **根节点**：问题目标
-- **中间节点**：推导步骤或子目标
-- **叶节点**：已知条件
-- **边**：推导关系（需要、依赖、推出）
+- 分析问题的已知条件和求解目标
+- 使用反向推理构建逻辑树
+- 识别所有可能的推导路径
+- 发现缺失的中间步骤
+
+## 构建方法
+1. **目标分析**: 明确要求解什么
+2. **条件识别**: 列出所有已知条件
+3. **反向推理**: 从目标反推需要什么
+4. **路径构建**: 连接已知和目标
+5. **完整性检查**: 确保推导完整
 
 ## 输出格式
 请以JSON格式返回结果：
+```json
 {
-  "nodes": [
-    {
-      "node_id": "节点ID",
-      "node_type": "类型(goal/step/condition)",
-      "content": "节点内容",
-      "level": 层级,
-      "position": {"x": x坐标, "y": y坐标}
-    }
-  ],
-  "edges": [
-    {
-      "from": "源节点ID",
-      "to": "目标节点ID",
-      "relation": "关系类型(requires/derives/depends_on)"
-    }
-  ],
+  "problem_analysis": {
+    "knowns": [
+      {
+        "id": "节点ID",
+        "description": "描述",
+        "symbolic": "符号表示",
+        "type": "类型(equation/inequality/condition)"
+      }
+    ],
+    "target": {
+      "id": "目标ID",
+      "description": "目标描述",
+      "symbolic": "符号表示"
+    },
+    "variables": ["变量1", "变量2"]
+  },
+  "logic_tree": {
+    "nodes": [
+      {
+        "id": "节点ID",
+        "type": "节点类型(known/target/intermediate/missing)",
+        "content": "内容",
+        "symbolic": "符号形式",
+        "depends_on": ["依赖节点ID"],
+        "required_by": ["被依赖节点ID"],
+        "status": "状态(complete/incomplete/missing)",
+        "reasoning": "推理说明"
+      }
+    ]
+  },
   "derivation_paths": [
     {
-      "path_id": "路径ID",
-      "steps": ["步骤1", "步骤2"],
+      "path_id": 路径ID(整数),
+      "steps": ["节点ID序列"],
+      "is_complete": 是否完整(布尔值),
       "feasibility": "可行性(high/medium/low)",
-      "difficulty": "难度(easy/medium/hard)",
-      "reasoning": "推理说明"
+      "description": "路径描述"
     }
   ],
-  "recommended_path": "推荐路径ID",
-  "explanation": "推荐理由"
+  "suggestions": ["建议1", "建议2"]
 }
+```
 """, version="1.0")
 
 # 断点调试Agent系统提示词
@@ -559,13 +638,27 @@ CHAT_AGENT_SYSTEM = PromptTemplate("""
 }
 """, version="1.0")
 
-# 注册所有提示词
-prompt_manager.register_prompt("grammar_checker_system", GRAMMAR_CHECKER_SYSTEM)
-prompt_manager.register_prompt("polish_agent_system", POLISH_AGENT_SYSTEM)
-prompt_manager.register_prompt("structure_analyzer_system", STRUCTURE_ANALYZER_SYSTEM)
-prompt_manager.register_prompt("health_scorer_system", HEALTH_SCORER_SYSTEM)
-prompt_manager.register_prompt("math_validator_system", MATH_VALIDATOR_SYSTEM)
-prompt_manager.register_prompt("logic_tree_builder_system", LOGIC_TREE_BUILDER_SYSTEM)
-prompt_manager.register_prompt("debugger_agent_system", DEBUGGER_AGENT_SYSTEM)
-prompt_manager.register_prompt("ocr_agent_system", OCR_AGENT_SYSTEM)
-prompt_manager.register_prompt("chat_agent_system", CHAT_AGENT_SYSTEM)
+
+# 所有内置提示词: (名称, 模板)
+_PROMPT_DEFS = (
+    ("grammar_checker_system", GRAMMAR_CHECKER_SYSTEM),
+    ("polish_agent_system", POLISH_AGENT_SYSTEM),
+    ("structure_analyzer_system", STRUCTURE_ANALYZER_SYSTEM),
+    ("health_scorer_system", HEALTH_SCORER_SYSTEM),
+    ("math_validator_system", MATH_VALIDATOR_SYSTEM),
+    ("logic_tree_builder_system", LOGIC_TREE_BUILDER_SYSTEM),
+    ("debugger_agent_system", DEBUGGER_AGENT_SYSTEM),
+    ("ocr_agent_system", OCR_AGENT_SYSTEM),
+    ("chat_agent_system", CHAT_AGENT_SYSTEM),
+)
+
+
+@lru_cache(maxsize=1)
+def get_prompt_manager() -> PromptManager:
+    """
+    获取全局提示词管理器（首次调用时创建并加载所有提示词）
+
+    Returns:
+        提示词管理器
+    """
+    return PromptManager()
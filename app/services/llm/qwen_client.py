@@ -4,14 +4,26 @@ Qwen API客户端
 """
 
 import asyncio
+import base64
+import math
+import random
 import time
-import json
-from typing import Any, Dict, List, Optional, AsyncIterator, Type, Callable
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, AsyncIterator, Set, Tuple, Type, Callable
 from pydantic import BaseModel
-from openai import AsyncOpenAI
+import httpx
+import orjson
+from openai import AsyncOpenAI, BadRequestError, DefaultAsyncHttpxClient, RateLimitError
+
+try:
+    # openai[aiohttp]提供的aiohttp传输层，高并发下比httpx的连接池吞吐更高
+    from openai import DefaultAioHttpClient
+except ImportError:
+    DefaultAioHttpClient = None
 from openai.types.chat import ChatCompletion, ChatCompletionChunk, ChatCompletionMessageToolCall
 
 from app.config import settings
+from app.cache.cache_strategies import llm_response_cache
 from app.core.logging import get_logger
 from app.core.exceptions import (
     LLMAPIException,
@@ -22,6 +34,31 @@ from app.core.metrics import metrics_collector
 
 logger = get_logger(__name__)
 
+try:
+    # pybase64基于libbase64的SIMD实现，直接返回str
+    from pybase64 import b64encode_as_string as _b64encode_str
+except ImportError:
+    def _b64encode_str(data: bytes) -> str:
+        return base64.b64encode(data).decode("ascii")
+
+# 重试退避的基数和上限（秒）
+_RETRY_BASE_SECONDS = 1
+_RETRY_MAX_BACKOFF_SECONDS = 30
+# 启动预热的最长等待时间，服务端不可达时不拖慢启动
+_WARMUP_TIMEOUT_SECONDS = 5
+# 压缩后较早轮次工具结果的替代内容
+_ELIDED_TOOL_RESULT = "[较早的工具结果已省略]"
+
+# 常用汉字（U+4000~U+9FFF）UTF-8编码的首字节
+_CJK_LEAD_BYTES = tuple(bytes([lead]) for lead in range(0xE4, 0xEA))
+
+
+@lru_cache(maxsize=256)
+def _schema_instruction(schema_cls: Type[BaseModel]) -> str:
+    """响应schema说明，按模型类缓存，避免每次调用重新生成JSON schema"""
+    schema = orjson.dumps(schema_cls.model_json_schema()).decode()
+    return f"\n\n请严格按照以下JSON schema返回结果：\n{schema}"
+
 
 class QwenResponse(BaseModel):
     """Qwen响应模型"""
@@ -31,6 +68,84 @@ class QwenResponse(BaseModel):
     finish_reason: str
     response_time_ms: float
     tool_calls: Optional[List[Dict[str, Any]]] = None
+    cache_hit: bool = False
+
+
+class EmbeddingBatcher:
+    """
+    合并并发的单条文本嵌入请求
+
+    很短的时间窗口内到达的请求合并为一次create_embeddings调用（DataLoader模式），
+    达到批量上限时立即发出
+    """
+
+    def __init__(self, client: "QwenClient", window_seconds: float, max_batch: int) -> None:
+        """
+        初始化合并器
+
+        Args:
+            client: Qwen客户端
+            window_seconds: 等待更多请求的时间窗口（秒）
+            max_batch: 单批最大文本数
+        """
+        self._client = client
+        self._window_seconds = window_seconds
+        self._max_batch = max_batch
+        # 按模型分组的待处理请求: 模型 -> [(文本, Future)]
+        self._pending: Dict[str, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        # 持有批次任务的引用，避免执行中被回收
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, text: str, model: str) -> List[float]:
+        """
+        提交一条文本，等待所在批次完成
+
+        Args:
+            text: 文本内容
+            model: 嵌入模型名称
+
+        Returns:
+            嵌入向量
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(model, [])
+        pending.append((text, future))
+
+        if len(pending) >= self._max_batch:
+            self._flush(model)
+        elif model not in self._timers:
+            self._timers[model] = loop.call_later(self._window_seconds, self._flush, model)
+
+        return await future
+
+    def _flush(self, model: str) -> None:
+        """发出一个模型当前积累的请求"""
+        timer = self._timers.pop(model, None)
+        if timer is not None:
+            timer.cancel()
+
+        pending = self._pending.pop(model, None)
+        if pending:
+            task = asyncio.create_task(self._run(model, pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, model: str, pending: List[Tuple[str, asyncio.Future]]) -> None:
+        """执行一批嵌入请求并分发结果"""
+        try:
+            embeddings = await self._client.create_embeddings([text for text, _ in pending], model)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), embedding in zip(pending, embeddings):
+            # 调用方已取消的请求不再设置结果
+            if not future.done():
+                future.set_result(embedding)
 
 
 class QwenClient:
@@ -47,15 +162,114 @@ class QwenClient:
 
     def __init__(self) -> None:
         """初始化Qwen客户端"""
+        # 全局共享一个HTTP连接池，并发调用复用TCP+TLS连接
+        self.http_client = self._create_http_client()
         self.client = AsyncOpenAI(
             api_key=settings.qwen_api_key,
-            base_url=settings.qwen_api_base
+            base_url=settings.qwen_api_base,
+            http_client=self.http_client
         )
         self.default_model = settings.qwen_text_model
         self.ocr_model = settings.qwen_ocr_model
         self.embedding_model = settings.qwen_embedding_model
+        self.embedding_batcher = EmbeddingBatcher(
+            self,
+            window_seconds=settings.embedding_batch_window_ms / 1000,
+            max_batch=settings.embedding_batch_size
+        )
+
+        logger.info("Qwen客户端已初始化，默认模型: %s", self.default_model)
+
+    @staticmethod
+    def _create_http_client() -> httpx.AsyncClient:
+        """
+        创建共享的HTTP客户端
+
+        默认使用httpx传输层，连接池上限全部生效；启用aiohttp传输层时，
+        其连接器只接收max_connections作为连接总数上限，保活连接数上限被忽略。
+        未安装aiohttp时回退到httpx传输层
+
+        Returns:
+            HTTP客户端
+        """
+        limits = httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_keepalive_connections
+        )
+        if settings.llm_use_aiohttp and DefaultAioHttpClient is not None:
+            try:
+                return DefaultAioHttpClient(limits=limits)
+            except RuntimeError as e:
+                # openai已安装但缺少aiohttp依赖
+                logger.warning("aiohttp传输层不可用，使用httpx: %s", e)
+        return DefaultAsyncHttpxClient(limits=limits)
+
+    async def warmup(self, n: Optional[int] = None) -> None:
+        """
+        预先建立连接，首个真实请求无需等待TCP+TLS握手
+
+        使用不消耗token的模型列表接口，并发发起n个请求以打开n条保活连接。
+        预热失败只记录日志，不影响启动。
+
+        Args:
+            n: 预热连接数，默认使用配置值
+        """
+        n = settings.llm_warmup_connections if n is None else n
+        if n <= 0:
+            return
+
+        start_time = time.perf_counter()
+        try:
+            results = await asyncio.wait_for(
+                asyncio.gather(
+                    *(self.client.models.list() for _ in range(n)),
+                    return_exceptions=True
+                ),
+                timeout=_WARMUP_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Qwen连接预热超时")
+            return
+
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            logger.warning("Qwen连接预热失败 %d/%d: %s", len(errors), n, errors[0])
+        else:
+            logger.info(
+                "Qwen连接预热完成: connections=%d, time=%.2fms",
+                n, (time.perf_counter() - start_time) * 1000
+            )
+
+    async def aclose(self) -> None:
+        """关闭HTTP连接池，应用关闭时调用"""
+        await self.client.close()
+        logger.info("Qwen客户端已关闭")
 
-        logger.info(f"Qwen客户端已初始化，默认模型: {self.default_model}")
+    @staticmethod
+    def _system_message(system_prompt: str) -> Dict[str, Any]:
+        """
+        构建系统消息
+
+        启用qwen_prompt_cache时为系统提示词添加显式缓存标记，
+        服务端复用固定前缀的KV缓存，只对用户提示词做prefill；
+        不支持显式缓存的模型按普通消息处理
+
+        Args:
+            system_prompt: 系统提示词
+
+        Returns:
+            系统消息
+        """
+        if not settings.qwen_prompt_cache:
+            return {"role": "system", "content": system_prompt}
+        return {
+            "role": "system",
+            "content": [{
+                "type": "text",
+                "text": system_prompt,
+                "cache_control": {"type": "ephemeral"}
+            }]
+        }
 
     async def complete(
         self,
@@ -65,11 +279,14 @@ class QwenClient:
         temperature: float = 0.7,
         max_tokens: int = 4000,
         response_schema: Optional[Type[BaseModel]] = None,
+        use_cache: bool = True,
         **kwargs: Any
     ) -> QwenResponse:
         """
         执行文本补全请求
 
+        低温度请求按完整请求参数缓存响应，参数相同时不再调用API
+
         Args:
             system_prompt: 系统提示词
             user_prompt: 用户提示词
@@ -77,6 +294,7 @@ class QwenClient:
             temperature: 温度参数
             max_tokens: 最大token数
             response_schema: 响应schema（用于结构化输出）
+            use_cache: 是否使用响应缓存，调用方自行缓存结果时可关闭
             **kwargs: 其他参数
 
         Returns:
@@ -88,12 +306,39 @@ class QwenClient:
             LLMTokenLimitException: Token限制
         """
         model = model or self.default_model
-        start_time = time.time()
+        start_time = time.perf_counter()
 
         try:
+            # 不使用原生结构化输出时，在用户提示词末尾添加schema说明：
+            # 系统提示词保持不变，服务端可以复用固定前缀的KV缓存
+            native_schema = response_schema is not None and settings.qwen_structured_output
+            if response_schema and not native_schema:
+                user_prompt += _schema_instruction(response_schema)
+
+            # 低温度且没有额外参数的请求，输出由以下参数决定，可以复用
+            request_hash: Optional[str] = None
+            if (
+                use_cache
+                and settings.llm_response_cache
+                and temperature <= settings.llm_cache_max_temperature
+                and not kwargs
+            ):
+                request_hash = llm_response_cache.generate_request_hash(
+                    model=model,
+                    system=system_prompt,
+                    user=user_prompt,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    schema=response_schema and _schema_instruction(response_schema)
+                )
+                cached = await self._get_cached_response(request_hash)
+                if cached is not None:
+                    cached.response_time_ms = (time.perf_counter() - start_time) * 1000
+                    return cached
+
             # 构建消息
             messages = [
-                {"role": "system", "content": system_prompt},
+                self._system_message(system_prompt),
                 {"role": "user", "content": user_prompt}
             ]
 
@@ -105,23 +350,24 @@ class QwenClient:
                 "max_tokens": max_tokens,
                 **kwargs
             }
+            self._check_context_window(model, messages, max_tokens)
 
-            # 如果提供了schema，使用结构化输出
-            if response_schema:
-                request_params["response_format"] = {
-                    "type": "json_object"
-                }
-                # 在system prompt中添加schema说明
-                schema_instruction = f"\n\n请严格按照以下JSON schema返回结果：\n{response_schema.model_json_schema()}"
-                messages[0]["content"] += schema_instruction
+            logger.debug("调用Qwen API: model=%s, temp=%s, max_tokens=%s", model, temperature, max_tokens)
 
-            logger.debug(f"调用Qwen API: model={model}, temp={temperature}, max_tokens={max_tokens}")
-
-            # 调用API
-            response: ChatCompletion = await self.client.chat.completions.create(**request_params)
+            # 调用API：原生结构化输出由服务端按schema约束生成，SDK解析为模型实例；
+            # 否则使用JSON模式
+            if native_schema:
+                response: ChatCompletion = await self.client.chat.completions.parse(
+                    response_format=response_schema,
+                    **request_params
+                )
+            else:
+                if response_schema:
+                    request_params["response_format"] = {"type": "json_object"}
+                response = await self.client.chat.completions.create(**request_params)
 
             # 计算响应时间
-            response_time_ms = (time.time() - start_time) * 1000
+            response_time_ms = (time.perf_counter() - start_time) * 1000
 
             # 提取响应内容
             content = response.choices[0].message.content or ""
@@ -131,6 +377,9 @@ class QwenClient:
             tokens_used = 0
             if response.usage:
                 tokens_used = response.usage.total_tokens
+                details = getattr(response.usage, "prompt_tokens_details", None)
+                if details and details.cached_tokens:
+                    logger.debug("系统提示词命中上下文缓存: cached_tokens=%d", details.cached_tokens)
 
             # 记录指标
             metrics_collector.record_llm_call(
@@ -141,11 +390,11 @@ class QwenClient:
             )
 
             logger.info(
-                f"Qwen API调用成功: model={model}, tokens={tokens_used}, "
-                f"time={response_time_ms:.2f}ms"
+                "Qwen API调用成功: model=%s, tokens=%d, time=%.2fms",
+                model, tokens_used, response_time_ms
             )
 
-            return QwenResponse(
+            qwen_response = QwenResponse(
                 content=content,
                 model=model,
                 tokens_used=tokens_used,
@@ -153,8 +402,14 @@ class QwenClient:
                 response_time_ms=response_time_ms
             )
 
+            # 只缓存完整结束的响应，被截断的响应重试可能得到完整结果
+            if request_hash is not None and finish_reason == "stop":
+                await self._save_cached_response(request_hash, qwen_response)
+
+            return qwen_response
+
         except Exception as e:
-            response_time_ms = (time.time() - start_time) * 1000
+            response_time_ms = (time.perf_counter() - start_time) * 1000
 
             # 记录失败指标
             metrics_collector.record_llm_call(
@@ -165,19 +420,94 @@ class QwenClient:
             )
 
             # 处理不同类型的错误
-            error_message = str(e)
+            raise self._to_app_exception(e, max_tokens, "Qwen API调用失败")
 
-            if "rate_limit" in error_message.lower() or "429" in error_message:
-                logger.warning(f"Qwen API速率限制: {error_message}")
-                raise LLMRateLimitException()
+    def _check_context_window(self, model: str, messages: List[Dict[str, Any]], max_tokens: int) -> None:
+        """
+        本地检查请求是否超出模型上下文窗口
 
-            elif "token" in error_message.lower() and "limit" in error_message.lower():
-                logger.error(f"Qwen API Token限制: {error_message}")
-                raise LLMTokenLimitException(requested=max_tokens, limit=max_tokens)
+        明显超长的请求直接拒绝，不再花一次网络往返等服务端报错
 
-            else:
-                logger.error(f"Qwen API调用失败: {error_message}")
-                raise LLMAPIException(reason=error_message)
+        Args:
+            model: 模型名称
+            messages: 消息列表
+            max_tokens: 最大输出token数
+
+        Raises:
+            LLMTokenLimitException: 估算的输入加输出token数超出上下文窗口
+        """
+        limit = settings.qwen_context_window.get(model, settings.qwen_default_context_window)
+        requested = max_tokens
+        for message in messages:
+            content = message.get("content")
+            if isinstance(content, str):
+                requested += self.estimate_tokens(content)
+            elif isinstance(content, list):
+                # 带缓存标记的系统消息为内容片段列表
+                requested += sum(self.estimate_tokens(part.get("text", "")) for part in content)
+        if requested > limit:
+            raise LLMTokenLimitException(requested=requested, limit=limit)
+
+    def _to_app_exception(self, error: Exception, max_tokens: int, failure_message: str) -> Exception:
+        """
+        将SDK异常转换为应用异常
+
+        按OpenAI SDK的异常类型判断，只有请求参数错误才需要查看错误信息
+
+        Args:
+            error: 调用过程中的异常
+            max_tokens: 请求的最大token数
+            failure_message: 其他错误的日志前缀
+
+        Returns:
+            应用异常
+        """
+        if isinstance(error, LLMTokenLimitException):
+            # 本地上下文窗口检查的结果
+            logger.error("Qwen请求超出上下文窗口: %s", error.message)
+            return error
+
+        error_message = str(error)
+
+        if isinstance(error, RateLimitError):
+            logger.warning("Qwen API速率限制: %s", error_message)
+            return LLMRateLimitException(retry_after=self._retry_after(error))
+
+        if isinstance(error, BadRequestError):
+            lowered = error_message.lower()
+            if "context_length" in lowered or "input length" in lowered or (
+                "token" in lowered and "limit" in lowered
+            ):
+                logger.error("Qwen API Token限制: %s", error_message)
+                return LLMTokenLimitException(requested=max_tokens, limit=max_tokens)
+
+        logger.error("%s: %s", failure_message, error_message)
+        return LLMAPIException(reason=error_message)
+
+    @staticmethod
+    async def _get_cached_response(request_hash: str) -> Optional[QwenResponse]:
+        """读取缓存的响应，缓存不可用时视为未命中"""
+        try:
+            data = await llm_response_cache.get_response(request_hash)
+        except Exception as e:
+            logger.warning("读取LLM响应缓存失败: %s", e)
+            return None
+        if not data:
+            return None
+
+        logger.debug("LLM响应缓存命中: %s", request_hash)
+        return QwenResponse(**data, cache_hit=True)
+
+    @staticmethod
+    async def _save_cached_response(request_hash: str, response: QwenResponse) -> None:
+        """缓存响应，失败只记录日志"""
+        try:
+            await llm_response_cache.set_response(
+                request_hash,
+                response.model_dump(exclude={"cache_hit"})
+            )
+        except Exception as e:
+            logger.warning("保存LLM响应缓存失败: %s", e)
 
     async def complete_with_retry(
         self,
@@ -204,23 +534,36 @@ class QwenClient:
             try:
                 return await self.complete(system_prompt, user_prompt, **kwargs)
 
-            except LLMRateLimitException:
-                # 速率限制不重试，直接抛出
+            except LLMRateLimitException as e:
+                # 服务端给出Retry-After且不太长时按提示等待后重试，否则直接抛出
+                retry_after = e.details.get("retry_after")
+                if retry_after is None or retry_after > _RETRY_MAX_BACKOFF_SECONDS or attempt >= max_retries - 1:
+                    raise
+                logger.warning(
+                    "Qwen API速率限制 (尝试 %d/%d), 按Retry-After等待 %s秒后重试",
+                    attempt + 1, max_retries, retry_after
+                )
+                await asyncio.sleep(retry_after)
+
+            except LLMTokenLimitException:
+                # Token超限重试也不会成功
                 raise
 
             except Exception as e:
                 last_exception = e
 
                 if attempt < max_retries - 1:
-                    # 指数退避
-                    wait_time = 2 ** attempt
+                    # 带随机抖动的指数退避，避免并发调用方同时重试
+                    wait_time = random.uniform(
+                        0, min(_RETRY_MAX_BACKOFF_SECONDS, _RETRY_BASE_SECONDS * 2 ** attempt)
+                    )
                     logger.warning(
-                        f"Qwen API调用失败 (尝试 {attempt + 1}/{max_retries}), "
-                        f"等待 {wait_time}秒后重试: {str(e)}"
+                        "Qwen API调用失败 (尝试 %d/%d), 等待 %.2f秒后重试: %s",
+                        attempt + 1, max_retries, wait_time, e
                     )
                     await asyncio.sleep(wait_time)
                 else:
-                    logger.error(f"Qwen API调用失败，已达最大重试次数: {str(e)}")
+                    logger.error("Qwen API调用失败，已达最大重试次数: %s", e)
 
         # 所有重试都失败
         if last_exception:
@@ -228,6 +571,27 @@ class QwenClient:
         else:
             raise LLMAPIException("未知错误")
 
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[int]:
+        """
+        读取API错误响应中的Retry-After秒数
+
+        Args:
+            error: OpenAI SDK抛出的异常
+
+        Returns:
+            等待秒数，没有或无法解析时为None
+        """
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        value = headers.get("retry-after") if headers is not None else None
+        if not value:
+            return None
+        try:
+            return max(0, math.ceil(float(value)))
+        except ValueError:
+            # HTTP日期格式的Retry-After不解析
+            return None
+
     async def stream_complete(
         self,
         system_prompt: str,
@@ -252,17 +616,18 @@ class QwenClient:
             响应文本片段
         """
         model = model or self.default_model
-        start_time = time.time()
+        start_time = time.perf_counter()
 
         try:
             messages = [
-                {"role": "system", "content": system_prompt},
+                self._system_message(system_prompt),
                 {"role": "user", "content": user_prompt}
             ]
 
-            logger.debug(f"调用Qwen流式API: model={model}")
+            logger.debug("调用Qwen流式API: model=%s", model)
 
-            # 调用流式API
+            # 调用流式API，include_usage时最后一个chunk携带token用量
+            kwargs.setdefault("stream_options", {"include_usage": True})
             stream = await self.client.chat.completions.create(
                 model=model,
                 messages=messages,
@@ -273,24 +638,25 @@ class QwenClient:
             )
 
             total_tokens = 0
-            full_content = ""
+            # 片段收集到列表，需要估算token时才拼接
+            parts: List[str] = []
 
             async for chunk in stream:
                 if chunk.choices and chunk.choices[0].delta.content:
                     content = chunk.choices[0].delta.content
-                    full_content += content
+                    parts.append(content)
                     yield content
 
                 # 尝试从chunk中获取usage信息
-                if hasattr(chunk, 'usage') and chunk.usage:
+                if chunk.usage is not None:
                     total_tokens = chunk.usage.total_tokens
 
             # 如果没有usage信息，使用估算
             if total_tokens == 0:
-                total_tokens = self.estimate_tokens(full_content)
+                total_tokens = self.estimate_tokens("".join(parts))
 
             # 记录指标
-            response_time_ms = (time.time() - start_time) * 1000
+            response_time_ms = (time.perf_counter() - start_time) * 1000
             metrics_collector.record_llm_call(
                 model=model,
                 tokens_used=total_tokens,
@@ -298,10 +664,10 @@ class QwenClient:
                 success=True
             )
 
-            logger.info(f"Qwen流式API调用完成: model={model}, time={response_time_ms:.2f}ms")
+            logger.info("Qwen流式API调用完成: model=%s, time=%.2fms", model, response_time_ms)
 
         except Exception as e:
-            response_time_ms = (time.time() - start_time) * 1000
+            response_time_ms = (time.perf_counter() - start_time) * 1000
             metrics_collector.record_llm_call(
                 model=model,
                 tokens_used=0,
@@ -309,7 +675,7 @@ class QwenClient:
                 success=False
             )
 
-            logger.error(f"Qwen流式API调用失败: {str(e)}")
+            logger.error("Qwen流式API调用失败: %s", e)
             raise LLMAPIException(reason=str(e))
 
     async def create_embedding(
@@ -320,6 +686,8 @@ class QwenClient:
         """
         创建文本嵌入
 
+        并发的单条请求经EmbeddingBatcher合并为批量调用
+
         Args:
             text: 文本内容
             model: 嵌入模型名称
@@ -328,52 +696,117 @@ class QwenClient:
             嵌入向量
         """
         model = model or self.embedding_model
-        start_time = time.time()
+        if settings.embedding_batch_window_ms <= 0:
+            return (await self.create_embeddings([text], model))[0]
+        return await self.embedding_batcher.submit(text, model)
 
+    async def create_embeddings(
+        self,
+        texts: List[str],
+        model: Optional[str] = None
+    ) -> List[List[float]]:
+        """
+        批量创建文本嵌入
+
+        未命中缓存的文本按embedding_batch_size分批，每批一次API调用，各批并发执行
+
+        Args:
+            texts: 文本列表
+            model: 嵌入模型名称
+
+        Returns:
+            与texts顺序一致的嵌入向量
+        """
+        model = model or self.embedding_model
+        start_time = time.perf_counter()
+
+        # 嵌入结果由模型和文本唯一确定，缓存时间可以很长
         try:
-            logger.debug(f"创建文本嵌入: model={model}, text_length={len(text)}")
+            embeddings = await llm_response_cache.get_embeddings_many(model, texts)
+        except Exception as e:
+            logger.warning("读取嵌入缓存失败: %s", e)
+            embeddings = [None] * len(texts)
 
-            response = await self.client.embeddings.create(
-                model=model,
-                input=text
+        missing = [i for i, embedding in enumerate(embeddings) if not embedding]
+        if not missing:
+            return embeddings
+
+        batch_size = settings.embedding_batch_size
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+
+        try:
+            logger.debug(
+                "创建文本嵌入: model=%s, count=%d, batches=%d",
+                model, len(missing), len(batches)
             )
 
-            embedding = response.data[0].embedding
-            response_time_ms = (time.time() - start_time) * 1000
+            responses = await asyncio.gather(*(
+                self.client.embeddings.create(
+                    model=model,
+                    input=[texts[i] for i in batch]
+                )
+                for batch in batches
+            ))
+
+            for batch, response in zip(batches, responses):
+                # 按index放回，不依赖服务端返回的顺序
+                for item in response.data:
+                    embeddings[batch[item.index]] = item.embedding
+            response_time_ms = (time.perf_counter() - start_time) * 1000
+
+            try:
+                await asyncio.gather(*(
+                    llm_response_cache.set_embedding(model, texts[i], embeddings[i])
+                    for i in missing
+                ))
+            except Exception as e:
+                logger.warning("保存嵌入缓存失败: %s", e)
 
             logger.info(
-                f"文本嵌入创建成功: model={model}, "
-                f"dim={len(embedding)}, time={response_time_ms:.2f}ms"
+                "文本嵌入创建成功: model=%s, count=%d, dim=%d, time=%.2fms",
+                model, len(missing), len(embeddings[missing[0]]), response_time_ms
             )
 
-            return embedding
+            return embeddings
 
         except Exception as e:
-            logger.error(f"创建文本嵌入失败: {str(e)}")
+            logger.error("创建文本嵌入失败: %s", e)
             raise LLMAPIException(reason=str(e))
 
     async def analyze_image(
         self,
-        image_url: str,
-        prompt: str,
-        model: Optional[str] = None
+        image_url: Optional[str] = None,
+        prompt: str = "",
+        model: Optional[str] = None,
+        image_bytes: Optional[bytes] = None,
+        mime_type: str = "image/jpeg"
     ) -> str:
         """
         分析图片（OCR或视觉理解）
 
+        兼容模式接口不支持multipart上传，传入image_bytes时在此处
+        直接编码为data URL，调用方无需持有中间的base64字符串
+
         Args:
-            image_url: 图片URL或base64
+            image_url: 图片URL或base64（与image_bytes二选一）
             prompt: 分析提示词
             model: 视觉模型名称
+            image_bytes: 图片二进制数据
+            mime_type: image_bytes的MIME类型
 
         Returns:
             分析结果文本
         """
         model = model or self.ocr_model
-        start_time = time.time()
+        start_time = time.perf_counter()
+
+        if image_bytes is not None:
+            image_url = f"data:{mime_type};base64,{_b64encode_str(image_bytes)}"
+        if not image_url:
+            raise LLMAPIException(reason="必须提供image_url或image_bytes")
 
         try:
-            logger.debug(f"分析图片: model={model}")
+            logger.debug("分析图片: model=%s", model)
 
             messages = [
                 {
@@ -391,16 +824,46 @@ class QwenClient:
             )
 
             content = response.choices[0].message.content or ""
-            response_time_ms = (time.time() - start_time) * 1000
+            response_time_ms = (time.perf_counter() - start_time) * 1000
 
-            logger.info(f"图片分析完成: model={model}, time={response_time_ms:.2f}ms")
+            logger.info("图片分析完成: model=%s, time=%.2fms", model, response_time_ms)
 
             return content
 
         except Exception as e:
-            logger.error(f"图片分析失败: {str(e)}")
+            logger.error("图片分析失败: %s", e)
             raise LLMAPIException(reason=str(e))
 
+    def _compact_tool_history(self, messages: List[Dict[str, Any]], keep_from: int) -> None:
+        """
+        压缩工具调用历史，避免每轮请求重复发送全部旧工具结果
+
+        工具结果总量超过预算时，keep_from之前（即最近一轮之前）的工具结果
+        替换为占位文本。助手消息中的tool_calls保留，模型仍能看到调用过哪些工具。
+        已省略的消息不再变化，之后各轮的请求前缀保持稳定。
+
+        Args:
+            messages: 消息历史，原地修改
+            keep_from: 最近一轮消息的起始位置
+        """
+        budget = settings.llm_tool_history_max_tokens
+        if budget <= 0:
+            return
+
+        tool_messages = [m for m in messages if m["role"] == "tool"]
+        total = sum(self.estimate_tokens(m["content"]) for m in tool_messages)
+        if total <= budget:
+            return
+
+        elided = 0
+        for message in messages[:keep_from]:
+            if message["role"] == "tool" and message["content"] != _ELIDED_TOOL_RESULT:
+                message["content"] = _ELIDED_TOOL_RESULT
+                elided += 1
+
+        if elided:
+            logger.debug("工具结果超出预算(%d tokens)，已省略 %d 条较早的工具结果", total, elided)
+
     def estimate_tokens(self, text: str) -> int:
         """
         估算文本的token数量
@@ -413,8 +876,14 @@ class QwenClient:
         Returns:
             估算的token数
         """
-        # 统计中英文字符
-        chinese_chars = sum(1 for c in text if '\u4e00' <= c <= '\u9fff')
+        # 统计中英文字符：U+4000~U+9FFF的UTF-8首字节为0xE4~0xE9，且首字节不会出现在
+        # 后续字节中，对编码结果按字节计数即为汉字数，bytes.count在C层完成扫描
+        # （会多计入U+4000~U+4DFF的扩展A区汉字，对估算没有影响）
+        if text.isascii():
+            chinese_chars = 0
+        else:
+            encoded = text.encode("utf-8")
+            chinese_chars = sum(encoded.count(lead) for lead in _CJK_LEAD_BYTES)
         other_chars = len(text) - chinese_chars
 
         # 估算token数
@@ -422,6 +891,57 @@ class QwenClient:
 
         return max(tokens, 1)
 
+    @staticmethod
+    async def _run_tool(call: Dict[str, Any], tool_functions: Dict[str, Callable]) -> Any:
+        """
+        执行一个工具调用
+
+        Args:
+            call: 工具调用，包含name和arguments（JSON字符串或片段列表）
+            tool_functions: 工具名称到实际函数的映射
+
+        Returns:
+            工具返回值，失败时为包含error的字典
+        """
+        function_name = call["name"]
+        function_args_str = call["arguments"]
+        if isinstance(function_args_str, list):
+            function_args_str = "".join(function_args_str)
+
+        try:
+            # 解析参数
+            function_args = orjson.loads(function_args_str)
+
+            logger.debug("执行工具: %s, 参数: %s", function_name, function_args)
+
+            # 检查工具是否存在
+            if function_name not in tool_functions:
+                error_msg = f"工具 '{function_name}' 未找到"
+                logger.error(error_msg)
+                return {"error": error_msg}
+
+            # 执行工具函数
+            tool_function = tool_functions[function_name]
+
+            # 支持同步和异步函数，同步函数放到线程中执行，
+            # 不阻塞事件循环，同一轮的多个工具调用可以并发
+            if asyncio.iscoroutinefunction(tool_function):
+                tool_result = await tool_function(**function_args)
+            else:
+                tool_result = await asyncio.to_thread(tool_function, **function_args)
+
+            logger.info("工具 %s 执行成功", function_name)
+            return tool_result
+
+        except orjson.JSONDecodeError as e:
+            error_msg = f"解析工具参数失败: {str(e)}"
+            logger.error(error_msg)
+            return {"error": error_msg}
+        except Exception as e:
+            error_msg = f"执行工具 {function_name} 失败: {str(e)}"
+            logger.error(error_msg)
+            return {"error": error_msg}
+
     async def complete_with_tools(
         self,
         system_prompt: str,
@@ -437,6 +957,8 @@ class QwenClient:
         """
         执行带工具调用的补全请求（Function Calling）
 
+        每轮以流式调用，参数已完整的工具调用在模型继续输出时即开始执行
+
         Args:
             system_prompt: 系统提示词
             user_prompt: 用户提示词
@@ -476,120 +998,140 @@ class QwenClient:
             }]
         """
         model = model or self.default_model
-        start_time = time.time()
+        start_time = time.perf_counter()
         total_tokens = 0
+        # 当前轮次提前开始的工具调用；输出被截断、流式响应出错等情况下不再需要，
+        # 任何方式退出时都要结束
+        tasks: Dict[int, asyncio.Task] = {}
 
         try:
+            # 工具定义按键排序后固定下来，每轮请求的tools字节完全相同，
+            # 不同调用方构造字典的顺序不同时也能命中服务端前缀缓存
+            tools = orjson.loads(orjson.dumps(tools, option=orjson.OPT_SORT_KEYS))
+
             # 构建初始消息
             messages = [
-                {"role": "system", "content": system_prompt},
+                self._system_message(system_prompt),
                 {"role": "user", "content": user_prompt}
             ]
 
             logger.debug(
-                f"调用Qwen API with tools: model={model}, "
-                f"tools_count={len(tools)}, max_iterations={max_iterations}"
+                "调用Qwen API with tools: model=%s, tools_count=%d, max_iterations=%d",
+                model, len(tools), max_iterations
             )
 
             # 迭代处理工具调用
             for iteration in range(max_iterations):
-                # 准备请求参数
-                request_params: Dict[str, Any] = {
-                    "model": model,
-                    "messages": messages,
-                    "temperature": temperature,
-                    "max_tokens": max_tokens,
-                    "tools": tools,
-                    "tool_choice": "auto",  # 让模型自动决定是否调用工具
+                self._check_context_window(model, messages, max_tokens)
+
+                # 流式调用：工具调用按序号依次输出，后一个开始时前一个的参数已完整，
+                # 可以先开始执行，工具耗时与模型剩余输出重叠
+                stream = await self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    tools=tools,
+                    tool_choice="auto",  # 让模型自动决定是否调用工具
+                    stream=True,
+                    stream_options={"include_usage": True},
                     **kwargs
-                }
-
-                # 调用API
-                response: ChatCompletion = await self.client.chat.completions.create(**request_params)
-
-                # 累计token使用量
-                if response.usage:
-                    total_tokens += response.usage.total_tokens
-
-                # 获取响应消息
-                message = response.choices[0].message
-                finish_reason = response.choices[0].finish_reason
+                )
+
+                content_parts: List[str] = []
+                calls: Dict[int, Dict[str, Any]] = {}
+                tasks = {}
+                finish_reason: Optional[str] = None
+
+                async for chunk in stream:
+                    # 累计token使用量（include_usage时最后一个chunk携带）
+                    if chunk.usage:
+                        total_tokens += chunk.usage.total_tokens
+                        details = getattr(chunk.usage, "prompt_tokens_details", None)
+                        if details and details.cached_tokens:
+                            logger.debug("工具调用第%d轮命中上下文缓存: cached_tokens=%d", iteration + 1, details.cached_tokens)
+
+                    if not chunk.choices:
+                        continue
+                    choice = chunk.choices[0]
+                    delta = choice.delta
+
+                    if delta.content:
+                        content_parts.append(delta.content)
+
+                    for tc in delta.tool_calls or ():
+                        call = calls.get(tc.index)
+                        if call is None:
+                            # 新的工具调用开始，之前的工具调用参数均已完整
+                            for index, previous in calls.items():
+                                if index not in tasks:
+                                    tasks[index] = asyncio.create_task(
+                                        self._run_tool(previous, tool_functions)
+                                    )
+                            call = calls[tc.index] = {"id": "", "name": "", "arguments": []}
+                        if tc.id and not call["id"]:
+                            call["id"] = tc.id
+                        if tc.function:
+                            if tc.function.name and not call["name"]:
+                                call["name"] = tc.function.name
+                            if tc.function.arguments:
+                                call["arguments"].append(tc.function.arguments)
+
+                    if choice.finish_reason:
+                        finish_reason = choice.finish_reason
+
+                finish_reason = finish_reason or "stop"
+                content = "".join(content_parts)
+                ordered_calls = [calls[index] for index in sorted(calls)]
+                for call in ordered_calls:
+                    call["arguments"] = "".join(call["arguments"])
 
                 # 将助手的响应添加到消息历史
+                round_start = len(messages)
                 messages.append({
                     "role": "assistant",
-                    "content": message.content,
+                    "content": content or None,
                     "tool_calls": [
                         {
-                            "id": tc.id,
-                            "type": tc.type,
+                            "id": call["id"],
+                            "type": "function",
                             "function": {
-                                "name": tc.function.name,
-                                "arguments": tc.function.arguments
+                                "name": call["name"],
+                                "arguments": call["arguments"]
                             }
                         }
-                        for tc in (message.tool_calls or [])
-                    ] if message.tool_calls else None
+                        for call in ordered_calls
+                    ] if ordered_calls else None
                 })
 
                 # 检查是否需要调用工具
-                if finish_reason == "tool_calls" and message.tool_calls:
-                    logger.info(f"模型请求调用 {len(message.tool_calls)} 个工具")
-
-                    # 执行所有工具调用
-                    for tool_call in message.tool_calls:
-                        function_name = tool_call.function.name
-                        function_args_str = tool_call.function.arguments
-
-                        try:
-                            # 解析参数
-                            function_args = json.loads(function_args_str)
-
-                            logger.debug(
-                                f"执行工具: {function_name}, "
-                                f"参数: {function_args}"
+                if finish_reason == "tool_calls" and ordered_calls:
+                    logger.info("模型请求调用 %d 个工具", len(ordered_calls))
+
+                    # 执行尚未开始的工具调用，按原顺序收集结果
+                    for index in sorted(calls):
+                        if index not in tasks:
+                            tasks[index] = asyncio.create_task(
+                                self._run_tool(calls[index], tool_functions)
                             )
+                    tool_results = await asyncio.gather(*(tasks[index] for index in sorted(calls)))
 
-                            # 检查工具是否存在
-                            if function_name not in tool_functions:
-                                error_msg = f"工具 '{function_name}' 未找到"
-                                logger.error(error_msg)
-                                tool_result = {"error": error_msg}
-                            else:
-                                # 执行工具函数
-                                tool_function = tool_functions[function_name]
-
-                                # 支持同步和异步函数
-                                if asyncio.iscoroutinefunction(tool_function):
-                                    tool_result = await tool_function(**function_args)
-                                else:
-                                    tool_result = tool_function(**function_args)
-
-                                logger.info(f"工具 {function_name} 执行成功")
-
-                        except json.JSONDecodeError as e:
-                            error_msg = f"解析工具参数失败: {str(e)}"
-                            logger.error(error_msg)
-                            tool_result = {"error": error_msg}
-                        except Exception as e:
-                            error_msg = f"执行工具 {function_name} 失败: {str(e)}"
-                            logger.error(error_msg)
-                            tool_result = {"error": error_msg}
-
-                        # 将工具结果添加到消息历史
+                    # 将工具结果添加到消息历史
+                    for call, tool_result in zip(ordered_calls, tool_results):
                         messages.append({
                             "role": "tool",
-                            "tool_call_id": tool_call.id,
-                            "name": function_name,
-                            "content": json.dumps(tool_result, ensure_ascii=False)
+                            "tool_call_id": call["id"],
+                            "name": call["name"],
+                            "content": orjson.dumps(tool_result, option=orjson.OPT_NON_STR_KEYS).decode()
                         })
+                    self._compact_tool_history(messages, round_start)
 
                     # 继续下一轮迭代，让模型处理工具结果
                     continue
 
                 # 如果不需要调用工具，返回最终结果
                 else:
-                    response_time_ms = (time.time() - start_time) * 1000
+                    response_time_ms = (time.perf_counter() - start_time) * 1000
 
                     # 记录指标
                     metrics_collector.record_llm_call(
@@ -600,25 +1142,24 @@ class QwenClient:
                     )
 
                     logger.info(
-                        f"Qwen API with tools调用成功: model={model}, "
-                        f"tokens={total_tokens}, iterations={iteration + 1}, "
-                        f"time={response_time_ms:.2f}ms"
+                        "Qwen API with tools调用成功: model=%s, tokens=%d, iterations=%d, time=%.2fms",
+                        model, total_tokens, iteration + 1, response_time_ms
                     )
 
                     # 提取工具调用信息（如果有）
                     tool_calls_info = None
-                    if message.tool_calls:
+                    if ordered_calls:
                         tool_calls_info = [
                             {
-                                "id": tc.id,
-                                "name": tc.function.name,
-                                "arguments": json.loads(tc.function.arguments)
+                                "id": call["id"],
+                                "name": call["name"],
+                                "arguments": self._loads_tool_arguments(call["arguments"])
                             }
-                            for tc in message.tool_calls
+                            for call in ordered_calls
                         ]
 
                     return QwenResponse(
-                        content=message.content or "",
+                        content=content,
                         model=model,
                         tokens_used=total_tokens,
                         finish_reason=finish_reason,
@@ -627,8 +1168,8 @@ class QwenClient:
                     )
 
             # 达到最大迭代次数
-            logger.warning(f"达到最大迭代次数 {max_iterations}，停止工具调用")
-            response_time_ms = (time.time() - start_time) * 1000
+            logger.warning("达到最大迭代次数 %d，停止工具调用", max_iterations)
+            response_time_ms = (time.perf_counter() - start_time) * 1000
 
             metrics_collector.record_llm_call(
                 model=model,
@@ -646,7 +1187,7 @@ class QwenClient:
             )
 
         except Exception as e:
-            response_time_ms = (time.time() - start_time) * 1000
+            response_time_ms = (time.perf_counter() - start_time) * 1000
 
             # 记录失败指标
             metrics_collector.record_llm_call(
@@ -657,20 +1198,53 @@ class QwenClient:
             )
 
             # 处理不同类型的错误
-            error_message = str(e)
+            raise self._to_app_exception(e, max_tokens, "Qwen API with tools调用失败")
 
-            if "rate_limit" in error_message.lower() or "429" in error_message:
-                logger.warning(f"Qwen API速率限制: {error_message}")
-                raise LLMRateLimitException()
+        finally:
+            await self._cancel_tool_tasks(tasks)
 
-            elif "token" in error_message.lower() and "limit" in error_message.lower():
-                logger.error(f"Qwen API Token限制: {error_message}")
-                raise LLMTokenLimitException(requested=max_tokens, limit=max_tokens)
+    @staticmethod
+    def _loads_tool_arguments(arguments: str) -> Any:
+        """
+        解析工具调用参数
 
-            else:
-                logger.error(f"Qwen API with tools调用失败: {error_message}")
-                raise LLMAPIException(reason=error_message)
+        输出被截断时最后一个工具调用的参数不完整，此时保留原始文本
+
+        Args:
+            arguments: 参数JSON文本
+
+        Returns:
+            解析后的参数，无法解析时为原始文本
+        """
+        try:
+            return orjson.loads(arguments)
+        except orjson.JSONDecodeError:
+            return arguments
+
+    @staticmethod
+    async def _cancel_tool_tasks(tasks: Dict[int, asyncio.Task]) -> None:
+        """
+        取消未完成的工具调用并等待其结束
 
+        Args:
+            tasks: 工具调用序号到任务的映射
+        """
+        pending = [task for task in tasks.values() if not task.done()]
+        for task in pending:
+            task.cancel()
+        # 取回全部异常，避免"Task exception was never retrieved"
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
 
-# 创建全局Qwen客户端实例
-qwen_client = QwenClient()
+
+@lru_cache(maxsize=1)
+def get_qwen_client() -> QwenClient:
+    """
+    获取全局Qwen客户端（首次调用时创建）
+
+    应用启动时在lifespan中创建，HTTP连接池绑定到服务的事件循环，
+    而不是模块导入时尚未运行的事件循环
+
+    Returns:
+        Qwen客户端
+    """
+    return QwenClient()
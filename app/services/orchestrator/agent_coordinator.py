@@ -4,9 +4,12 @@ Agent协调器
 """
 
 import asyncio
-from typing import Dict, Any, List, Optional
+from types import MappingProxyType
+from typing import Dict, Any, List, Optional, Set, Tuple
 from enum import Enum
 
+from cachetools import LRUCache
+
 from app.core.logging import get_logger
 from app.core.exceptions import AgentNotFoundException, AgentExecutionException
 from app.services.agents.base import BaseAgent, AgentResult
@@ -37,6 +40,89 @@ class AgentType(str, Enum):
     OCR = "ocr"
 
 
+# 任务类型到Agent的映射
+_TASK_AGENT_MAP = MappingProxyType({
+    "grammar_check": AgentType.GRAMMAR_CHECKER,
+    "polish": AgentType.POLISH,
+    "structure_analysis": AgentType.STRUCTURE_ANALYZER,
+    "health_score": AgentType.HEALTH_SCORER,
+    "math_validation": AgentType.MATH_VALIDATOR,
+    "logic_tree": AgentType.LOGIC_TREE_BUILDER,
+    "chat": AgentType.CHAT,
+    "ocr": AgentType.OCR
+})
+
+# 从上下文传给Agent初始化的参数
+_CONTEXT_AGENT_KEYS = ("grade_level", "mode", "subject")
+
+# 各Agent的降级响应模板，所有请求共用，不可变；返回前由_fresh_fallback_value新建容器
+_FALLBACK_RESPONSES = MappingProxyType({
+    "grammar_checker": {
+        "errors": (),
+        "message": "语法检查服务暂时不可用，请稍后再试",
+        "suggestions": ("请检查网络连接", "稍后重新提交")
+    },
+    "polish": {
+        "versions": (),
+        "message": "文本润色服务暂时不可用，请稍后再试",
+        "suggestions": ("请检查网络连接", "稍后重新提交")
+    },
+    "structure_analyzer": {
+        "tree": {},
+        "relationships": (),
+        "message": "结构分析服务暂时不可用，请稍后再试"
+    },
+    "health_scorer": {
+        "dimensions": {},
+        "overall_score": 0,
+        "message": "健康度评分服务暂时不可用，请稍后再试"
+    },
+    "math_validator": {
+        "validation_results": (),
+        "message": "数学验证服务暂时不可用，请稍后再试"
+    },
+    "logic_tree_builder": {
+        "nodes": (),
+        "edges": (),
+        "message": "逻辑树构建服务暂时不可用，请稍后再试"
+    },
+    "debugger": {
+        "execution_trace": (),
+        "message": "调试服务暂时不可用，请稍后再试"
+    },
+    "chat": {
+        "content": "抱歉，我现在无法回答您的问题。请稍后再试。",
+        "message_type": "error"
+    },
+    "ocr": {
+        "text": "",
+        "regions": (),
+        "message": "OCR识别服务暂时不可用，请稍后再试"
+    }
+})
+
+# 未配置降级响应的Agent使用的建议
+_DEFAULT_FALLBACK_SUGGESTIONS = ("请稍后重试",)
+
+
+def _fresh_fallback_value(value: Any) -> Any:
+    """
+    按模板值新建降级响应字段，元组还原为列表，嵌套容器每次新建，
+    避免调用方修改结果时影响之后的降级响应
+
+    Args:
+        value: 模板中的值
+
+    Returns:
+        新建的值
+    """
+    if isinstance(value, tuple):
+        return [_fresh_fallback_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _fresh_fallback_value(item) for key, item in value.items()}
+    return value
+
+
 class AgentCoordinator:
     """
     Agent协调器
@@ -52,6 +138,10 @@ class AgentCoordinator:
     def __init__(self) -> None:
         """初始化Agent协调器"""
         self.agents: Dict[str, type[BaseAgent]] = {}
+        # Agent实例缓存：Agent执行时不修改自身状态，相同初始化参数的实例可以复用
+        self._agent_cache: LRUCache = LRUCache(maxsize=128)
+        # 本进程中正在执行的(会话, Agent)，重复请求无需访问Redis即可拒绝
+        self._running: Set[Tuple[str, str]] = set()
         self._register_agents()
         logger.info("Agent协调器已初始化")
 
@@ -74,9 +164,30 @@ class AgentCoordinator:
 
         logger.info(f"已注册 {len(self.agents)} 个Agent")
 
+    def register_agent(self, agent_type: str, agent_class: type[BaseAgent]) -> None:
+        """
+        注册或替换Agent
+
+        Args:
+            agent_type: Agent类型
+            agent_class: Agent类
+        """
+        self.agents[agent_type] = agent_class
+        self._agent_cache.clear()
+        logger.info(f"注册Agent: {agent_type}")
+
+    def clear_agent_cache(self) -> None:
+        """
+        丢弃缓存的Agent实例
+
+        Agent实例持有创建时的LLM客户端，客户端关闭后需要清空，
+        之后的请求重新创建Agent并使用新的客户端
+        """
+        self._agent_cache.clear()
+
     def get_agent(self, agent_type: str, **kwargs: Any) -> BaseAgent:
         """
-        获取Agent实例
+        获取Agent实例，相同类型和初始化参数复用已创建的实例
 
         Args:
             agent_type: Agent类型
@@ -92,7 +203,17 @@ class AgentCoordinator:
             raise AgentNotFoundException(agent_type)
 
         agent_class = self.agents[agent_type]
-        return agent_class(**kwargs)
+
+        key = (agent_type, tuple(sorted(kwargs.items())))
+        try:
+            agent = self._agent_cache.get(key)
+        except TypeError:
+            # 初始化参数不可哈希，不缓存
+            return agent_class(**kwargs)
+
+        if agent is None:
+            agent = self._agent_cache[key] = agent_class(**kwargs)
+        return agent
 
     async def execute_agent(
         self,
@@ -117,12 +238,26 @@ class AgentCoordinator:
         """
         agent_kwargs = agent_kwargs or {}
 
-        # 尝试获取执行锁
-        lock_acquired = await agent_lock_manager.acquire_lock(
-            session_id=session_id,
-            agent_name=agent_type,
-            request_id=request_id
-        )
+        # 不需要会话锁的Agent直接执行，同一会话的请求可以并发
+        agent_class = self.agents.get(agent_type)
+        if agent_class is not None and not agent_class.requires_session_lock:
+            return await self._run_agent(agent_type, session_id, agent_kwargs, input_kwargs)
+
+        # 尝试获取执行锁：先占用本进程的执行槽位，已被占用时直接拒绝；
+        # 再获取Redis锁，与其他进程互斥
+        slot = (session_id, agent_type)
+        lock_acquired = False
+        if slot not in self._running:
+            self._running.add(slot)
+            try:
+                lock_acquired = await agent_lock_manager.acquire_lock(
+                    session_id=session_id,
+                    agent_name=agent_type,
+                    request_id=request_id
+                )
+            finally:
+                if not lock_acquired:
+                    self._running.discard(slot)
 
         if not lock_acquired:
             logger.warning(f"Agent {agent_type} 正在执行中，跳过本次请求")
@@ -133,6 +268,39 @@ class AgentCoordinator:
                 metadata={"agent": agent_type, "locked": True}
             )
 
+        try:
+            return await self._run_agent(agent_type, session_id, agent_kwargs, input_kwargs)
+
+        finally:
+            # 释放锁，Redis锁释放后再让出本进程的执行槽位
+            try:
+                await agent_lock_manager.release_lock(
+                    session_id=session_id,
+                    agent_name=agent_type,
+                    request_id=request_id
+                )
+            finally:
+                self._running.discard(slot)
+
+    async def _run_agent(
+        self,
+        agent_type: str,
+        session_id: str,
+        agent_kwargs: Dict[str, Any],
+        input_kwargs: Dict[str, Any]
+    ) -> AgentResult:
+        """
+        创建并执行Agent，异常转换为失败结果
+
+        Args:
+            agent_type: Agent类型
+            session_id: 会话ID
+            agent_kwargs: Agent初始化参数
+            input_kwargs: Agent执行参数
+
+        Returns:
+            Agent执行结果
+        """
         try:
             # 创建Agent实例
             agent = self.get_agent(agent_type, **agent_kwargs)
@@ -157,14 +325,6 @@ class AgentCoordinator:
                 metadata={"agent": agent_type}
             )
 
-        finally:
-            # 释放锁
-            await agent_lock_manager.release_lock(
-                session_id=session_id,
-                agent_name=agent_type,
-                request_id=request_id
-            )
-
     async def execute_agent_chain(
         self,
         agents: List[tuple[str, Dict[str, Any]]],
@@ -173,7 +333,11 @@ class AgentCoordinator:
         initial_input: Dict[str, Any]
     ) -> Dict[str, Any]:
         """
-        串行执行多个Agent
+        按顺序执行多个Agent，后续Agent使用前序Agent的结果
+
+        按各Agent声明的consumes/produces判断依赖：依赖前序结果的阶段等待其完成，
+        相互独立的阶段并发执行。某个阶段失败时终止其后的阶段，
+        返回的结果与逐个串行执行相同
 
         Args:
             agents: Agent列表 [(agent_type, agent_kwargs), ...]
@@ -184,35 +348,102 @@ class AgentCoordinator:
         Returns:
             所有Agent的执行结果
         """
-        results = {}
-        current_input = initial_input.copy()
+        stage_classes = [self.agents.get(agent_type) for agent_type, _ in agents]
+        dependencies = [
+            [
+                i for i in range(j)
+                if self._depends_on(agents[i][0], stage_classes[i], agents[j][0], stage_classes[j])
+            ]
+            for j in range(len(agents))
+        ]
+        tasks: List[asyncio.Task] = []
 
-        for agent_type, agent_kwargs in agents:
-            logger.info(f"执行Agent链: {agent_type}")
+        async def run_stage(index: int) -> Optional[AgentResult]:
+            agent_type, agent_kwargs = agents[index]
 
-            # 执行Agent
-            result = await self.execute_agent(
-                agent_type=agent_type,
-                session_id=session_id,
-                request_id=f"{request_id}_{agent_type}",
-                agent_kwargs=agent_kwargs,
-                **current_input
-            )
+            # 等待依赖的阶段完成；shield避免本阶段被取消时连带取消依赖的阶段
+            upstream = [await asyncio.shield(tasks[i]) for i in dependencies[index]]
+            if any(result is None or not result.success for result in upstream):
+                return None
 
-            # 保存结果
-            results[agent_type] = result
+            # 依赖阶段的结果按链中顺序合并到输入
+            current_input = initial_input.copy()
+            for result in upstream:
+                if result.data:
+                    current_input.update(result.data)
+
+            logger.info(f"执行Agent链: {agent_type}")
+
+            # 执行Agent；异常在任务内转换为失败结果，不会以ExceptionGroup的形式抛给调用方
+            try:
+                result = await self.execute_agent(
+                    agent_type=agent_type,
+                    session_id=session_id,
+                    request_id=f"{request_id}_{agent_type}",
+                    agent_kwargs=agent_kwargs,
+                    **current_input
+                )
+            except Exception as e:
+                logger.error(f"Agent {agent_type} 执行异常: {str(e)}")
+                result = AgentResult.model_construct(
+                    success=False,
+                    data=None,
+                    error=str(e),
+                    metadata={"agent": agent_type}
+                )
 
             # 如果失败，终止链式执行
             if not result.success:
                 logger.warning(f"Agent链执行失败: {agent_type}, 终止后续执行")
-                break
+                for later in tasks[index + 1:]:
+                    later.cancel()
 
-            # 将当前结果作为下一个Agent的输入
-            if result.data:
-                current_input.update(result.data)
+            return result
+
+        async with asyncio.TaskGroup() as group:
+            for index in range(len(agents)):
+                tasks.append(group.create_task(run_stage(index)))
+
+        # 按链中顺序收集结果，到第一个失败的阶段为止
+        results = {}
+        for (agent_type, _), task in zip(agents, tasks):
+            if task.cancelled() or task.result() is None:
+                break
+            result = task.result()
+            results[agent_type] = result
+            if not result.success:
+                break
 
         return results
 
+    @staticmethod
+    def _depends_on(
+        upstream_type: str,
+        upstream_class: Optional[type[BaseAgent]],
+        downstream_type: str,
+        downstream_class: Optional[type[BaseAgent]]
+    ) -> bool:
+        """
+        判断Agent链中的后续阶段是否依赖前序阶段
+
+        Args:
+            upstream_type: 前序阶段的Agent类型
+            upstream_class: 前序阶段的Agent类，未注册为None
+            downstream_type: 后续阶段的Agent类型
+            downstream_class: 后续阶段的Agent类，未注册为None
+
+        Returns:
+            是否依赖
+        """
+        # 同一Agent共用会话锁，不能并发执行
+        if upstream_type == downstream_type:
+            return True
+        if upstream_class is None or downstream_class is None:
+            return True
+        if upstream_class.produces is None or downstream_class.consumes is None:
+            return True
+        return not upstream_class.produces.isdisjoint(downstream_class.consumes)
+
     async def execute_parallel_agents(
         self,
         agents: List[tuple[str, Dict[str, Any], Dict[str, Any]]],
@@ -232,37 +463,41 @@ class AgentCoordinator:
         """
         logger.info(f"并行执行 {len(agents)} 个Agent")
 
-        # 创建所有Agent的执行任务
-        tasks = []
-        agent_types = []
-
-        for agent_type, agent_kwargs, input_kwargs in agents:
-            task = self.execute_agent(
-                agent_type=agent_type,
-                session_id=session_id,
-                request_id=f"{request_id}_{agent_type}",
-                agent_kwargs=agent_kwargs,
-                **input_kwargs
-            )
-            tasks.append(task)
-            agent_types.append(agent_type)
-
-        # 并行执行所有任务
-        results_list = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # 组织结果
-        results = {}
-        for agent_type, result in zip(agent_types, results_list):
-            if isinstance(result, Exception):
-                logger.error(f"Agent {agent_type} 执行异常: {str(result)}")
-                results[agent_type] = AgentResult(
+        async def run_one(
+            agent_type: str,
+            agent_kwargs: Dict[str, Any],
+            input_kwargs: Dict[str, Any]
+        ) -> AgentResult:
+            # 异常在任务内转换为失败结果，不会取消TaskGroup中的其他Agent
+            try:
+                return await self.execute_agent(
+                    agent_type=agent_type,
+                    session_id=session_id,
+                    request_id=f"{request_id}_{agent_type}",
+                    agent_kwargs=agent_kwargs,
+                    **input_kwargs
+                )
+            except Exception as e:
+                logger.error(f"Agent {agent_type} 执行异常: {str(e)}")
+                return AgentResult.model_construct(
                     success=False,
                     data=None,
-                    error=str(result),
+                    error=str(e),
                     metadata={"agent": agent_type}
                 )
-            else:
-                results[agent_type] = result
+
+        # 并行执行所有Agent
+        async with asyncio.TaskGroup() as group:
+            tasks = [
+                group.create_task(run_one(agent_type, agent_kwargs, input_kwargs))
+                for agent_type, agent_kwargs, input_kwargs in agents
+            ]
+
+        # 组织结果
+        results = {
+            agent_type: task.result()
+            for (agent_type, _, _), task in zip(agents, tasks)
+        }
 
         logger.info(f"并行执行完成，成功: {sum(1 for r in results.values() if r.success)}/{len(agents)}")
 
@@ -289,30 +524,12 @@ class AgentCoordinator:
         Returns:
             Agent执行结果
         """
-        # 任务类型到Agent的映射
-        task_agent_map = {
-            "grammar_check": AgentType.GRAMMAR_CHECKER,
-            "polish": AgentType.POLISH,
-            "structure_analysis": AgentType.STRUCTURE_ANALYZER,
-            "health_score": AgentType.HEALTH_SCORER,
-            "math_validation": AgentType.MATH_VALIDATOR,
-            "logic_tree": AgentType.LOGIC_TREE_BUILDER,
-            "chat": AgentType.CHAT,
-            "ocr": AgentType.OCR
-        }
-
-        agent_type = task_agent_map.get(task_type)
+        agent_type = _TASK_AGENT_MAP.get(task_type)
         if not agent_type:
             raise AgentNotFoundException(task_type)
 
         # 准备Agent初始化参数
-        agent_kwargs = {}
-        if "grade_level" in context:
-            agent_kwargs["grade_level"] = context["grade_level"]
-        if "mode" in context:
-            agent_kwargs["mode"] = context["mode"]
-        if "subject" in context:
-            agent_kwargs["subject"] = context["subject"]
+        agent_kwargs = {key: context[key] for key in _CONTEXT_AGENT_KEYS if key in context}
 
         # 执行Agent
         return await self.execute_agent(
@@ -451,56 +668,14 @@ class AgentCoordinator:
         Returns:
             降级响应数据
         """
-        # 根据不同的Agent类型返回不同的降级响应
-        fallback_responses = {
-            "grammar_checker": {
-                "errors": [],
-                "message": "语法检查服务暂时不可用，请稍后再试",
-                "suggestions": ["请检查网络连接", "稍后重新提交"]
-            },
-            "polish": {
-                "versions": [],
-                "message": "文本润色服务暂时不可用，请稍后再试",
-                "suggestions": ["请检查网络连接", "稍后重新提交"]
-            },
-            "structure_analyzer": {
-                "tree": {},
-                "relationships": [],
-                "message": "结构分析服务暂时不可用，请稍后再试"
-            },
-            "health_scorer": {
-                "dimensions": {},
-                "overall_score": 0,
-                "message": "健康度评分服务暂时不可用，请稍后再试"
-            },
-            "math_validator": {
-                "validation_results": [],
-                "message": "数学验证服务暂时不可用，请稍后再试"
-            },
-            "logic_tree_builder": {
-                "nodes": [],
-                "edges": [],
-                "message": "逻辑树构建服务暂时不可用，请稍后再试"
-            },
-            "debugger": {
-                "execution_trace": [],
-                "message": "调试服务暂时不可用，请稍后再试"
-            },
-            "chat": {
-                "content": "抱歉，我现在无法回答您的问题。请稍后再试。",
-                "message_type": "error"
-            },
-            "ocr": {
-                "text": "",
-                "regions": [],
-                "message": "OCR识别服务暂时不可用，请稍后再试"
-            }
-        }
+        template = _FALLBACK_RESPONSES.get(agent_type)
+        if template is not None:
+            return _fresh_fallback_value(template)
 
-        return fallback_responses.get(agent_type, {
+        return {
             "message": f"服务暂时不可用: {error}",
-            "suggestions": ["请稍后重试"]
-        })
+            "suggestions": list(_DEFAULT_FALLBACK_SUGGESTIONS)
+        }
 
     def get_agent_stats(self, agent_type: str) -> Dict[str, Any]:
         """
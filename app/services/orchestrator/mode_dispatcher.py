@@ -4,14 +4,63 @@
 """
 
 import re
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Set
 
 from app.core.logging import get_logger
 from app.core.exceptions import InvalidModeException
-from app.services.llm.qwen_client import qwen_client
+from app.services.llm.qwen_client import get_qwen_client
 
 logger = get_logger(__name__)
 
+# 数学分数达到该值即判定为理科
+_SCIENCE_THRESHOLD = 3
+
+# 数学特征：每类特征出现即计1分。各类的首字符互不相同，同一位置至多匹配一类，
+# 用零宽前瞻在每个位置尝试，一次扫描即可得到出现过的全部类别
+_MATH_PATTERNS = (
+    ("operator", r'[+\-*/=<>≤≥≠]'),  # 数学运算符
+    ("variable", r'\d+[xy]'),  # 变量表达式
+    ("power", r'[xy]\^?\d+'),  # 幂次表达式
+    ("latex", r'\\frac|\\sqrt|\\sum|\\int'),  # LaTeX公式
+    ("symbol", r'[∫∑∏√∞]'),  # 数学符号
+    ("function", r'sin|cos|tan|log|ln'),  # 数学函数
+)
+_MATH_RE = re.compile(
+    "(?=" + "|".join(f"(?P<{name}>{pattern})" for name, pattern in _MATH_PATTERNS) + ")"
+)
+
+# 理科关键词：每个出现过的关键词计0.5分
+_SCIENCE_KEYWORDS = (
+    '已知', '求', '解方程', '证明', '计算',
+    '设', '假设', '因为', '所以', '得',
+    '方程', '不等式', '函数', '导数', '积分'
+)
+
+try:
+    # pyahocorasick在C层构建Aho-Corasick自动机，单次线性扫描匹配全部关键词
+    import ahocorasick
+
+    _SCIENCE_KEYWORD_AUTOMATON = ahocorasick.Automaton()
+    for _keyword in _SCIENCE_KEYWORDS:
+        _SCIENCE_KEYWORD_AUTOMATON.add_word(_keyword, _keyword)
+    _SCIENCE_KEYWORD_AUTOMATON.make_automaton()
+
+    def _find_science_keywords(content: str) -> Set[str]:
+        return {keyword for _, keyword in _SCIENCE_KEYWORD_AUTOMATON.iter(content)}
+except ImportError:
+    _SCIENCE_KEYWORD_RE = re.compile("(?=(" + "|".join(map(re.escape, _SCIENCE_KEYWORDS)) + "))")
+
+    def _find_science_keywords(content: str) -> Set[str]:
+        return {match.group(1) for match in _SCIENCE_KEYWORD_RE.finditer(content)}
+
+# 步骤编号
+_STEP_RE = re.compile(r'(步骤|解|解答)[:：]\s*\d+')
+
+# 文科特征：每处匹配计0.1分。标点逐个用str.count计数，
+# 每个字符在C层单独快速扫描一遍，比正则字符类逐字符匹配快
+_LITERATURE_PUNCTUATION = '，。！？；："（）《》'  # 中文标点
+_PARAGRAPH_RE = re.compile(r'第[一二三四五六七八九十]+段')  # 段落标记
+
 
 class ModeDispatcher:
     """
@@ -102,52 +151,35 @@ class ModeDispatcher:
             # 内容过短，默认为文科模式
             return "literature"
 
+        # 规则1~3依次累计数学分数，达到阈值即可判定为理科，其余规则不再扫描内容
         # 规则1: 检查数学符号和公式
-        math_patterns = [
-            r'[+\-*/=<>≤≥≠]',  # 数学运算符
-            r'\d+[xy]',  # 变量表达式
-            r'[xy]\^?\d+',  # 幂次表达式
-            r'\\frac|\\sqrt|\\sum|\\int',  # LaTeX公式
-            r'[∫∑∏√∞]',  # 数学符号
-            r'sin|cos|tan|log|ln',  # 数学函数
-        ]
-
-        math_score = 0
-        for pattern in math_patterns:
-            if re.search(pattern, content):
-                math_score += 1
+        math_groups = set()
+        for match in _MATH_RE.finditer(content):
+            math_groups.add(match.lastgroup)
+            if len(math_groups) >= _SCIENCE_THRESHOLD:
+                break
+        math_score = len(math_groups)
 
         # 规则2: 检查理科关键词
-        science_keywords = [
-            '已知', '求', '解方程', '证明', '计算',
-            '设', '假设', '因为', '所以', '得',
-            '方程', '不等式', '函数', '导数', '积分'
-        ]
-
-        for keyword in science_keywords:
-            if keyword in content:
-                math_score += 0.5
+        if math_score < _SCIENCE_THRESHOLD:
+            math_score += len(_find_science_keywords(content)) * 0.5
 
         # 规则3: 检查步骤编号
-        if re.search(r'(步骤|解|解答)[:：]\s*\d+', content):
+        if math_score < _SCIENCE_THRESHOLD and _STEP_RE.search(content):
             math_score += 1
 
-        # 规则4: 检查是否有明显的文科特征
-        literature_patterns = [
-            r'[，。！？；：""''（）《》]',  # 中文标点
-            r'第[一二三四五六七八九十]+段',  # 段落标记
-        ]
+        if math_score >= _SCIENCE_THRESHOLD:
+            logger.info(f"检测为理科模式 (数学分数: {math_score})")
+            return "science"
 
-        literature_score = 0
-        for pattern in literature_patterns:
-            matches = re.findall(pattern, content)
-            literature_score += len(matches) * 0.1
+        # 规则4: 检查是否有明显的文科特征
+        literature_count = sum(map(content.count, _LITERATURE_PUNCTUATION))
+        if "第" in content:
+            literature_count += len(_PARAGRAPH_RE.findall(content))
+        literature_score = literature_count * 0.1
 
         # 判断模式
-        if math_score >= 3:
-            logger.info(f"检测为理科模式 (数学分数: {math_score}, 文科分数: {literature_score})")
-            return "science"
-        elif literature_score > math_score:
+        if literature_score > math_score:
             logger.info(f"检测为文科模式 (数学分数: {math_score}, 文科分数: {literature_score})")
             return "literature"
         else:
@@ -198,7 +230,7 @@ class ModeDispatcher:
 """
 
         try:
-            response = await qwen_client.complete(
+            response = await get_qwen_client().complete(
                 system_prompt=system_prompt,
                 user_prompt=user_prompt,
                 temperature=0.1,
@@ -0,0 +1,9 @@
+"""
+测试公共配置
+导入应用模块前设置必需的环境变量，LLM和Redis在各测试中替换为假对象
+"""
+
+import os
+
+os.environ.setdefault("QWEN_API_KEY", "sk-test")
+os.environ.setdefault("LOG_FILE", "")
@@ -0,0 +1,43 @@
+"""
+Agent本地缓存测试
+"""
+
+import pytest
+
+from app.services.agents import base
+from app.services.agents.literature.health_scorer import HealthScorerAgent
+
+
+class _FakeAnalysisCache:
+    """替代Redis分析缓存，只记录写入"""
+
+    def __init__(self) -> None:
+        self.saved = {}
+
+    async def get_result(self, analysis_type, content):
+        return None
+
+    async def set_result(self, analysis_type, content, result, ttl):
+        self.saved[content] = result
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setattr(base, "analysis_cache", _FakeAnalysisCache())
+    base.BaseAgent._L1.clear()
+    yield HealthScorerAgent()
+    base.BaseAgent._L1.clear()
+
+
+@pytest.mark.asyncio
+async def test_local_cache_hits_are_independent_copies(agent) -> None:
+    result = {"overall_score": 0.8, "dimensions": {"grammar": {"score": 0.9}}, "strengths": ["a"]}
+    await agent.save_to_cache("key", result)
+
+    result["strengths"].append("changed")
+    first = await agent.get_from_cache("key")
+    first["dimensions"]["grammar"]["score"] = 0
+    second = await agent.get_from_cache("key")
+
+    assert second == {"overall_score": 0.8, "dimensions": {"grammar": {"score": 0.9}}, "strengths": ["a"]}
+    assert second is not first
@@ -0,0 +1,332 @@
+"""
+Agent协调器测试
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.orchestrator import agent_coordinator as coordinator_module
+from app.services.agents.base import AgentResult
+from app.services.llm.qwen_client import get_qwen_client
+from app.services.orchestrator.agent_coordinator import AgentCoordinator
+
+
+@pytest.fixture
+def coordinator():
+    return AgentCoordinator()
+
+
+def test_fallback_responses_do_not_share_nested_values(coordinator) -> None:
+    first = coordinator._get_fallback_response("structure_analyzer", "boom")
+    first["tree"]["root"] = "changed"
+    first["relationships"].append("changed")
+
+    second = coordinator._get_fallback_response("structure_analyzer", "boom")
+
+    assert second["tree"] == {}
+    assert second["relationships"] == []
+    assert coordinator_module._FALLBACK_RESPONSES["structure_analyzer"]["tree"] == {}
+
+
+def test_fallback_responses_use_lists(coordinator) -> None:
+    grammar = coordinator._get_fallback_response("grammar_checker", "boom")
+    unknown = coordinator._get_fallback_response("unknown", "boom")
+
+    assert grammar["errors"] == []
+    assert grammar["suggestions"] == ["请检查网络连接", "稍后重新提交"]
+    assert unknown["suggestions"] == ["请稍后重试"]
+
+
+@pytest.mark.asyncio
+async def test_parallel_agent_failure_becomes_failed_result(coordinator, monkeypatch) -> None:
+    async def execute_agent(agent_type, session_id, request_id, agent_kwargs, **input_kwargs):
+        if agent_type == "polish":
+            raise RuntimeError("boom")
+        return AgentResult.model_construct(success=True, data={"ok": True}, error=None, metadata={})
+
+    monkeypatch.setattr(coordinator, "execute_agent", execute_agent)
+
+    results = await coordinator.execute_parallel_agents(
+        [("grammar_checker", {}, {}), ("polish", {}, {})],
+        session_id="s1",
+        request_id="r1"
+    )
+
+    assert results["grammar_checker"].success
+    assert not results["polish"].success
+    assert results["polish"].error == "boom"
+    assert results["polish"].metadata == {"agent": "polish"}
+
+
+def _stage(consumes, produces):
+    """只声明输入输出字段的Agent类，链式执行的依赖据此判断"""
+    return type("Stage", (), {"consumes": frozenset(consumes), "produces": frozenset(produces)})
+
+
+class _FakeChainRunner:
+    """替代execute_agent，按阶段配置返回结果并记录执行顺序"""
+
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+        self.events = []
+        self.inputs = {}
+        self.gates = {agent_type: asyncio.Event() for agent_type in outcomes}
+        self.cancelled = []
+
+    async def __call__(self, agent_type, session_id, request_id, agent_kwargs, **input_kwargs):
+        self.events.append(("start", agent_type))
+        self.inputs[agent_type] = input_kwargs
+        try:
+            await self.gates[agent_type].wait()
+        except asyncio.CancelledError:
+            self.cancelled.append(agent_type)
+            raise
+        self.events.append(("end", agent_type))
+        success, data = self.outcomes[agent_type]
+        return AgentResult.model_construct(
+            success=success, data=data, error=None if success else "failed", metadata={}
+        )
+
+
+@pytest.fixture
+def chain(coordinator, monkeypatch):
+    coordinator.agents.update({
+        "producer": _stage({"text"}, {"outline"}),
+        "consumer": _stage({"outline"}, {"review"}),
+        "independent": _stage({"text"}, {"score"}),
+    })
+
+    def install(outcomes):
+        runner = _FakeChainRunner(outcomes)
+        monkeypatch.setattr(coordinator, "execute_agent", runner)
+        return runner
+
+    return install
+
+
+async def _release_when_started(runner, *agent_types):
+    """等待指定阶段全部开始后依次放行"""
+    while not all(("start", t) in runner.events for t in agent_types):
+        await asyncio.sleep(0)
+    for agent_type in agent_types:
+        runner.gates[agent_type].set()
+
+
+@pytest.mark.asyncio
+async def test_chain_runs_independent_stages_concurrently(coordinator, chain) -> None:
+    runner = chain({
+        "producer": (True, {"outline": "o"}),
+        "independent": (True, {"score": 1}),
+        "consumer": (True, {"review": "r"}),
+    })
+
+    chain_task = asyncio.create_task(coordinator.execute_agent_chain(
+        [("producer", {}), ("independent", {}), ("consumer", {})],
+        session_id="s1", request_id="r1", initial_input={"text": "t"}
+    ))
+    # producer和independent互不依赖，都开始后才放行
+    await _release_when_started(runner, "producer", "independent")
+    await _release_when_started(runner, "consumer")
+    results = await asyncio.wait_for(chain_task, timeout=1)
+
+    assert list(results) == ["producer", "independent", "consumer"]
+    assert runner.events.index(("start", "consumer")) > runner.events.index(("end", "producer"))
+    assert runner.inputs["consumer"] == {"text": "t", "outline": "o"}
+    assert runner.inputs["independent"] == {"text": "t"}
+
+
+@pytest.mark.asyncio
+async def test_chain_failure_cancels_later_stages(coordinator, chain) -> None:
+    runner = chain({
+        "producer": (False, None),
+        "independent": (True, {"score": 1}),
+        "consumer": (True, {"review": "r"}),
+    })
+
+    chain_task = asyncio.create_task(coordinator.execute_agent_chain(
+        [("producer", {}), ("independent", {}), ("consumer", {})],
+        session_id="s1", request_id="r1", initial_input={"text": "t"}
+    ))
+    await _release_when_started(runner, "producer")
+    results = await asyncio.wait_for(chain_task, timeout=1)
+
+    assert list(results) == ["producer"]
+    assert not results["producer"].success
+    # 已开始的独立阶段被取消，依赖失败阶段的阶段不会开始
+    assert runner.cancelled == ["independent"]
+    assert ("start", "consumer") not in runner.events
+
+
+@pytest.mark.asyncio
+async def test_chain_keeps_earlier_results_when_later_stage_fails(coordinator, chain) -> None:
+    runner = chain({
+        "independent": (True, {"score": 1}),
+        "producer": (False, None),
+        "consumer": (True, {"review": "r"}),
+    })
+
+    chain_task = asyncio.create_task(coordinator.execute_agent_chain(
+        [("independent", {}), ("producer", {}), ("consumer", {})],
+        session_id="s1", request_id="r1", initial_input={"text": "t"}
+    ))
+    await _release_when_started(runner, "producer")
+    await _release_when_started(runner, "independent")
+    results = await asyncio.wait_for(chain_task, timeout=1)
+
+    assert list(results) == ["independent", "producer"]
+    assert results["independent"].success
+    assert runner.cancelled == []
+    assert ("start", "consumer") not in runner.events
+
+
+class _FakeLockManager:
+    """替代Redis会话锁，记录调用并可模拟锁被其他进程持有"""
+
+    def __init__(self) -> None:
+        self.acquired = []
+        self.released = []
+        self.held_elsewhere = set()
+
+    async def acquire_lock(self, session_id, agent_name, request_id):
+        self.acquired.append((session_id, agent_name))
+        return (session_id, agent_name) not in self.held_elsewhere
+
+    async def release_lock(self, session_id, agent_name, request_id):
+        self.released.append((session_id, agent_name))
+        return True
+
+
+class _GatedAgent:
+    """放行前一直处于执行中的Agent"""
+
+    def __init__(self) -> None:
+        self.gate = asyncio.Event()
+        self.runs = 0
+
+    async def run(self, **kwargs):
+        self.runs += 1
+        await self.gate.wait()
+        return AgentResult.model_construct(success=True, data={}, error=None, metadata={})
+
+
+@pytest.fixture
+def locked(coordinator, monkeypatch):
+    locks = _FakeLockManager()
+    agent = _GatedAgent()
+    monkeypatch.setattr(coordinator_module, "agent_lock_manager", locks)
+    monkeypatch.setattr(coordinator, "get_agent", lambda agent_type, **kwargs: agent)
+    return locks, agent
+
+
+async def _execute(coordinator, session_id="s1", agent_type="health_scorer"):
+    return await coordinator.execute_agent(
+        agent_type=agent_type, session_id=session_id, request_id="r", agent_kwargs={}
+    )
+
+
+@pytest.mark.asyncio
+async def test_duplicate_request_is_rejected_without_redis(coordinator, locked) -> None:
+    locks, agent = locked
+
+    first = asyncio.create_task(_execute(coordinator))
+    while agent.runs == 0:
+        await asyncio.sleep(0)
+    duplicate = await _execute(coordinator)
+
+    assert not duplicate.success
+    assert duplicate.metadata["locked"] is True
+    assert locks.acquired == [("s1", "health_scorer")]
+
+    agent.gate.set()
+    assert (await first).success
+    assert locks.released == [("s1", "health_scorer")]
+    assert not coordinator._running
+
+
+@pytest.mark.asyncio
+async def test_slot_is_reusable_after_completion(coordinator, locked) -> None:
+    locks, agent = locked
+    agent.gate.set()
+
+    assert (await _execute(coordinator)).success
+    assert (await _execute(coordinator)).success
+    assert agent.runs == 2
+    assert len(locks.acquired) == 2
+
+
+@pytest.mark.asyncio
+async def test_slot_is_freed_when_redis_lock_is_held_elsewhere(coordinator, locked) -> None:
+    locks, agent = locked
+    locks.held_elsewhere.add(("s1", "health_scorer"))
+
+    result = await _execute(coordinator)
+
+    assert not result.success
+    assert agent.runs == 0
+    assert locks.released == []
+    assert not coordinator._running
+
+
+@pytest.mark.asyncio
+async def test_slots_are_per_session(coordinator, locked) -> None:
+    locks, agent = locked
+
+    tasks = [asyncio.create_task(_execute(coordinator, session_id=s)) for s in ("s1", "s2")]
+    while agent.runs < 2:
+        await asyncio.sleep(0)
+    agent.gate.set()
+
+    assert all(r.success for r in await asyncio.gather(*tasks))
+
+
+@pytest.mark.asyncio
+async def test_lock_free_agents_skip_slot_and_redis(coordinator, locked) -> None:
+    locks, agent = locked
+
+    tasks = [asyncio.create_task(_execute(coordinator, agent_type="chat")) for _ in range(2)]
+    while agent.runs < 2:
+        await asyncio.sleep(0)
+    agent.gate.set()
+
+    assert all(r.success for r in await asyncio.gather(*tasks))
+    assert locks.acquired == []
+    assert not coordinator._running
+
+
+def test_clear_agent_cache_creates_agents_with_new_client(coordinator) -> None:
+    first = coordinator.get_agent("health_scorer")
+    assert coordinator.get_agent("health_scorer") is first
+
+    get_qwen_client.cache_clear()
+    coordinator.clear_agent_cache()
+    second = coordinator.get_agent("health_scorer")
+
+    assert second is not first
+    assert second.llm is not first.llm
+
+
+@pytest.mark.asyncio
+async def test_chain_stage_exception_becomes_failed_result(coordinator, chain, monkeypatch) -> None:
+    runner = chain({
+        "producer": (True, {"outline": "o"}),
+        "independent": (True, {"score": 1}),
+        "consumer": (True, {"review": "r"}),
+    })
+
+    async def execute_agent(agent_type, **kwargs):
+        if agent_type == "producer":
+            raise RuntimeError("redis down")
+        return await runner(agent_type, **kwargs)
+
+    monkeypatch.setattr(coordinator, "execute_agent", execute_agent)
+
+    results = await asyncio.wait_for(coordinator.execute_agent_chain(
+        [("producer", {}), ("independent", {}), ("consumer", {})],
+        session_id="s1", request_id="r1", initial_input={"text": "t"}
+    ), timeout=1)
+
+    assert list(results) == ["producer"]
+    assert not results["producer"].success
+    assert results["producer"].error == "redis down"
+    assert ("start", "consumer") not in runner.events
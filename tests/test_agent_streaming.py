@@ -0,0 +1,104 @@
+"""
+Agent流式调用与增量结果测试
+"""
+
+import pytest
+
+from app.services.agents import base
+from app.services.agents.science.math_validator import MathValidatorAgent
+
+_RESPONSE = (
+    '```json\n{"validation_results": ['
+    '{"step_number": 1, "is_valid": true, "symbolic_form": "x = 3"}, '
+    '{"step_number": 2, "is_valid": false, "errors": [{"type": "计算错误", "message": "3+2≠6"}]}'
+    '], "overall_assessment": {"is_correct": false, "completion_rate": 0.5}}\n```'
+)
+
+
+class _FakeStreamingLLM:
+    """按固定片段流式返回响应的LLM"""
+
+    def __init__(self, response: str, chunk_size: int) -> None:
+        self.chunks = [response[i:i + chunk_size] for i in range(0, len(response), chunk_size)]
+        self.sent = 0
+
+    async def stream_complete(self, **kwargs):
+        for chunk in self.chunks:
+            self.sent += 1
+            yield chunk
+
+    def estimate_tokens(self, text: str) -> int:
+        return len(text)
+
+
+class _FakeAnalysisCache:
+    async def get_result(self, analysis_type, content):
+        return None
+
+    async def set_result(self, analysis_type, content, result, ttl):
+        pass
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setattr(base, "analysis_cache", _FakeAnalysisCache())
+    base.BaseAgent._L1.clear()
+    yield MathValidatorAgent()
+    base.BaseAgent._L1.clear()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("chunk_size", [1, 7, 64])
+async def test_streaming_emits_items_before_response_ends(agent, chunk_size) -> None:
+    llm = _FakeStreamingLLM(_RESPONSE, chunk_size)
+    agent.llm = llm
+    received = []
+
+    async def on_partial(path, value):
+        received.append((path, value, llm.sent))
+
+    response = await agent.execute_llm_streaming("prompt", on_partial)
+
+    assert response.content == _RESPONSE
+    assert [(path, value) for path, value, _ in received] == [
+        ("validation_results.item", {"step_number": 1, "is_valid": True, "symbolic_form": "x = 3"}),
+        ("validation_results.item", {
+            "step_number": 2,
+            "is_valid": False,
+            "errors": [{"type": "计算错误", "message": "3+2≠6"}]
+        }),
+    ]
+    # 第一个步骤在响应结束前就已回调
+    assert received[0][2] < len(llm.chunks)
+
+
+@pytest.mark.asyncio
+async def test_run_with_partial_callback_returns_full_result(agent) -> None:
+    agent.llm = _FakeStreamingLLM(_RESPONSE, 5)
+    received = []
+
+    async def on_partial(path, value):
+        received.append(value["step_number"])
+
+    result = await agent.run(
+        partial_callback=on_partial,
+        problem_statement="x + 2 = 5，求x",
+        steps=[{"content": "x = 3", "formula": "x = 3"}, {"content": "x = 4", "formula": "x = 4"}]
+    )
+
+    assert result.success
+    assert received == [1, 2]
+    assert [v["is_valid"] for v in result.data["validation_results"]] == [True, False]
+    assert result.data["overall_assessment"]["completion_rate"] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_failing_partial_callback_does_not_abort_stream(agent) -> None:
+    agent.llm = _FakeStreamingLLM(_RESPONSE, 3)
+
+    async def on_partial(path, value):
+        raise RuntimeError("client gone")
+
+    response = await agent.execute_llm_streaming("prompt", on_partial)
+
+    assert response.content == _RESPONSE
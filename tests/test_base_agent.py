@@ -0,0 +1,41 @@
+"""
+BaseAgent输入检查与响应解析测试
+"""
+
+import pytest
+
+from app.services.agents.base import BaseAgent
+from app.services.agents.literature.health_scorer import HealthScorerAgent
+
+
+@pytest.mark.parametrize("content", ["好好好", "Hello", "aaaaaaaaaa", "The quick brown fox jumps over the lazy dog. " * 40])
+def test_reject_low_entropy_accepts_normal_content(content: str) -> None:
+    BaseAgent.reject_low_entropy(content)
+
+
+@pytest.mark.parametrize("content", ["好" * 200, "ab" * 100, "abcd" * 1000])
+def test_reject_low_entropy_rejects_repeated_characters(content: str) -> None:
+    with pytest.raises(ValueError):
+        BaseAgent.reject_low_entropy(content)
+
+
+def test_validate_inputs_uses_overridable_entropy_check() -> None:
+    class LenientScorer(HealthScorerAgent):
+        @staticmethod
+        def reject_low_entropy(content: str) -> None:
+            pass
+
+    LenientScorer().validate_inputs(content="好" * 200)
+    with pytest.raises(ValueError):
+        HealthScorerAgent().validate_inputs(content="好" * 200)
+
+
+@pytest.mark.parametrize("text", [
+    '以下是结果[注意：仅供参考]\n```json\n{"score": 1, "items": [2]}\n```',
+    '说明{见下}\n```\n{"score": 1, "items": [2]}\n```\n以上',
+    '```json\n{"score": 1, "items": [2]}',
+    '结果如下：{"score": 1, "items": [2]} 完毕',
+    '{"score": 1, "items": [2]}',
+])
+def test_extract_json_prefers_fenced_block(text: str) -> None:
+    assert BaseAgent._extract_json(text) == {"score": 1, "items": [2]}
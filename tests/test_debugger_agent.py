@@ -0,0 +1,41 @@
+"""
+调试Agent测试
+"""
+
+import orjson
+
+from app.services.agents.science.debugger_agent import DebuggerAgent
+
+_TRACE = [
+    {
+        "step_number": 1,
+        "operation": "移项",
+        "variables_after": {"x": {"value": "unknown"}, "y": {"value": "5"}}
+    },
+    {
+        "step_number": 2,
+        "operation": "求解",
+        "variables_after": {"x": {"value": "2"}, "z": "1"}
+    },
+]
+
+
+def test_parse_response_returns_only_step_trace() -> None:
+    result = DebuggerAgent().parse_response(orjson.dumps({"execution_trace": _TRACE}).decode())
+
+    assert result["execution_trace"] == _TRACE
+    assert "variable_timeline" not in result
+
+
+def test_variable_timeline_groups_values_by_variable() -> None:
+    timeline = DebuggerAgent.build_variable_timeline(_TRACE)
+
+    assert timeline == {
+        "step_numbers": [1, 2],
+        "operations": ["移项", "求解"],
+        "variables": {
+            "x": ["unknown", "2"],
+            "y": ["5", None],
+            "z": [None, "1"]
+        }
+    }
@@ -0,0 +1,98 @@
+"""
+嵌入请求合并测试
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.llm.qwen_client import EmbeddingBatcher
+
+
+class _FakeClient:
+    """记录每次批量调用的嵌入客户端，向量为[文本长度, 批次序号]"""
+
+    def __init__(self, error: Exception = None) -> None:
+        self.calls = []
+        self.error = error
+
+    async def create_embeddings(self, texts, model):
+        self.calls.append((model, list(texts)))
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        return [[float(len(text)), float(len(self.calls))] for text in texts]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_call() -> None:
+    client = _FakeClient()
+    batcher = EmbeddingBatcher(client, window_seconds=0.01, max_batch=10)
+
+    results = await asyncio.gather(
+        batcher.submit("a", "m"),
+        batcher.submit("bb", "m"),
+        batcher.submit("ccc", "m")
+    )
+
+    assert client.calls == [("m", ["a", "bb", "ccc"])]
+    assert results == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_sent_without_waiting_for_window() -> None:
+    client = _FakeClient()
+    batcher = EmbeddingBatcher(client, window_seconds=60, max_batch=2)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(batcher.submit("a", "m"), batcher.submit("bb", "m")),
+        timeout=1
+    )
+
+    assert client.calls == [("m", ["a", "bb"])]
+    assert results == [[1.0, 1.0], [2.0, 1.0]]
+    assert not batcher._timers
+
+
+@pytest.mark.asyncio
+async def test_models_are_batched_separately() -> None:
+    client = _FakeClient()
+    batcher = EmbeddingBatcher(client, window_seconds=0.01, max_batch=10)
+
+    await asyncio.gather(
+        batcher.submit("a", "m1"),
+        batcher.submit("b", "m2"),
+        batcher.submit("c", "m1")
+    )
+
+    assert sorted(client.calls) == [("m1", ["a", "c"]), ("m2", ["b"])]
+
+
+@pytest.mark.asyncio
+async def test_batch_error_is_raised_to_every_caller() -> None:
+    client = _FakeClient(error=RuntimeError("api down"))
+    batcher = EmbeddingBatcher(client, window_seconds=0.01, max_batch=10)
+
+    results = await asyncio.gather(
+        batcher.submit("a", "m"),
+        batcher.submit("b", "m"),
+        return_exceptions=True
+    )
+
+    assert [str(r) for r in results] == ["api down", "api down"]
+    assert len(client.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_affect_batch() -> None:
+    client = _FakeClient()
+    batcher = EmbeddingBatcher(client, window_seconds=0.01, max_batch=10)
+
+    cancelled = asyncio.create_task(batcher.submit("a", "m"))
+    kept = asyncio.create_task(batcher.submit("bb", "m"))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+
+    assert await kept == [2.0, 1.0]
+    assert cancelled.cancelled()
+    assert client.calls == [("m", ["a", "bb"])]
@@ -0,0 +1,70 @@
+"""
+增量JSON解析测试
+"""
+
+import pytest
+
+from app.services.llm.json_stream import PartialJSONParser
+
+_DOCUMENT = (
+    '好的，结果如下：\n```json\n'
+    '{"overall_score": 85.5, "grade": "良好", '
+    '"dimensions": {"grammar": {"score": 90, "issues": ["标点"]}, "logic": {"score": 80}}, '
+    '"versions": [{"text": "第一版，含\\"引号\\"和{括号}"}, {"text": "第二版"}], '
+    '"empty": []}\n```\n补充说明'
+)
+
+_EXPECTED = [
+    ("overall_score", 85.5),
+    ("grade", "良好"),
+    ("dimensions", {"grammar": {"score": 90, "issues": ["标点"]}, "logic": {"score": 80}}),
+    ("versions.item", {"text": "第一版，含\"引号\"和{括号}"}),
+    ("versions.item", {"text": "第二版"}),
+]
+
+
+def _feed_in_chunks(parser: PartialJSONParser, text: str, size: int):
+    completed = []
+    for i in range(0, len(text), size):
+        completed.extend(parser.feed(text[i:i + size]))
+    return completed
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, 16, 1000])
+def test_values_are_identical_for_any_chunking(chunk_size) -> None:
+    parser = PartialJSONParser(("overall_score", "grade", "dimensions", "versions.item"))
+
+    assert _feed_in_chunks(parser, _DOCUMENT, chunk_size) == _EXPECTED
+    assert parser.done
+
+
+def test_value_is_emitted_as_soon_as_it_completes() -> None:
+    parser = PartialJSONParser(("versions.item",))
+
+    assert parser.feed('{"versions": [{"text": "a"}, {"te') == [("versions.item", {"text": "a"})]
+    assert parser.feed('xt": "b"}') == [("versions.item", {"text": "b"})]
+    assert not parser.done
+    assert parser.feed("]}") == []
+    assert parser.done
+
+
+def test_unrequested_paths_are_skipped() -> None:
+    parser = PartialJSONParser(("dimensions.logic",))
+
+    assert _feed_in_chunks(parser, _DOCUMENT, 7) == [("dimensions.logic", {"score": 80})]
+
+
+def test_malformed_json_stops_parsing_but_keeps_completed_values() -> None:
+    parser = PartialJSONParser(("a", "b"))
+
+    assert parser.feed('{"a": 1, ') == [("a", 1)]
+    assert parser.feed('"b": tru}') == []
+    assert parser.done
+    assert parser.feed('"c": 3}') == []
+
+
+def test_text_without_json_yields_nothing() -> None:
+    parser = PartialJSONParser(("a",))
+
+    assert parser.feed("抱歉，无法生成结果") == []
+    assert not parser.done
@@ -0,0 +1,135 @@
+"""
+数学验证Agent测试
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.services.agents.science.math_validator import MathValidatorAgent, _parse_formula
+
+
+@pytest.mark.parametrize("formula", [
+    "9^9^9",
+    "(9^9)^9",
+    "2^(99999*99999)",
+    "2^(1/(9^9^9))",
+    "10^21",
+])
+def test_parse_formula_rejects_huge_powers(formula: str) -> None:
+    start = time.perf_counter()
+    assert _parse_formula(formula) is None
+    assert time.perf_counter() - start < 1
+
+
+@pytest.mark.parametrize("formula", [
+    "x^2+2x+1=(x+1)^2",
+    "1/x^2=x^-2",
+    "3^(1/2)",
+    "2^x=8",
+])
+def test_parse_formula_accepts_ordinary_powers(formula: str) -> None:
+    assert _parse_formula(formula) is not None
+
+
+def _steps(*formulas):
+    return [{"content": formula, "formula": formula} for formula in formulas]
+
+
+@pytest.mark.parametrize("problem_statement, formulas", [
+    ("已知 2x=10，求x", ("x=10",)),
+    ("解方程 12x = 24", ("2x=24", "x=12")),
+])
+def test_first_step_must_follow_from_given_equation(problem_statement, formulas) -> None:
+    checks = MathValidatorAgent._symbolic_check(problem_statement, _steps(*formulas))
+
+    assert checks[0] == (1, False)
+
+
+def test_first_step_equivalent_to_given_equation_holds() -> None:
+    checks = MathValidatorAgent._symbolic_check("解方程 12x = 24", _steps("12x=24", "x=2"))
+
+    assert checks == [(1, True), (2, True)]
+
+
+@pytest.fixture
+def validator():
+    return MathValidatorAgent()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("problem_statement, formulas", [
+    ("已知 2x=10，求x", ("x=10",)),
+    ("解方程 12x = 24", ("2x=24", "x=12")),
+    # 只抄写题目，没有求出未知数
+    ("已知 2x=10，求x", ("2x=10",)),
+    ("求 3+4 的值", ("3+4=7",)),
+])
+async def test_unsolved_or_wrong_steps_are_left_to_llm(validator, problem_statement, formulas) -> None:
+    result = await validator.resolve_locally(problem_statement=problem_statement, steps=_steps(*formulas))
+
+    assert result is None
+
+
+@pytest.mark.asyncio
+async def test_solved_problem_is_resolved_locally(validator) -> None:
+    result = await validator.resolve_locally(
+        problem_statement="已知 2x=10，求x", steps=_steps("2x=10", "x=5")
+    )
+
+    assert [v["is_valid"] for v in result["validation_results"]] == [True, True]
+    assert result["overall_assessment"]["completion_status"] == "complete"
+
+
+def test_parse_response_coerces_loosely_typed_values(validator) -> None:
+    result = validator.parse_response(
+        '{"validation_results": [{"step_number": "1", "is_valid": "true", "symbolic_form": 2, "note": "x"}]}'
+    )
+
+    step = result["validation_results"][0]
+    assert (step["step_number"], step["is_valid"], step["symbolic_form"], step["note"]) == (1, True, "2", "x")
+    assert result["overall_assessment"]["completion_status"] == "complete"
+
+
+def test_parse_response_drops_only_unconvertible_values(validator) -> None:
+    result = validator.parse_response(
+        '{"validation_results": [{"step_number": "第一步", "is_valid": true}, "oops"]}'
+    )
+
+    assert len(result["validation_results"]) == 1
+    assert result["validation_results"][0]["step_number"] == 0
+    assert result["validation_results"][0]["is_valid"] is True
+
+
+@pytest.mark.parametrize("response", [
+    '{"validation_results": {"step_number": 1, "is_valid": true}}',
+    '{"overall_summary": "全部正确"}',
+])
+def test_parse_response_without_step_results_is_invalid(validator, response) -> None:
+    result = validator.parse_response(response)
+
+    assert result["overall_assessment"]["completion_status"] == "invalid"
+    assert result["validation_results"] == []
+
+
+@pytest.mark.asyncio
+async def test_validate_batch_caps_concurrent_llm_calls(validator, monkeypatch) -> None:
+    running = 0
+    peak = 0
+
+    async def validate_one_batch(problems):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return [validator._invalid_result() for _ in problems]
+
+    monkeypatch.setattr(validator, "_validate_one_batch", validate_one_batch)
+    problems = [{"problem_statement": f"题{i}", "steps": _steps("x=1")} for i in range(40)]
+
+    results = await validator.validate_batch(problems, concurrency=3)
+
+    assert len(results) == 40
+    assert peak == 3
@@ -0,0 +1,118 @@
+"""
+Qwen客户端工具调用测试
+API替换为返回预设chunk的假流式响应
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.exceptions import LLMAPIException
+from app.services.llm.qwen_client import QwenClient
+
+
+def _chunk(tool_calls=None, finish_reason=None, content=None):
+    delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason)])
+
+
+def _tool_call(index, call_id=None, name=None, arguments=None):
+    return SimpleNamespace(index=index, id=call_id, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+def _client(chunks, error=None):
+    """创建API被替换的客户端，流式响应依次产出chunks，之后抛出error"""
+
+    async def stream():
+        for chunk in chunks:
+            await asyncio.sleep(0.01)
+            yield chunk
+        await asyncio.sleep(0.01)
+        if error is not None:
+            raise error
+
+    async def create(**kwargs):
+        return stream()
+
+    client = QwenClient()
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return client
+
+
+class _SlowTool:
+    """记录是否开始、是否被取消的慢工具"""
+
+    def __init__(self) -> None:
+        self.started = asyncio.Event()
+        self.cancelled = False
+
+    async def run(self):
+        self.started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+# 第一个工具调用参数完整后第二个开始，此时第一个工具已提前执行
+_TWO_CALLS = [
+    _chunk([_tool_call(0, "c0", "slow", "{}")]),
+    _chunk([_tool_call(1, "c1", "slow", "{")]),
+]
+
+
+@pytest.mark.asyncio
+async def test_early_tool_cancelled_when_stream_fails() -> None:
+    tool = _SlowTool()
+    client = _client(_TWO_CALLS, error=RuntimeError("connection reset"))
+
+    with pytest.raises(LLMAPIException):
+        await client.complete_with_tools("s", "u", tools=[], tool_functions={"slow": tool.run})
+
+    assert tool.started.is_set()
+    assert tool.cancelled
+
+
+@pytest.mark.asyncio
+async def test_early_tool_cancelled_when_output_truncated() -> None:
+    tool = _SlowTool()
+    client = _client(_TWO_CALLS + [_chunk(finish_reason="length")])
+
+    response = await client.complete_with_tools("s", "u", tools=[], tool_functions={"slow": tool.run})
+
+    assert response.finish_reason == "length"
+    assert tool.cancelled
+
+
+@pytest.mark.asyncio
+async def test_tool_results_returned_in_call_order() -> None:
+    rounds = iter([
+        [
+            _chunk([_tool_call(0, "c0", "echo", '{"value": 1}')]),
+            _chunk([_tool_call(1, "c1", "echo", '{"value": 2}')]),
+            _chunk(finish_reason="tool_calls"),
+        ],
+        [_chunk(content="done", finish_reason="stop")],
+    ])
+    sent = []
+
+    async def stream(chunks):
+        for chunk in chunks:
+            yield chunk
+
+    async def create(**kwargs):
+        sent.append([dict(m) for m in kwargs["messages"]])
+        return stream(next(rounds))
+
+    client = QwenClient()
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    response = await client.complete_with_tools(
+        "s", "u", tools=[], tool_functions={"echo": lambda value: value * 10}
+    )
+
+    assert response.content == "done"
+    tool_messages = [m for m in sent[1] if m["role"] == "tool"]
+    assert [(m["tool_call_id"], m["content"]) for m in tool_messages] == [("c0", "10"), ("c1", "20")]